@@ -0,0 +1,52 @@
+"""add_export_jobs
+
+Revision ID: a4c7e2d9f618
+Revises: e7a1c5b3f920
+Create Date: 2026-10-18 03:12:47.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e2d9f618'
+down_revision: Union[str, Sequence[str], None] = 'e7a1c5b3f920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('export_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('filters', sa.JSON(), nullable=False),
+        sa.Column('read_primary', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.Column('total_rows', sa.Integer(), nullable=True),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_by_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by_id'], ['team_members.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_export_jobs_key'), 'export_jobs', ['key'], unique=False)
+    op.create_index(op.f('ix_export_jobs_status'), 'export_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_export_jobs_created_at'), 'export_jobs', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_export_jobs_created_at'), table_name='export_jobs')
+    op.drop_index(op.f('ix_export_jobs_status'), table_name='export_jobs')
+    op.drop_index(op.f('ix_export_jobs_key'), table_name='export_jobs')
+    op.drop_table('export_jobs')
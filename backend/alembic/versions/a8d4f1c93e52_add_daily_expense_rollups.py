@@ -0,0 +1,65 @@
+"""add_daily_expense_rollups
+
+Revision ID: a8d4f1c93e52
+Revises: f3a6c8e2d947
+Create Date: 2026-10-17 19:05:12.408317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d4f1c93e52'
+down_revision: Union[str, Sequence[str], None] = 'f3a6c8e2d947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_expense_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('branch', sa.String(), nullable=False),
+        sa.Column('project_id', sa.String(), nullable=False),
+        sa.Column('project_name', sa.String(), nullable=False),
+        sa.Column('request_type', sa.String(), nullable=False),
+        sa.Column('status_bucket', sa.String(), nullable=False),
+        sa.Column('currency', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('amount_uzs', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'branch', 'project_id', 'project_name', 'request_type', 'status_bucket', 'currency')
+    )
+
+    # Same grouping as app/db/rollups.py (rebuild); buckets match rollups.STATUS_BUCKETS
+    op.execute("""
+        INSERT INTO daily_expense_rollups
+            (day, branch, project_id, project_name, request_type, status_bucket, currency, count, amount_uzs)
+        SELECT
+            date(e.date),
+            coalesce(m.branch, ''),
+            coalesce(e.project_id, ''),
+            coalesce(e.project_name, ''),
+            coalesce(e.request_type, ''),
+            CASE
+                WHEN e.status IN ('request', 'review', 'pending_senior', 'revision') THEN 'Pending'
+                WHEN e.status IN ('approved_senior', 'pending_ceo') THEN 'Approved'
+                WHEN e.status IN ('rejected_senior', 'rejected_ceo', 'declined') THEN 'Rejected'
+                WHEN e.status IN ('confirmed', 'approved_ceo') THEN 'Confirmed'
+                ELSE 'Other'
+            END,
+            coalesce(e.currency, ''),
+            count(*),
+            sum(coalesce(e.amount_uzs, 0))
+        FROM expense_requests e
+        LEFT OUTER JOIN team_members m ON e.created_by_id = m.id
+        WHERE e.date IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_expense_rollups')
@@ -0,0 +1,29 @@
+"""add_expense_date_id_index
+
+Revision ID: b41f7c2d9e10
+Revises: 8bcc483cf9ea
+Create Date: 2026-10-17 10:12:41.208314
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f7c2d9e10'
+down_revision: Union[str, Sequence[str], None] = '8bcc483cf9ea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Composite key for keyset pagination: ORDER BY date DESC, id DESC
+    op.create_index('ix_expense_requests_date_id', 'expense_requests', ['date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_expense_requests_date_id', table_name='expense_requests')
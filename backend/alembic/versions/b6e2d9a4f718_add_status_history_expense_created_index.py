@@ -0,0 +1,46 @@
+"""add_status_history_expense_created_index
+
+Revision ID: b6e2d9a4f718
+Revises: a8d4f1c93e52
+Create Date: 2026-10-17 20:41:36.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d9a4f718'
+down_revision: Union[str, Sequence[str], None] = 'a8d4f1c93e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (expense_id, created_at) also serves lookups by expense_id alone, so it replaces the old index.
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_expense_status_history_expense_created', 'expense_status_history', ['expense_id', 'created_at'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.drop_index(
+            op.f('ix_expense_status_history_expense_id'), table_name='expense_status_history',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_expense_status_history_expense_id'), 'expense_status_history', ['expense_id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_expense_status_history_expense_created', table_name='expense_status_history',
+            postgresql_concurrently=True,
+        )
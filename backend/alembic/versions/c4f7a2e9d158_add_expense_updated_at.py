@@ -0,0 +1,36 @@
+"""add_expense_updated_at
+
+Revision ID: c4f7a2e9d158
+Revises: b6e2d9a4f718
+Create Date: 2026-10-17 22:05:12.418307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f7a2e9d158'
+down_revision: Union[str, Sequence[str], None] = 'b6e2d9a4f718'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('expense_requests', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Best known estimate for existing rows: the last status change, else creation time
+    op.execute("""
+        UPDATE expense_requests SET updated_at = coalesce(
+            (SELECT max(h.created_at) FROM expense_status_history h WHERE h.expense_id = expense_requests.id),
+            created_at
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('expense_requests', 'updated_at')
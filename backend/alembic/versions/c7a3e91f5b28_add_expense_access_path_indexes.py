@@ -0,0 +1,50 @@
+"""add_expense_access_path_indexes
+
+Revision ID: c7a3e91f5b28
+Revises: b41f7c2d9e10
+Create Date: 2026-10-17 11:40:05.613902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a3e91f5b28'
+down_revision: Union[str, Sequence[str], None] = 'b41f7c2d9e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+APPROVAL_QUEUE_WHERE = sa.text("status IN ('pending_senior', 'pending_ceo')")
+
+# name -> (columns, partial WHERE)
+# Every index ends with (date DESC, id DESC) to serve the list ORDER BY without a sort
+INDEXES = {
+    'ix_expense_requests_status_date': (['status', sa.text('date DESC'), sa.text('id DESC')], None),
+    'ix_expense_requests_created_by_date': (['created_by_id', sa.text('date DESC'), sa.text('id DESC')], None),
+    'ix_expense_requests_project_date': (['project_id', sa.text('date DESC'), sa.text('id DESC')], None),
+    'ix_expense_requests_approval_queue': ([sa.text('date DESC'), sa.text('id DESC')], APPROVAL_QUEUE_WHERE),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    # On SQLite postgresql_concurrently is ignored and a plain CREATE INDEX is issued.
+    with op.get_context().autocommit_block():
+        for name, (columns, where) in INDEXES.items():
+            op.create_index(
+                name, 'expense_requests', columns, unique=False,
+                postgresql_concurrently=True,
+                postgresql_where=where,
+                sqlite_where=where,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name='expense_requests', postgresql_concurrently=True)
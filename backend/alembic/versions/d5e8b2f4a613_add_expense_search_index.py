@@ -0,0 +1,93 @@
+"""add_expense_search_index
+
+Revision ID: d5e8b2f4a613
+Revises: c7a3e91f5b28
+Create Date: 2026-10-17 13:05:22.418730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8b2f4a613'
+down_revision: Union[str, Sequence[str], None] = 'c7a3e91f5b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same field order as app.db.search.build_search_text
+BACKFILL_SQL = {
+    'postgresql': """
+        UPDATE expense_requests SET search_text = concat_ws(' ',
+            request_id, purpose, created_by, project_name,
+            (SELECT string_agg(item->>'name', ' ') FROM json_array_elements(
+                CASE WHEN json_typeof(items::json) = 'array' THEN items::json ELSE '[]'::json END) AS item))
+    """,
+    'sqlite': """
+        UPDATE expense_requests SET search_text = trim(
+            coalesce(request_id, '') || ' ' || coalesce(purpose, '') || ' ' ||
+            coalesce(created_by, '') || ' ' || coalesce(project_name, '') || ' ' ||
+            coalesce((SELECT group_concat(json_extract(value, '$.name'), ' ') FROM json_each(items)), ''))
+    """,
+}
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE expense_search_fts USING fts5(expense_id UNINDEXED, search_text, tokenize='trigram')",
+    "INSERT INTO expense_search_fts (expense_id, search_text) SELECT id, search_text FROM expense_requests",
+    """CREATE TRIGGER expense_search_fts_ai AFTER INSERT ON expense_requests BEGIN
+        INSERT INTO expense_search_fts (expense_id, search_text) VALUES (new.id, new.search_text);
+    END""",
+    """CREATE TRIGGER expense_search_fts_au AFTER UPDATE OF search_text ON expense_requests BEGIN
+        UPDATE expense_search_fts SET search_text = new.search_text WHERE expense_id = old.id;
+    END""",
+    """CREATE TRIGGER expense_search_fts_ad AFTER DELETE ON expense_requests BEGIN
+        DELETE FROM expense_search_fts WHERE expense_id = old.id;
+    END""",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('expense_requests', sa.Column('search_text', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect in BACKFILL_SQL:
+        op.execute(BACKFILL_SQL[dialect])
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "ALTER TABLE expense_requests ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('russian', coalesce(search_text, ''))) STORED"
+        )
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_expense_requests_search_vector', 'expense_requests', ['search_vector'],
+                postgresql_using='gin', postgresql_concurrently=True,
+            )
+            op.create_index(
+                'ix_expense_requests_search_trgm', 'expense_requests', ['search_text'],
+                postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+    elif dialect == 'sqlite':
+        for statement in SQLITE_FTS:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_expense_requests_search_trgm', table_name='expense_requests', postgresql_concurrently=True)
+            op.drop_index('ix_expense_requests_search_vector', table_name='expense_requests', postgresql_concurrently=True)
+        op.drop_column('expense_requests', 'search_vector')
+    elif dialect == 'sqlite':
+        for trigger in ('expense_search_fts_ai', 'expense_search_fts_au', 'expense_search_fts_ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS expense_search_fts")
+    op.drop_column('expense_requests', 'search_text')
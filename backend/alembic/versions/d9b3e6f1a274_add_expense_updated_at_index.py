@@ -0,0 +1,34 @@
+"""add_expense_updated_at_index
+
+Revision ID: d9b3e6f1a274
+Revises: c4f7a2e9d158
+Create Date: 2026-10-17 23:12:47.530981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b3e6f1a274'
+down_revision: Union[str, Sequence[str], None] = 'c4f7a2e9d158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # "Changed since the snapshot" lookups of the DuckDB analytics engine
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_expense_requests_updated_at'), 'expense_requests', ['updated_at'], unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_expense_requests_updated_at'), table_name='expense_requests', postgresql_concurrently=True)
@@ -0,0 +1,69 @@
+"""add_project_budgets
+
+Revision ID: e7a1c5b3f920
+Revises: d9b3e6f1a274
+Create Date: 2026-10-18 00:41:09.226513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a1c5b3f920'
+down_revision: Union[str, Sequence[str], None] = 'd9b3e6f1a274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('projects', sa.Column('monthly_budget', sa.Numeric(precision=18, scale=2), nullable=True))
+    op.create_table('branch_budgets',
+        sa.Column('branch', sa.String(), nullable=False),
+        sa.Column('monthly_budget', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('branch')
+    )
+    op.create_table('project_spend_counters',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('amount_uzs', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'key', 'month')
+    )
+
+    # Same rows as app/db/budgets.py (rollups.rebuild): Approved + Confirmed buckets, no refunds
+    if op.get_bind().dialect.name == 'postgresql':
+        month = "CAST(date_trunc('month', e.date) AS DATE)"
+    else:
+        month = "date(e.date, 'start of month')"
+    counted = """
+        e.date IS NOT NULL
+        AND e.status IN ('approved_senior', 'pending_ceo', 'confirmed', 'approved_ceo')
+        AND coalesce(e.request_type, 'expense') NOT IN ('refund', 'blank_refund')
+    """
+    op.execute(f"""
+        INSERT INTO project_spend_counters (scope, key, month, count, amount_uzs)
+        SELECT 'project', e.project_id, {month}, count(*), sum(coalesce(e.amount_uzs, 0))
+        FROM expense_requests e
+        WHERE e.project_id IS NOT NULL AND e.project_id <> '' AND {counted}
+        GROUP BY e.project_id, {month}
+    """)
+    op.execute(f"""
+        INSERT INTO project_spend_counters (scope, key, month, count, amount_uzs)
+        SELECT 'branch', m.branch, {month}, count(*), sum(coalesce(e.amount_uzs, 0))
+        FROM expense_requests e
+        JOIN team_members m ON e.created_by_id = m.id
+        WHERE m.branch IS NOT NULL AND m.branch <> '' AND {counted}
+        GROUP BY m.branch, {month}
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('project_spend_counters')
+    op.drop_table('branch_budgets')
+    op.drop_column('projects', 'monthly_budget')
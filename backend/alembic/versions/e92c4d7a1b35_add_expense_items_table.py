@@ -0,0 +1,115 @@
+"""add_expense_items_table
+
+Revision ID: e92c4d7a1b35
+Revises: d5e8b2f4a613
+Create Date: 2026-10-17 14:31:09.774025
+
+"""
+from typing import Sequence, Union
+from decimal import Decimal, InvalidOperation
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e92c4d7a1b35'
+down_revision: Union[str, Sequence[str], None] = 'd5e8b2f4a613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+expense_requests = sa.table(
+    'expense_requests',
+    sa.column('id', sa.String),
+    sa.column('items', sa.JSON),
+    sa.column('currency', sa.String),
+    sa.column('usd_rate', sa.Numeric),
+)
+
+expense_items = sa.table(
+    'expense_items',
+    sa.column('id', sa.String),
+    sa.column('expense_id', sa.String),
+    sa.column('position', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('quantity', sa.Numeric),
+    sa.column('amount', sa.Numeric),
+    sa.column('currency', sa.String),
+    sa.column('amount_uzs', sa.Numeric),
+)
+
+
+def _decimal(value) -> Decimal:
+    try:
+        return Decimal(str(value if value is not None else 0))
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def _backfill() -> None:
+    """Разворачивает JSON-колонку items в expense_items пачками по id."""
+    bind = op.get_bind()
+    last_id = ''
+    while True:
+        batch = bind.execute(
+            sa.select(expense_requests)
+            .where(expense_requests.c.id > last_id)
+            .order_by(expense_requests.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not batch:
+            break
+
+        rows = []
+        for expense in batch:
+            items = expense.items if isinstance(expense.items, list) else []
+            usd_rate = _decimal(expense.usd_rate) if expense.usd_rate else None
+            for position, item in enumerate(i for i in items if isinstance(i, dict)):
+                quantity = _decimal(item.get('quantity'))
+                amount = _decimal(item.get('amount'))
+                currency = item.get('currency') or expense.currency
+                amount_uzs = quantity * amount
+                if currency == 'USD' and usd_rate:
+                    amount_uzs *= usd_rate
+                rows.append({
+                    'id': str(uuid.uuid4()),
+                    'expense_id': expense.id,
+                    'position': position,
+                    'name': item.get('name') or 'Без названия',
+                    'quantity': quantity,
+                    'amount': amount,
+                    'currency': currency,
+                    'amount_uzs': amount_uzs.quantize(Decimal('0.01')),
+                })
+        if rows:
+            bind.execute(expense_items.insert(), rows)
+        last_id = batch[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expense_items',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('expense_id', sa.String(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=18, scale=4), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('currency', sa.String(), nullable=False),
+        sa.Column('amount_uzs', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['expense_id'], ['expense_requests.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('expense_id', 'position', name='uq_expense_items_expense_position')
+    )
+    op.create_index(op.f('ix_expense_items_name'), 'expense_items', ['name'], unique=False)
+
+    _backfill()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_expense_items_name'), table_name='expense_items')
+    op.drop_table('expense_items')
@@ -0,0 +1,44 @@
+"""add_expense_amount_uzs
+
+Revision ID: f3a6c8e2d947
+Revises: e92c4d7a1b35
+Create Date: 2026-10-17 15:48:37.120554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a6c8e2d947'
+down_revision: Union[str, Sequence[str], None] = 'e92c4d7a1b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('expense_requests', sa.Column('amount_uzs', sa.Numeric(precision=18, scale=2), nullable=True))
+
+    # Same rule as crud.amount_in_uzs: only USD has a stored rate (usd_rate is null otherwise)
+    op.execute("""
+        UPDATE expense_requests SET amount_uzs = CASE
+            WHEN currency = 'USD' AND usd_rate IS NOT NULL THEN round(total_amount * usd_rate, 2)
+            ELSE total_amount
+        END
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_expense_requests_amount_uzs'), 'expense_requests', ['amount_uzs'], unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_expense_requests_amount_uzs'), table_name='expense_requests', postgresql_concurrently=True)
+    op.drop_column('expense_requests', 'amount_uzs')
@@ -10,6 +10,8 @@ import io
 from app.db import models, schemas
 from app.core import auth, database
 from app.services.docx.service import docx_service
+from app.services.docx.generator import generate_docx_async
+from app.services.docx.registry import TEMPLATES_DIR
 
 router = APIRouter(prefix="/blanks", tags=["blanks"])
 
@@ -71,8 +73,7 @@ async def generate_blank(
         raise HTTPException(status_code=400, detail=f"Unsupported template type: {request.template}")
     
     template_filename = template_name_map[request.template]
-    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "services", "docx", "templates")
-    template_path = os.path.join(templates_dir, template_filename)
+    template_path = os.path.join(TEMPLATES_DIR, template_filename)
     
     if not os.path.exists(template_path):
         raise HTTPException(status_code=500, detail=f"Template file not found: {template_filename}")
@@ -114,9 +115,8 @@ async def generate_blank(
             data["reason_drugoe_text"] = ""
 
     # 3. Generate DOCX
-    from app.services.docx.generator import generate_docx
     try:
-        stream = generate_docx(template_path, data)
+        stream = await generate_docx_async(template_path, data)
         fname = f"blank_{request.template}_{datetime.datetime.now().strftime('%d%m%Y')}.docx"
         
         return StreamingResponse(
@@ -1,16 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Response, File, Form, UploadFile, Query, Header
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, File, Form, UploadFile, Query, Header
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import io
 import re
-import csv
 import datetime
 import os
 import uuid
 import shutil
+import tempfile
 from urllib.parse import quote
-from app.db import models, schemas, crud
+from app.db import models, schemas, crud, crud_async, rollups, budgets
+from app.db.expense_query import ExpenseQuerySpec
 from app.core import auth, database
 from app.core.logging_config import get_logger
 from decimal import Decimal
@@ -25,7 +26,7 @@ from app.services.refund.service import (
 from app.services.bot.notifications import (
     send_status_notification,
     send_admin_notification,
-    get_admin_chat_id,
+    get_admin_chat_id_async,
     send_senior_notification,
     send_ceo_notification,
     get_ceo_chat_id,
@@ -34,7 +35,8 @@ from app.services.bot.notifications import (
 logger = get_logger(__name__)
 
 
-def get_expense_dict(expense) -> dict:
+def get_expense_dict(expense, budget: dict = None) -> dict:
+    """budget — expense.budget из budgets.attach_to_expenses, для строки «остаток бюджета» в уведомлении."""
     return {
         'id': expense.id,
         'request_id': expense.request_id,
@@ -47,96 +49,120 @@ def get_expense_dict(expense) -> dict:
         'currency': getattr(expense, 'currency', 'UZS'),
         'usd_rate': getattr(expense, 'usd_rate', None),
         'request_type': getattr(expense, 'request_type', 'expense'),
+        'budget': budget,
     }
 
+def expense_query_spec(
+    filters: schemas.ExpenseFilterParams = Depends(),
+    current_user: models.TeamMember = Depends(auth.get_current_user),
+) -> ExpenseQuerySpec:
+    """Фильтры списка заявок: без status — все статусы."""
+    return ExpenseQuerySpec.parse(current_user, filters)
+
+
+def export_spec(current_user: models.TeamMember, filters: schemas.ExportFilterParams) -> ExpenseQuerySpec:
+    """Фильтры экспорта: без status и allStatuses — только EXPORTABLE_STATUSES."""
+    return ExpenseQuerySpec.parse(
+        current_user, filters, default_statuses=() if filters.allStatuses else EXPORTABLE_STATUSES
+    )
+
+
+def export_query_spec(
+    filters: schemas.ExportFilterParams = Depends(),
+    current_user: models.TeamMember = Depends(auth.get_current_user),
+) -> ExpenseQuerySpec:
+    return export_spec(current_user, filters)
+
+
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
 @router.get("", response_model=schemas.PaginatedExpensesSchema)
 def read_expenses(
-    project: str = None,
-    status: str = None,
-    user_id: str = None,
-    request_type: str = None,
-    branch: str = None,
-    team: str = None,
-    search: str = None,
-    from_date: str = None,
-    to_date: str = None,
+    spec: ExpenseQuerySpec = Depends(expense_query_spec),
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=50, ge=1, le=5000),
-    db: Session = Depends(database.get_db),
-    current_user: models.TeamMember = Depends(auth.get_current_user)
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    sort: str = Query(default="date", pattern="^(date|relevance)$"),
+    with_budget: bool = False,
+    db: Session = Depends(database.get_read_db),
 ):
-    # Если зашел не админ, он видит только свои заявки
-    effective_user_id = user_id if auth.is_admin(current_user) else current_user.id
-    
-    # Обработка "all" из фронтенда
-    clean_project = None if project == "all" else project
-    clean_user = None if effective_user_id == "all" else effective_user_id
+    """Список заявок по фильтрам expense_query_spec.
 
-    # Парсинг дат
-    from_dt = None
-    if from_date:
-        try:
-            from_dt = datetime.datetime.fromisoformat(from_date.replace("Z", "+00:00"))
-        except ValueError:
-            pass
-            
-    to_dt = None
-    if to_date:
+    Два режима пагинации:
+    - skip/limit (по умолчанию) — для старых клиентов;
+    - cursor (keyset) — передайте `cursor=` (пустой) для первой страницы,
+      затем `next_cursor` из ответа. Время ответа не зависит от глубины страницы.
+
+    with_total=false — не считать общее количество (total=null), has_more
+    определяется по лишней строке (limit + 1). Для опроса дашбордом.
+
+    sort=relevance — вместе с search: сначала самые релевантные (только skip/limit).
+
+    with_budget=true — у каждой заявки budget: бюджет и расход проекта и филиала
+    автора за месяц заявки (из счётчиков, несколько запросов на страницу).
+    """
+    if sort == "relevance" and cursor is not None:
+        raise HTTPException(status_code=400, detail="sort=relevance не поддерживается в режиме cursor")
+
+    after = None
+    if cursor:
         try:
-            if len(to_date) <= 10:
-                to_dt = datetime.datetime.fromisoformat(to_date) + datetime.timedelta(days=1)
-            else:
-                to_dt = datetime.datetime.fromisoformat(to_date.replace("Z", "+00:00"))
+            after = crud.decode_expense_cursor(cursor)
         except ValueError:
-            pass
-    
+            raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+    if cursor is None and with_total:
+        # Страница и total одним запросом (count(*) over ())
+        items, total = crud.get_expenses_with_total(db, spec, skip=skip, limit=limit, sort=sort)
+        if with_budget:
+            budgets.attach_to_expenses(db, items)
+        return {
+            "items": items,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "has_more": (skip + limit) < total
+        }
+
+    # Запрашиваем limit + 1: лишняя строка лишь говорит, что есть следующая страница
     items = crud.get_expenses(
-        db, 
-        project_id=clean_project, 
-        status=status, 
-        user_id=clean_user, 
-        request_type=request_type,
-        branch=branch,
-        team=team,
-        search=search,
-        from_date=from_dt,
-        to_date=to_dt,
-        skip=skip, 
-        limit=limit
-    )
-    total = crud.count_expenses(
-        db, 
-        project_id=clean_project, 
-        status=status, 
-        user_id=clean_user,
-        request_type=request_type,
-        branch=branch,
-        team=team,
-        search=search,
-        from_date=from_dt,
-        to_date=to_dt
+        db,
+        spec,
+        skip=skip if cursor is None else 0,
+        limit=limit + 1,
+        after=after,
+        sort=sort,
     )
-    
+    has_more = len(items) > limit
+    items = items[:limit]
+    if with_budget:
+        budgets.attach_to_expenses(db, items)
+
+    total = None
+    if with_total:
+        # В keyset-режиме оконный count считал бы только строки после курсора
+        total = crud.count_expenses(db, spec)
+
     return {
         "items": items,
         "total": total,
-        "skip": skip,
+        "skip": skip if cursor is None else 0,
         "limit": limit,
-        "has_more": (skip + limit) < total
+        "has_more": has_more,
+        "next_cursor": crud.encode_expense_cursor(items[-1]) if (cursor is not None and has_more) else None
     }
 
 @router.post("", response_model=schemas.ExpenseRequestSchema)
-async def create_expense(expense: schemas.ExpenseRequestCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.TeamMember = Depends(auth.get_current_user)):
+async def create_expense(expense: schemas.ExpenseRequestCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(database.get_async_db), current_user: models.TeamMember = Depends(auth.get_current_user)):
     user_id = getattr(current_user, "id", None)
     if not user_id:
         raise HTTPException(status_code=400, detail="Admin cannot create expenses directly")
     
     usd_rate = await currency_service.get_usd_rate()
-    expense_req = crud.create_expense_request(db=db, expense=expense, user_id=user_id, usd_rate=usd_rate)
+    expense_req = await crud_async.create_expense_request(db=db, expense=expense, user_id=user_id, usd_rate=usd_rate)
     
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         background_tasks.add_task(send_admin_notification, get_expense_dict(expense_req), admin_chat_id)
     return expense_req
@@ -145,7 +171,7 @@ async def create_expense(expense: schemas.ExpenseRequestCreate, background_tasks
 async def web_submit_expense(
     data: dict,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_async_db),
     authorization: Optional[str] = Header(None)
 ):
     """Web-App endpoint: creates an investment request.
@@ -158,7 +184,7 @@ async def web_submit_expense(
     # 1. Try JWT auth
     if authorization and authorization.startswith("Bearer "):
         try:
-            user = auth.get_current_user_from_token(authorization.replace("Bearer ", ""), db)
+            user = await auth.get_current_user_from_token_async(authorization.replace("Bearer ", ""), db)
         except Exception:
             pass
 
@@ -168,9 +194,7 @@ async def web_submit_expense(
         if chat_id:
             try:
                 chat_id_int = int(chat_id)
-                user = db.query(models.TeamMember).filter(
-                    models.TeamMember.telegram_chat_id == chat_id_int
-                ).first()
+                user = await crud_async.get_member_by_chat_id(db, chat_id_int)
             except (ValueError, TypeError):
                 pass
 
@@ -197,9 +221,9 @@ async def web_submit_expense(
     )
 
     usd_rate = await currency_service.get_usd_rate()
-    expense_req = crud.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
+    expense_req = await crud_async.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
 
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         background_tasks.add_task(send_admin_notification, get_expense_dict(expense_req), admin_chat_id)
     return expense_req
@@ -208,7 +232,7 @@ async def web_submit_expense(
 @router.post("/refund/web-submit", response_model=schemas.ExpenseRequestSchema)
 async def web_submit_refund(
     background_tasks: BackgroundTasks,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_async_db),
     student_id: str = Form(...),
     reason: str = Form(...),
     amount: float = Form(...),
@@ -227,7 +251,7 @@ async def web_submit_refund(
     # 1. Попытка авторизации через JWT
     if authorization and authorization.startswith("Bearer "):
         try:
-            user = auth.get_current_user_from_token(authorization.replace("Bearer ", ""), db)
+            user = await auth.get_current_user_from_token_async(authorization.replace("Bearer ", ""), db)
         except Exception:
             pass
 
@@ -235,9 +259,7 @@ async def web_submit_refund(
     if user is None and chat_id:
         try:
             chat_id_int = int(chat_id)
-            user = db.query(models.TeamMember).filter(
-                models.TeamMember.telegram_chat_id == chat_id_int
-            ).first()
+            user = await crud_async.get_member_by_chat_id(db, chat_id_int)
         except (ValueError, TypeError):
             pass
 
@@ -261,7 +283,7 @@ async def web_submit_refund(
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
 
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         background_tasks.add_task(send_admin_notification, get_expense_dict(expense_req), admin_chat_id)
     return expense_req
@@ -270,14 +292,14 @@ async def web_submit_refund(
 async def web_submit_blank(
     data: dict, 
     background_tasks: BackgroundTasks, 
-    db: Session = Depends(database.get_db), 
+    db: AsyncSession = Depends(database.get_async_db), 
     authorization: Optional[str] = Header(None)
 ):
     """Web-App endpoint: создаёт заявку-бланк (служебную записку)."""
     user = None
     if authorization and authorization.startswith("Bearer "):
         try:
-            user = auth.get_current_user_from_token(authorization.replace("Bearer ", ""), db)
+            user = await auth.get_current_user_from_token_async(authorization.replace("Bearer ", ""), db)
         except Exception:
             pass
 
@@ -285,9 +307,7 @@ async def web_submit_blank(
     if user is None and chat_id:
         try:
             chat_id_int = int(chat_id)
-            user = db.query(models.TeamMember).filter(
-                models.TeamMember.telegram_chat_id == chat_id_int
-            ).first()
+            user = await crud_async.get_member_by_chat_id(db, chat_id_int)
         except (ValueError, TypeError):
             pass
 
@@ -314,23 +334,20 @@ async def web_submit_blank(
         project_id=data.get("project_id"),
         purpose=purpose,
         items=items_data,
-        currency=items_data[0].currency if items_data else "UZS"
+        currency=items_data[0].currency if items_data else "UZS",
+        request_type="blank",
+        template_key=tpl
     )
     
     usd_rate = await currency_service.get_usd_rate()
-    expense_req = crud.create_expense_request(
+    expense_req = await crud_async.create_expense_request(
         db=db, 
         expense=expense_create, 
         user_id=current_user.id, 
         usd_rate=usd_rate
     )
     
-    expense_req.request_type = "blank"
-    expense_req.template_key = tpl
-    db.commit()
-    db.refresh(expense_req)
-    
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         background_tasks.add_task(send_admin_notification, get_expense_dict(expense_req), admin_chat_id)
         
@@ -340,14 +357,14 @@ async def web_submit_blank(
 async def web_submit_refund_application(
     data: dict, 
     background_tasks: BackgroundTasks, 
-    db: Session = Depends(database.get_db), 
+    db: AsyncSession = Depends(database.get_async_db), 
     authorization: Optional[str] = Header(None)
 ):
     """Web-App endpoint: создаёт заявку на возврат клиента (blank_refund)."""
     user = None
     if authorization and authorization.startswith("Bearer "):
         try:
-            user = auth.get_current_user_from_token(authorization.replace("Bearer ", ""), db)
+            user = await auth.get_current_user_from_token_async(authorization.replace("Bearer ", ""), db)
         except Exception:
             pass
 
@@ -355,9 +372,7 @@ async def web_submit_refund_application(
     if user is None and chat_id:
         try:
             chat_id_int = int(chat_id)
-            user = db.query(models.TeamMember).filter(
-                models.TeamMember.telegram_chat_id == chat_id_int
-            ).first()
+            user = await crud_async.get_member_by_chat_id(db, chat_id_int)
         except (ValueError, TypeError):
             pass
 
@@ -372,25 +387,22 @@ async def web_submit_refund_application(
         project_id=data.get("project_id"),
         purpose=purpose,
         items=[],
-        currency="UZS"
+        total_amount=amount,
+        currency="UZS",
+        request_type="blank_refund",
+        template_key="refund"
     )
     
     usd_rate = await currency_service.get_usd_rate()
-    expense_req = crud.create_expense_request(
+    expense_req = await crud_async.create_expense_request(
         db=db, 
         expense=expense_create, 
         user_id=current_user.id, 
-        usd_rate=usd_rate
+        usd_rate=usd_rate,
+        refund_data=data
     )
     
-    expense_req.request_type = "blank_refund"
-    expense_req.template_key = "refund"
-    expense_req.total_amount = amount
-    expense_req.refund_data = data
-    db.commit()
-    db.refresh(expense_req)
-    
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         background_tasks.add_task(send_admin_notification, get_expense_dict(expense_req), admin_chat_id)
         
@@ -432,7 +444,7 @@ async def confirm_refund_with_receipt(
     retention: str = Form(...),           # "true" or "false"
     receipt_photo: UploadFile = File(...),
     recipient_ids: Optional[str] = Form(None), # JSON list of user IDs
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_async_db),
     current_user: models.TeamMember = Depends(auth.get_current_user),
     background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
@@ -440,7 +452,7 @@ async def confirm_refund_with_receipt(
     if not auth.is_admin(current_user):
         raise HTTPException(status_code=403, detail="Only admin can confirm refunds")
 
-    expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+    expense = await crud_async.get_expense(db, expense_id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     if expense.request_type not in ("refund", "blank_refund"):
@@ -452,14 +464,16 @@ async def confirm_refund_with_receipt(
 
     # Update retention in refund_data JSON
     retention_bool = retention.lower() == "true"
-    refund_data = expense.refund_data or {}
+    refund_data = dict(expense.refund_data or {})
     refund_data["retention"] = retention_bool
     expense.refund_data = refund_data
 
     # Mark as confirmed
+    old_status = expense.status
     expense.status = "confirmed"
-    db.commit()
-    db.refresh(expense)
+    await db.run_sync(lambda session: rollups.record_status_change(session, expense, old_status))
+    await db.commit()
+    await db.refresh(expense)
 
     # Send notifications if recipients selected
     if recipient_ids:
@@ -468,10 +482,7 @@ async def confirm_refund_with_receipt(
             ids_list = json.loads(recipient_ids)
             if ids_list:
                 # Resolve chat IDs
-                recipients = db.query(models.TeamMember).filter(
-                    models.TeamMember.id.in_(ids_list),
-                    models.TeamMember.telegram_chat_id.isnot(None)
-                ).all()
+                recipients = await crud_async.get_members_by_ids(db, ids_list)
                 chat_ids = [r.telegram_chat_id for r in recipients]
                 
                 if chat_ids:
@@ -570,8 +581,9 @@ def forward_to_senior_financier(
     logger.info(f"Forwarding expense {expense.request_id} (status: {expense.status}) to Senior Financier")
     senior_chat_ids = get_senior_financier_chat_ids()
     if senior_chat_ids:
+        expense_dict = get_expense_dict(expense, budgets.attach_to_expenses(db, [expense])[0].budget)
         for chat_id in senior_chat_ids:
-            background_tasks.add_task(send_senior_notification, get_expense_dict(expense), chat_id)
+            background_tasks.add_task(send_senior_notification, expense_dict, chat_id)
     else:
         logger.warning(f"No linked Senior Financiers (CFO) found for expense {expense.request_id}")
 
@@ -610,7 +622,8 @@ def forward_to_ceo(
     logger.info(f"Forwarding expense {expense.request_id} (status: {expense.status}) to CEO")
     ceo_chat_id = get_ceo_chat_id()
     if ceo_chat_id:
-        background_tasks.add_task(send_ceo_notification, get_expense_dict(expense), ceo_chat_id)
+        expense_dict = get_expense_dict(expense, budgets.attach_to_expenses(db, [expense])[0].budget)
+        background_tasks.add_task(send_ceo_notification, expense_dict, ceo_chat_id)
     else:
         logger.warning("CEO has not linked their Telegram account yet.")
 
@@ -634,187 +647,51 @@ def update_internal_comment(expense_id: str, update: schemas.InternalCommentUpda
 
 @router.get("/export")
 def export_expenses(
-    project: str = None, 
-    status: str = None,
-    user_id: str = None, 
-    from_date: str = None, 
-    to_date: str = None, 
-    allStatuses: bool = False, 
-    request_type: str = None,
-    branch: str = None,
-    team: str = None,
-    search: str = None,
-    db: Session = Depends(database.get_db), 
-    current_user: models.TeamMember = Depends(auth.get_current_user)
+    spec: ExpenseQuerySpec = Depends(export_query_spec),
+    primary: bool = Depends(database.reads_primary),
 ):
-    # Обработка "all"
-    clean_project = None if project == "all" else project
-    clean_user = None if user_id == "all" else user_id
+    """CSV по позициям заявок — потоком, без ограничения на число строк.
 
-    # Парсинг дат для CRUD
-    from_dt = None
-    if from_date:
-        try:
-            from_dt = datetime.datetime.fromisoformat(from_date.replace("Z", "+00:00"))
-        except ValueError:
-            pass
-    to_dt = None
-    if to_date:
-        try:
-            if len(to_date) <= 10:
-                to_dt = datetime.datetime.fromisoformat(to_date) + datetime.timedelta(days=1)
-            else:
-                to_dt = datetime.datetime.fromisoformat(to_date.replace("Z", "+00:00"))
-        except ValueError:
-            pass
+    Сессию открывает сам поток: он читается уже после возврата из эндпоинта.
+    """
+    from app.services.analytics import export as export_service
 
-    # Результирующий статус
-    final_status = status # Если статус передан явно
-    if not final_status:
-        if allStatuses:
-            # Все кроме черновиков
-            pass 
-        else:
-            final_status = ",".join(EXPORTABLE_STATUSES)
-
-    # Права доступа
-    effective_user_id = clean_user if auth.is_admin(current_user) else current_user.id
-    
-    expenses = crud.get_expenses(
-        db,
-        project_id=clean_project,
-        user_id=effective_user_id,
-        status=final_status,
-        request_type=request_type,
-        branch=branch,
-        team=team,
-        search=search,
-        from_date=from_dt,
-        to_date=to_dt,
-        limit=5000 # Лимит для экспорта
-    )
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Request ID", "Date", "Project Code", "Project Name", "Responsible", "Status", "Item Name", "Qty", "Amount", "Currency", "USD Rate", "Amount in UZS"])
-    
-    status_map = {
-        "request": "Запрос",
-        "review": "На рассмотрении",
-        "pending_senior": "На согласовании CFO",
-        "approved_senior": "Утверждено CFO",
-        "pending_ceo": "На согласовании CEO",
-        "approved_ceo": "Одобрено CEO",
-        "confirmed": "Подтверждено",
-        "declined": "Отклонено",
-        "revision": "Возврат на доработку",
-        "archived": "Архивировано"
-    }
+    def stream():
+        with database.read_database_session(primary=primary) as db:
+            yield from export_service.iter_expenses_csv(crud.iter_expense_item_rows(db, spec))
 
-    for e in expenses:
-        usd_rate = Decimal(str(e.usd_rate)) if e.usd_rate else None
-        items = e.items if isinstance(e.items, list) else []
-        for item in items:
-            item_currency = item.get("currency", e.currency)
-            item_amount_native = Decimal(str(item.get("amount", 0))) * Decimal(str(item.get("quantity", 0)))
-            
-            amount_uzs = item_amount_native
-            if item_currency == "USD" and usd_rate:
-                amount_uzs = item_amount_native * usd_rate
-            elif item_currency == "RUB" and usd_rate: # Assuming RUB to UZS conversion via USD rate if available
-                amount_uzs = item_amount_native / Decimal("100") * usd_rate # Example conversion, adjust as needed
-
-            writer.writerow([
-                e.request_id,
-                e.date.strftime("%Y-%m-%d %H:%M"),
-                e.project_code,
-                e.project_name,
-                e.created_by,
-                status_map.get(e.status, e.status),
-                item.get("name", ""),
-                item.get("quantity", 0),
-                item.get("amount", 0),
-                item_currency,
-                float(usd_rate) if usd_rate else "",
-                float(round(amount_uzs, 2))
-            ])
-    
-    content = output.getvalue()
-    bom = "\ufeff"
     filename = "expenses_export.csv"
     encoded_filename = quote(filename)
-    return Response(
-        content=bom + content,
+    return StreamingResponse(
+        stream(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename*=utf-8''{encoded_filename}"}
     )
 
 @router.get("/export-xlsx")
 def export_expenses_xlsx(
-    project: str = None, 
-    status: str = None,
-    user_id: str = None, 
-    from_date: str = None, 
-    to_date: str = None, 
-    allStatuses: bool = False, 
-    request_type: str = None,
-    branch: str = None,
-    team: str = None,
-    search: str = None,
-    db: Session = Depends(database.get_db), 
-    current_user: models.TeamMember = Depends(auth.get_current_user)
+    background_tasks: BackgroundTasks,
+    spec: ExpenseQuerySpec = Depends(export_query_spec),
+    db: Session = Depends(database.get_read_db), 
 ):
     from app.services.analytics import export as export_service
     
-    # Обработка "all"
-    clean_project = None if project == "all" else project
-    clean_user = None if user_id == "all" else user_id
-
-    # Парсинг дат для CRUD
-    from_dt = None
-    if from_date:
+    rows = crud.iter_expense_item_rows(db, spec)
+    # Файл на диске, а не в памяти: ZIP дописывается целиком до отправки
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as output:
         try:
-            from_dt = datetime.datetime.fromisoformat(from_date.replace("Z", "+00:00"))
-        except ValueError:
-            pass
-    to_dt = None
-    if to_date:
-        try:
-            if len(to_date) <= 10:
-                to_dt = datetime.datetime.fromisoformat(to_date) + datetime.timedelta(days=1)
-            else:
-                to_dt = datetime.datetime.fromisoformat(to_date.replace("Z", "+00:00"))
-        except ValueError:
-            pass
-
-    final_status = status
-    if not final_status:
-        if not allStatuses:
-            final_status = ",".join(EXPORTABLE_STATUSES)
+            export_service.write_expenses_xlsx(rows, output)
+        except Exception:
+            os.remove(output.name)
+            raise
 
-    effective_user_id = clean_user if auth.is_admin(current_user) else current_user.id
-    
-    expenses = crud.get_expenses(
-        db,
-        project_id=clean_project,
-        user_id=effective_user_id,
-        status=final_status,
-        request_type=request_type,
-        branch=branch,
-        team=team,
-        search=search,
-        from_date=from_dt,
-        to_date=to_dt,
-        limit=5000
-    )
-    output = export_service.generate_expenses_xlsx(expenses)
-    
     filename = f"expenses_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     encoded_filename = quote(filename)
-    return StreamingResponse(
-        output,
+    background_tasks.add_task(os.remove, output.name)
+    return FileResponse(
+        output.name,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=utf-8''{encoded_filename}"}
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{encoded_filename}"},
     )
 
 
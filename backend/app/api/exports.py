@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from urllib.parse import quote
+import os
+from app.db import models, schemas
+from app.core import auth, database
+from app.api.expenses import export_spec
+from app.services.analytics import export_jobs
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+
+def _get_own_job(db: Session, job_id: str, current_user: models.TeamMember) -> models.ExportJob:
+    job = export_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.created_by_id != current_user.id and not auth.is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return job
+
+
+@router.post("", response_model=schemas.ExportJobSchema, status_code=202)
+def create_export(
+    params: schemas.ExportJobCreate,
+    db: Session = Depends(database.get_db),
+    read_db: Session = Depends(database.get_read_db),
+    primary: bool = Depends(database.reads_primary),
+    current_user: models.TeamMember = Depends(auth.get_current_user),
+):
+    """Ставит выгрузку CSV/XLSX в очередь. Если такой же файл по неизменившимся данным
+    уже есть или собирается — возвращает ту задачу."""
+    spec = export_spec(current_user, params)
+    return export_jobs.submit(db, read_db, current_user.id, params.format.value, spec, primary=primary)
+
+
+@router.get("/{job_id}", response_model=schemas.ExportJobSchema)
+def read_export(
+    job_id: str,
+    db: Session = Depends(database.get_db),
+    current_user: models.TeamMember = Depends(auth.get_current_user),
+):
+    """Статус и прогресс выгрузки (rows из total_rows)."""
+    return _get_own_job(db, job_id, current_user)
+
+
+@router.get("/{job_id}/download")
+def download_export(
+    job_id: str,
+    db: Session = Depends(database.get_db),
+    current_user: models.TeamMember = Depends(auth.get_current_user),
+):
+    job = _get_own_job(db, job_id, current_user)
+    if job.status != export_jobs.DONE:
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+    if not os.path.exists(job.file_path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+
+    spec = export_jobs.FORMATS[job.format]
+    name, ext = os.path.splitext(spec["filename"])
+    filename = f"{name}_{job.finished_at.strftime('%Y%m%d_%H%M%S')}{ext}"
+    return FileResponse(
+        job.file_path,
+        media_type=spec["media_type"],
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"},
+    )
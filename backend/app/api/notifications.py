@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Request, HTTPException, status
 from sse_starlette.sse import EventSourceResponse
-from app.services.notifications.sse import sse_generator
+from app.services.notifications.sse import sse_generator, user_channel
 from app.core import auth
 from app.db import models
 from app.core.database import get_db
@@ -46,7 +46,4 @@ async def notification_stream(
     Subscribe to real-time notifications via Server-Sent Events (SSE).
     Admins listen to 'notifications:admin', regular users to 'notifications:{user_id}'.
     """
-    is_admin = current_user.login == "safina" or current_user.position == "admin"
-    channel = "notifications:admin" if is_admin else f"notifications:{current_user.id}"
-    
-    return EventSourceResponse(sse_generator(request, channel))
+    return EventSourceResponse(sse_generator(request, user_channel(current_user)))
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import datetime
 import os
-from app.db import models, schemas, crud
+from app.db import models, schemas, crud, rollups, budgets
 from app.core import auth, database
 
 router = APIRouter(prefix="/projects", tags=["projects"])
@@ -10,8 +11,36 @@ router = APIRouter(prefix="/projects", tags=["projects"])
 @router.get("", response_model=List[schemas.ProjectSchema])
 def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.TeamMember = Depends(auth.get_current_user)):
     if current_user.login == os.getenv("ADMIN_LOGIN", "safina"):
-        return crud.get_projects(db, skip=skip, limit=limit)
-    return current_user.projects
+        return budgets.attach_to_projects(db, crud.get_projects(db, skip=skip, limit=limit))
+    return budgets.attach_to_projects(db, current_user.projects)
+
+@router.get("/budgets", response_model=schemas.BudgetsSchema)
+def read_budgets(
+    month: Optional[str] = Query(default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    db: Session = Depends(database.get_db),
+    current_user: models.TeamMember = Depends(auth.get_current_user)
+):
+    """Бюджеты и расход проектов и филиалов за месяц (по умолчанию текущий) — из счётчиков."""
+    if not auth.is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Only admins can view budgets")
+    month = datetime.datetime.strptime(month, "%Y-%m").date() if month else budgets.month_start()
+    return {
+        "month": month.strftime("%Y-%m"),
+        "projects": budgets.project_statuses(db, month),
+        "branches": budgets.branch_statuses(db, month),
+    }
+
+@router.put("/branch-budgets/{branch}")
+def update_branch_budget(
+    branch: str,
+    update: schemas.BudgetUpdate,
+    db: Session = Depends(database.get_db),
+    current_user: models.TeamMember = Depends(auth.get_current_user)
+):
+    if not auth.is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Only admins can manage budgets")
+    crud.set_branch_budget(db, branch, update.monthly_budget)
+    return {"status": "success"}
 
 @router.get("/by-chat-id/{chat_id}", response_model=List[schemas.ProjectSchema])
 def read_projects_by_chat_id(chat_id: int, db: Session = Depends(database.get_db)):
@@ -39,6 +68,7 @@ def delete_project(project_id: str, db: Session = Depends(database.get_db), curr
     proj = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
+    rollups.forget_project(db, proj.id)
     db.delete(proj)
     db.commit()
     return {"status": "success"}
@@ -63,6 +93,20 @@ def remove_project_member(project_id: str, member_id: str, db: Session = Depends
         raise HTTPException(status_code=404, detail="Project or Member not found")
     return {"status": "success"}
 
+@router.put("/{project_id}/budget", response_model=schemas.ProjectSchema)
+def update_project_budget(
+    project_id: str,
+    update: schemas.BudgetUpdate,
+    db: Session = Depends(database.get_db),
+    current_user: models.TeamMember = Depends(auth.get_current_user)
+):
+    if not auth.is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Only admins can manage budgets")
+    project = crud.set_project_budget(db, project_id, update.monthly_budget)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return budgets.attach_to_projects(db, [project])[0]
+
 @router.patch("/{project_id}/templates", response_model=schemas.ProjectSchema)
 def update_project_templates(
     project_id: str,
@@ -4,6 +4,8 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 from app.db import models
@@ -88,6 +90,18 @@ def get_current_user_from_token(token: str, db: Session):
     except JWTError:
         return None
 
+async def get_current_user_from_token_async(token: str, db: AsyncSession):
+    """Async counterpart of get_current_user_from_token (AsyncSession)."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        login: str = payload.get("sub")
+        if not login:
+            return None
+    except JWTError:
+        return None
+    result = await db.execute(select(models.TeamMember).where(models.TeamMember.login == login))
+    return result.scalars().first()
+
 def is_admin(user: models.TeamMember) -> bool:
     """Check if the user has admin privileges (Superuser or Financiers team)."""
     admins = [os.getenv("ADMIN_LOGIN", "safina"), "farrukh"]
@@ -0,0 +1,206 @@
+"""
+Двухуровневый кэш ответов с версиями: LRU в памяти процесса + Redis (если задан REDIS_URL).
+
+Ключ — пространство имён, его текущая версия, временное окно (ttl) и параметры запроса.
+Инвалидация — не удаление ключей, а bump_version(namespace): старые записи просто
+перестают совпадать с ключом и вытесняются LRU / истекают в Redis по TTL.
+Версия хранится в Redis, поэтому bump из одного процесса (например, бота) виден всем.
+Без Redis версия и кэш — локальные для процесса.
+
+Промах по одному ключу считается один раз (single-flight): внутри процесса —
+под блокировкой ключа, между процессами — под коротким локом в Redis (SET NX),
+остальные ждут готовое значение.
+
+Ошибки Redis не ломают запрос: кэш деградирует до локального.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+import redis
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+_MISSING = object()
+_redis_client = None
+_local_versions = {}
+_local_bumped_at = {}
+_versions_lock = threading.Lock()
+
+
+def get_redis():
+    """Синхронный клиент Redis или None, если REDIS_URL не задан."""
+    global _redis_client
+    if _redis_client is None and REDIS_URL:
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _redis_client
+
+
+def _version_key(namespace: str) -> str:
+    return f"cache:{namespace}:version"
+
+
+def _bumped_at_key(namespace: str) -> str:
+    return f"cache:{namespace}:bumped_at"
+
+
+def get_version(namespace: str) -> int:
+    client = get_redis()
+    if client is not None:
+        try:
+            return int(client.get(_version_key(namespace)) or 0)
+        except redis.RedisError as e:
+            logger.warning(f"Cache: Redis unavailable, using local version for {namespace}: {e}")
+    return _local_versions.get(namespace, 0)
+
+
+def bump_version(namespace: str):
+    """Инвалидирует все записи пространства имён (во всех процессах при наличии Redis)."""
+    now = time.time()
+    with _versions_lock:
+        _local_bumped_at[namespace] = now
+        _local_versions[namespace] = _local_versions.get(namespace, 0) + 1
+    client = get_redis()
+    if client is not None:
+        try:
+            # Время — до версии: кто увидел новую версию, видит и время её появления
+            client.set(_bumped_at_key(namespace), now)
+            client.incr(_version_key(namespace))
+        except redis.RedisError as e:
+            logger.warning(f"Cache: failed to bump version of {namespace}: {e}")
+
+
+def seconds_since_bump(namespace: str) -> float:
+    """Сколько секунд назад поднималась версия (бесконечность — ни разу)."""
+    bumped_at = _local_bumped_at.get(namespace)
+    client = get_redis()
+    if client is not None:
+        try:
+            raw = client.get(_bumped_at_key(namespace))
+            if raw is not None:
+                bumped_at = max(float(raw), bumped_at or 0)
+        except redis.RedisError as e:
+            logger.warning(f"Cache: Redis unavailable, using local bump time for {namespace}: {e}")
+    return time.time() - bumped_at if bumped_at is not None else float("inf")
+
+
+class LRUCache:
+    """Потокобезопасный LRU на OrderedDict."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._data:
+                return _MISSING
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class VersionedCache:
+    """Кэш JSON-совместимых значений для одного пространства имён."""
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, namespace: str, ttl: int = 300, maxsize: int = 128, compute_timeout: float = 30.0):
+        self.namespace = namespace
+        self.ttl = max(1, ttl)
+        self.compute_timeout = compute_timeout
+        self.local = LRUCache(maxsize)
+        # Полосатые блокировки вместо блокировки на ключ: их число не растёт с числом ключей
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def make_key(self, params: dict) -> str:
+        version = get_version(self.namespace)
+        window = int(time.time() // self.ttl)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"cache:{self.namespace}:v{version}:w{window}:{digest}"
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        return self._locks[int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16) % self.LOCK_STRIPES]
+
+    def _redis_get(self, client, key: str):
+        try:
+            raw = client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache: Redis get failed for {key}: {e}")
+            return _MISSING
+        return _MISSING if raw is None else json.loads(raw)
+
+    def _redis_set(self, client, key: str, value: Any):
+        try:
+            client.setex(key, self.ttl, json.dumps(value, ensure_ascii=False))
+        except redis.RedisError as e:
+            logger.warning(f"Cache: Redis set failed for {key}: {e}")
+
+    def _compute_shared(self, client, key: str, compute: Callable[[], Any]):
+        """Считает значение один раз на все процессы: лок в Redis, остальные ждут результат."""
+        lock_key = f"{key}:lock"
+        try:
+            acquired = client.set(lock_key, os.getpid(), nx=True, px=int(self.compute_timeout * 1000))
+        except redis.RedisError as e:
+            logger.warning(f"Cache: Redis lock failed for {key}: {e}")
+            return compute()
+
+        if acquired:
+            try:
+                value = compute()
+                self._redis_set(client, key, value)
+                return value
+            finally:
+                try:
+                    client.delete(lock_key)
+                except redis.RedisError:
+                    pass
+
+        deadline = time.monotonic() + self.compute_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self._redis_get(client, key)
+            if value is not _MISSING:
+                return value
+        # Вычислявший процесс упал или завис — считаем сами
+        return compute()
+
+    def get_or_compute(self, params: dict, compute: Callable[[], Any]) -> Any:
+        """compute() должен возвращать JSON-совместимое значение (см. jsonable_encoder)."""
+        key = self.make_key(params)
+        value = self.local.get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock_for(key):
+            value = self.local.get(key)
+            if value is not _MISSING:
+                return value
+            client = get_redis()
+            if client is None:
+                value = compute()
+            else:
+                value = self._redis_get(client, key)
+                if value is _MISSING:
+                    value = self._compute_shared(client, key, compute)
+            self.local.set(key, value)
+            return value
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
 import os
 from dotenv import load_dotenv
 
@@ -9,15 +14,15 @@ load_dotenv()
 # Use DATABASE_URL from environment (PostgreSQL in production, SQLite as local fallback)
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./media/safina.db")
 
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-else:
+def _create_engine(url: str):
+    if url.startswith("sqlite"):
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
     # Optimized for PostgreSQL in production
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+    return create_engine(
+        url,
         pool_size=10,
         max_overflow=20,
         pool_timeout=30,
@@ -25,11 +30,64 @@ else:
         pool_pre_ping=True  # Verify connection before using it
     )
 
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for reports, exports and the expense list (own pool).
+# Without DATABASE_READ_URL reads go to the primary.
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+read_engine = _create_engine(SQLALCHEMY_READ_DATABASE_URL) if SQLALCHEMY_READ_DATABASE_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Sent by the client right after its own write: the replica may lag, read from the primary
+READ_PRIMARY_HEADER = "X-Read-Primary"
+# Upper bound of replica lag, seconds; the frontend sends READ_PRIMARY_HEADER for as long
+READ_REPLICA_LAG = float(os.getenv("DATABASE_READ_LAG_SECONDS", "5"))
+
+# Async engine for `async def` routes and bot handlers: same database, async driver
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def to_async_url(url: str):
+    """postgresql[+psycopg2]://... -> postgresql+asyncpg://..., sqlite:// -> sqlite+aiosqlite://"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL))
+else:
+    async_engine = create_async_engine(
+        to_async_url(SQLALCHEMY_DATABASE_URL),
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True
+    )
+
+def _naive_utc(value):
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+if async_engine.dialect.name == "postgresql":
+    # asyncpg rejects tz-aware datetimes for TIMESTAMP WITHOUT TIME ZONE columns,
+    # psycopg2 converts them to the session time zone (UTC). Do the same here.
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute", retval=True)
+    def _aware_datetimes_to_utc(conn, cursor, statement, parameters, context, executemany):
+        # executemany passes a list of rows; insertmanyvalues batches are flat
+        if parameters and isinstance(parameters[0], (list, tuple)):
+            parameters = [tuple(_naive_utc(v) for v in row) for row in parameters]
+        elif parameters:
+            parameters = tuple(_naive_utc(v) for v in parameters)
+        return statement, parameters
+
+# expire_on_commit=False: with AsyncSession an expired attribute cannot be lazily reloaded
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 @contextmanager
 def database_session():
@@ -48,3 +106,39 @@ def get_db():
     """Generator for FastAPI dependency injection."""
     with database_session() as db:
         yield db
+
+@contextmanager
+def read_database_session(primary: bool = False):
+    """Read-only session: replica by default, primary when primary=True."""
+    db = SessionLocal() if primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
+
+def reads_primary(request: Request) -> bool:
+    return request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true")
+
+def get_read_db(request: Request):
+    """Dependency for read-only routes. Sticks to the primary if READ_PRIMARY_HEADER is set."""
+    with read_database_session(primary=reads_primary(request)) as db:
+        yield db
+
+@asynccontextmanager
+async def async_database_session():
+    """Async counterpart of database_session() (AsyncSession, non-blocking driver)."""
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+async def get_async_db():
+    """Async generator for FastAPI dependency injection."""
+    async with async_database_session() as db:
+        yield db
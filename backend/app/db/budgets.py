@@ -0,0 +1,183 @@
+"""
+Месячные бюджеты проектов и филиалов и счётчики расхода (таблица project_spend_counters).
+
+Бюджет — сумма в UZS на календарный месяц: Project.monthly_budget и BranchBudget.
+Расход — одобренные и подтверждённые заявки (группы Approved и Confirmed итогов
+аналитики) без возвратов, по месяцу даты заявки. Строка счётчика — (scope, key, month):
+scope=project — по project_id, scope=branch — по филиалу автора заявки.
+
+Счётчики ведёт app/db/rollups.py в тех же местах и в той же транзакции, что и дневные
+итоги: создание заявки, переход в учитываемые статусы и обратно, смена филиала автора,
+удаление проекта, rebuild. Поэтому «сколько проект потратил в этом месяце» — чтение
+одной строки по первичному ключу, без просмотра заявок.
+"""
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import Date, String, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+PROJECT = "project"
+BRANCH = "branch"
+REFUND_TYPES = ("refund", "blank_refund")
+
+
+def month_start(value: datetime.date = None) -> datetime.date:
+    """Первый день месяца value; по умолчанию — текущего месяца по тем же часам, которыми
+    crud ставит ExpenseRequest.date (Ташкент, UTC+5), иначе первые 5 часов месяца
+    читался бы прошлый."""
+    if value is None:
+        from app.db.crud import tashkent_now  # crud → rollups → budgets
+        value = tashkent_now()
+    return datetime.date(value.year, value.month, 1)
+
+
+def _month(db: Session):
+    E = models.ExpenseRequest
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc("month", E.date), Date)
+    return func.date(E.date, "start of month", type_=Date)
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"project_spend_counters: dialect {dialect} is not supported")
+    return insert(models.ProjectSpendCounter)
+
+
+def apply(db: Session, sign: int, *criteria):
+    """Добавляет (sign=1) или вычитает (sign=-1) заявки, отобранные criteria.
+
+    Какие статусы учитываются, решает вызывающий (rollups) — здесь отсекаются
+    только возвраты и заявки без проекта/филиала.
+    """
+    E, M, C = models.ExpenseRequest, models.TeamMember, models.ProjectSpendCounter
+    # Один и тот же объект в SELECT и GROUP BY — иначе PostgreSQL не узнает выражение
+    month = _month(db)
+    base = [E.date.isnot(None), func.coalesce(E.request_type, "expense").notin_(REFUND_TYPES), *criteria]
+    # Сначала строки проектов, потом филиалов — во всех транзакциях в одном порядке
+    for scope, key in ((PROJECT, E.project_id), (BRANCH, M.branch)):
+        query = select(
+            literal(scope, String), key, month,
+            func.count() * sign, func.sum(func.coalesce(E.amount_uzs, 0)) * sign,
+        ).select_from(E)
+        if scope == BRANCH:
+            query = query.join(M, E.created_by_id == M.id)
+        query = query.where(key.isnot(None), key != "", *base).group_by(key, month)
+
+        stmt = _insert(db).from_select(["scope", "key", "month", "count", "amount_uzs"], query)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["scope", "key", "month"],
+            set_={"count": C.count + stmt.excluded.count, "amount_uzs": C.amount_uzs + stmt.excluded.amount_uzs},
+        )
+        db.execute(stmt)
+
+
+def forget_project(db: Session, project_id: str, *criteria):
+    """Перед удалением проекта: его заявки уходят и из счётчиков филиалов."""
+    apply(db, -1, models.ExpenseRequest.project_id == project_id, *criteria)
+    C = models.ProjectSpendCounter
+    db.query(C).filter(C.scope == PROJECT, C.key == project_id).delete(synchronize_session=False)
+
+
+# Чтение
+
+def spent(db: Session, scope: str, keys, month: datetime.date) -> dict:
+    """key → (сумма, число заявок) за месяц: поиск по первичному ключу."""
+    keys = {key for key in keys if key}
+    if not keys:
+        return {}
+    C = models.ProjectSpendCounter
+    rows = db.query(C.key, C.amount_uzs, C.count).filter(C.scope == scope, C.month == month, C.key.in_(keys))
+    return {key: (amount, count) for key, amount, count in rows}
+
+
+def budget_status(budget, counter, month: datetime.date) -> dict:
+    amount, count = counter or (Decimal("0"), 0)
+    return {
+        "month": month.strftime("%Y-%m"),
+        "budget": budget,
+        "spent": amount,
+        "remaining": budget - amount if budget is not None else None,
+        "count": int(count),
+    }
+
+
+def attach_to_projects(db: Session, projects, month: datetime.date = None):
+    """project.budget — бюджет и расход за месяц (по умолчанию текущий) для ProjectSchema."""
+    month = month or month_start()
+    counters = spent(db, PROJECT, [project.id for project in projects], month)
+    for project in projects:
+        project.budget = budget_status(project.monthly_budget, counters.get(project.id), month)
+    return projects
+
+
+def project_statuses(db: Session, month: datetime.date = None) -> list:
+    """Проекты с бюджетом или расходом за месяц — для экрана бюджетов."""
+    month = month or month_start()
+    P, C = models.Project, models.ProjectSpendCounter
+    counters = {
+        key: (amount, count)
+        for key, amount, count in db.query(C.key, C.amount_uzs, C.count).filter(C.scope == PROJECT, C.month == month)
+    }
+    projects = db.query(P.id, P.name, P.code, P.monthly_budget).order_by(P.code)
+    return [
+        {"project_id": id, "name": name, "code": code, **budget_status(budget, counters.get(id), month)}
+        for id, name, code, budget in projects
+        if budget is not None or id in counters
+    ]
+
+
+def branch_statuses(db: Session, month: datetime.date = None) -> list:
+    """Филиалы с бюджетом или расходом за месяц."""
+    month = month or month_start()
+    C = models.ProjectSpendCounter
+    budgets = dict(db.query(models.BranchBudget.branch, models.BranchBudget.monthly_budget))
+    counters = {
+        key: (amount, count)
+        for key, amount, count in db.query(C.key, C.amount_uzs, C.count).filter(C.scope == BRANCH, C.month == month)
+    }
+    return [
+        {"branch": branch, **budget_status(budgets.get(branch), counters.get(branch), month)}
+        for branch in sorted(set(budgets) | set(counters))
+    ]
+
+
+def attach_to_expenses(db: Session, expenses):
+    """expense.budget — бюджеты проекта и филиала автора за месяц заявки.
+
+    На страницу заявок — несколько запросов по первичным ключам, сколько бы заявок ни было.
+    """
+    M, P = models.TeamMember, models.Project
+    project_ids = {expense.project_id for expense in expenses if expense.project_id}
+    author_ids = {expense.created_by_id for expense in expenses if expense.created_by_id}
+    project_budgets = dict(db.query(P.id, P.monthly_budget).filter(P.id.in_(project_ids))) if project_ids else {}
+    branches = dict(db.query(M.id, M.branch).filter(M.id.in_(author_ids))) if author_ids else {}
+    branch_budgets = dict(db.query(models.BranchBudget.branch, models.BranchBudget.monthly_budget))
+
+    by_month = {}
+    for expense in expenses:
+        expense.budget = None
+        if expense.date is not None:
+            by_month.setdefault(month_start(expense.date), []).append(expense)
+    for month, month_expenses in by_month.items():
+        project_counters = spent(db, PROJECT, [expense.project_id for expense in month_expenses], month)
+        branch_counters = spent(db, BRANCH, [branches.get(expense.created_by_id) for expense in month_expenses], month)
+        for expense in month_expenses:
+            branch = branches.get(expense.created_by_id)
+            expense.budget = {
+                "project": budget_status(
+                    project_budgets.get(expense.project_id), project_counters.get(expense.project_id), month
+                ) if expense.project_id in project_budgets else None,
+                "branch": dict(
+                    branch=branch, **budget_status(branch_budgets.get(branch), branch_counters.get(branch), month)
+                ) if branch else None,
+            }
+    return expenses
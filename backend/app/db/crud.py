@@ -1,10 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, tuple_
 from app.db import models, schemas
+from app.db import search as expense_search
+from app.db.expense_query import ExpenseQuerySpec
+from app.db import request_ids
+from app.db import rollups
 from app.core import auth
 from decimal import Decimal
 
+import base64
 import datetime
+import json
 
 # Tashkent timezone: UTC+5
 TASHKENT_TZ = datetime.timezone(datetime.timedelta(hours=5))
@@ -13,28 +19,25 @@ def tashkent_now() -> datetime.datetime:
     """Return current datetime in Tashkent time (UTC+5)."""
     return datetime.datetime.now(tz=TASHKENT_TZ)
 
-# Atomic counter logic
+def amount_in_uzs(amount: Decimal, currency: str, usd_rate: Decimal = None) -> Decimal:
+    """Сумма в UZS по курсу USD, зафиксированному в заявке."""
+    amount = Decimal(str(amount or 0))
+    if currency == "USD" and usd_rate:
+        amount *= Decimal(str(usd_rate))
+    return amount.quantize(Decimal("0.01"))
+
 def generate_request_id(db: Session, project_code: str):
-    # Using a simple SELECT for update (PostgreSQL style recommended in plan)
-    # For SQLite, it's naturally serial in a transaction
-    counter_record = db.query(models.ProjectCounter).filter(models.ProjectCounter.project_code == project_code).with_for_update().first()
-    
-    if not counter_record:
-        counter_record = models.ProjectCounter(project_code=project_code, counter=1)
-        db.add(counter_record)
-        next_val = 1
-    else:
-        counter_record.counter += 1
-        next_val = counter_record.counter
-        
-    return f"{project_code}-{next_val}"
+    # Способ выдачи номера (sequence / block / table) — см. app/db/request_ids.py
+    return request_ids.allocate_request_id(db, project_code)
 
 # Projects
 def get_projects(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Project).offset(skip).limit(limit).all()
 
 def create_project(db: Session, project: schemas.ProjectCreate):
-    db_project = models.Project(name=project.name, code=project.code, templates=project.templates)
+    db_project = models.Project(
+        name=project.name, code=project.code, templates=project.templates, monthly_budget=project.monthly_budget
+    )
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
@@ -49,11 +52,29 @@ def delete_project(db: Session, project_id: str):
     if project:
         # Delete counter
         db.query(models.ProjectCounter).filter(models.ProjectCounter.project_code == project.code).delete()
+        rollups.forget_project(db, project.id)
         # Delete project (CASCADE will handle associations and expenses)
         db.delete(project)
         db.commit()
     return True
 
+def set_project_budget(db: Session, project_id: str, monthly_budget):
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        return None
+    project.monthly_budget = monthly_budget
+    db.commit()
+    db.refresh(project)
+    return project
+
+def set_branch_budget(db: Session, branch: str, monthly_budget):
+    """monthly_budget=None снимает бюджет филиала."""
+    if monthly_budget is None:
+        db.query(models.BranchBudget).filter(models.BranchBudget.branch == branch).delete()
+    else:
+        db.merge(models.BranchBudget(branch=branch, monthly_budget=monthly_budget))
+    db.commit()
+
 def add_project_member(db: Session, project_id: str, member_id: str):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     member = db.query(models.TeamMember).filter(models.TeamMember.id == member_id).first()
@@ -104,6 +125,9 @@ def create_team_member(db: Session, member: schemas.TeamMemberCreate):
     return db_member
 
 def reactivate_team_member(db: Session, db_user: models.TeamMember, member: schemas.TeamMemberCreate):
+    branch_changed = db_user.branch != member.branch
+    if branch_changed:
+        rollups.remove(db, models.ExpenseRequest.created_by_id == db_user.id)
     db_user.last_name = member.last_name
     db_user.first_name = member.first_name
     db_user.password_hash = auth.get_password_hash(member.password)
@@ -119,7 +143,10 @@ def reactivate_team_member(db: Session, db_user: models.TeamMember, member: sche
         project = db.query(models.Project).filter(models.Project.id == project_id).first()
         if project:
             db_user.projects.append(project)
-            
+
+    if branch_changed:
+        db.flush()
+        rollups.add(db, models.ExpenseRequest.created_by_id == db_user.id)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -127,7 +154,12 @@ def reactivate_team_member(db: Session, db_user: models.TeamMember, member: sche
 def delete_team_member(db: Session, member_id: str):
     member = db.query(models.TeamMember).filter(models.TeamMember.id == member_id).first()
     if member:
+        # Заявки остаются без автора (SET NULL) и в итогах переходят в филиал «Другое»
+        expense_ids = [row.id for row in db.query(models.ExpenseRequest.id).filter(models.ExpenseRequest.created_by_id == member.id)]
+        rollups.remove(db, models.ExpenseRequest.id.in_(expense_ids))
         db.delete(member)
+        db.flush()
+        rollups.add(db, models.ExpenseRequest.id.in_(expense_ids))
         db.commit()
     return True
 
@@ -141,7 +173,10 @@ def update_team_member(db: Session, member_id: str, update: schemas.TeamMemberUp
         member.first_name = update.first_name
     if update.position is not None:
         member.position = update.position
-    if update.branch is not None:
+    branch_changed = update.branch is not None and update.branch != member.branch
+    if branch_changed:
+        # Итоги аналитики хранят филиал автора — переносим его заявки в новый филиал
+        rollups.remove(db, models.ExpenseRequest.created_by_id == member.id)
         member.branch = update.branch
     if update.team is not None:
         member.team = update.team
@@ -157,124 +192,141 @@ def update_team_member(db: Session, member_id: str, update: schemas.TeamMemberUp
             project = db.query(models.Project).filter(models.Project.id == project_id).first()
             if project:
                 member.projects.append(project)
+    if branch_changed:
+        db.flush()
+        rollups.add(db, models.ExpenseRequest.created_by_id == member.id)
     db.commit()
     db.refresh(member)
     return member
 
 
 # Expenses
+def _order_and_page(db: Session, query, skip: int = 0, limit: int = 100, after: tuple = None, relevance: str = None):
+    if relevance:
+        # Ранжирование по строке поиска; keyset-курсор здесь неприменим
+        return query.order_by(*expense_search.relevance_order(db, relevance)).offset(skip).limit(limit)
+
+    query = query.order_by(models.ExpenseRequest.date.desc(), models.ExpenseRequest.id.desc())
+
+    if after:
+        # Row-value comparison matches ix_expense_requests_date_id, so the DB
+        # seeks straight to the key instead of scanning skipped rows
+        query = query.where(tuple_(models.ExpenseRequest.date, models.ExpenseRequest.id) < tuple(after))
+        return query.limit(limit)
+
+    return query.offset(skip).limit(limit)
+
 def get_expenses(
     db: Session, 
-    project_id: str = None, 
-    status: str = None, 
-    user_id: str = None, 
-    request_type: str = None,
-    branch: str = None,
-    team: str = None,
-    search: str = None,
-    from_date: datetime.datetime = None,
-    to_date: datetime.datetime = None,
+    spec: ExpenseQuerySpec,
     skip: int = 0, 
-    limit: int = 100
+    limit: int = 100,
+    after: tuple = None,
+    sort: str = "date",
 ):
-    query = db.query(models.ExpenseRequest)
-    
-    # Filter by user or branch/team (requires join)
-    if branch or team:
-        query = query.join(models.TeamMember, models.ExpenseRequest.created_by_id == models.TeamMember.id)
-        if branch:
-            query = query.filter(models.TeamMember.branch == branch)
-        if team:
-            query = query.filter(models.TeamMember.team == team)
-            
-    if user_id:
-        query = query.filter(models.ExpenseRequest.created_by_id == user_id)
-        
-    if project_id:
-        query = query.filter(models.ExpenseRequest.project_id == project_id)
-        
-    if request_type:
-        types = [t.strip() for t in request_type.split(",")]
-        if len(types) > 1:
-            query = query.filter(models.ExpenseRequest.request_type.in_(types))
-        else:
-            query = query.filter(models.ExpenseRequest.request_type == request_type)
-
-    if status:
-        statuses = [s.strip() for s in status.split(",")]
-        if len(statuses) > 1:
-            query = query.filter(models.ExpenseRequest.status.in_(statuses))
-        else:
-            query = query.filter(models.ExpenseRequest.status == status)
-
-    if search:
-        search_lower = f"%{search.lower()}%"
-        query = query.filter(
-            (models.ExpenseRequest.request_id.ilike(search_lower)) |
-            (models.ExpenseRequest.purpose.ilike(search_lower))
-        )
+    """Список заявок по spec, отсортированный по (date desc, id desc).
 
-    if from_date:
-        query = query.filter(models.ExpenseRequest.date >= from_date)
-    if to_date:
-        query = query.filter(models.ExpenseRequest.date <= to_date)
-            
-    return query.order_by(models.ExpenseRequest.date.desc()).offset(skip).limit(limit).all()
+    after — ключ (date, id) последней записи предыдущей страницы (keyset-пагинация).
+    Если передан, skip игнорируется и выборка начинается сразу после этого ключа.
+    sort="relevance" при заданном search — сначала самые релевантные.
+    """
+    relevance = spec.search if sort == "relevance" else None
+    query = _order_and_page(db, spec.select(db), skip=skip, limit=limit, after=after, relevance=relevance)
+    return db.scalars(query).all()
+
+def encode_expense_cursor(expense: models.ExpenseRequest) -> str:
+    """Упаковывает ключ (date, id) заявки в непрозрачный курсор для клиента."""
+    payload = json.dumps({"d": expense.date.isoformat(), "i": expense.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_expense_cursor(cursor: str) -> tuple:
+    """Разбирает курсор обратно в (date, id). Бросает ValueError при битом курсоре."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.datetime.fromisoformat(payload["d"]), str(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
-def count_expenses(
+def get_expenses_with_total(
     db: Session,
-    project_id: str = None,
-    status: str = None,
-    user_id: str = None,
-    request_type: str = None,
-    branch: str = None,
-    team: str = None,
-    search: str = None,
-    from_date: datetime.datetime = None,
-    to_date: datetime.datetime = None
-) -> int:
-    """Считает количество заявок по тем же фильтрам что get_expenses."""
-    query = db.query(models.ExpenseRequest)
-
-    if branch or team:
-        query = query.join(models.TeamMember, models.ExpenseRequest.created_by_id == models.TeamMember.id)
-        if branch:
-            query = query.filter(models.TeamMember.branch == branch)
-        if team:
-            query = query.filter(models.TeamMember.team == team)
-
-    if user_id:
-        query = query.filter(models.ExpenseRequest.created_by_id == user_id)
-    if project_id:
-        query = query.filter(models.ExpenseRequest.project_id == project_id)
-    if request_type:
-        types = [t.strip() for t in request_type.split(",")]
-        if len(types) > 1:
-            query = query.filter(models.ExpenseRequest.request_type.in_(types))
-        else:
-            query = query.filter(models.ExpenseRequest.request_type == request_type)
-    if status:
-        statuses = [s.strip() for s in status.split(",")]
-        if len(statuses) > 1:
-            query = query.filter(models.ExpenseRequest.status.in_(statuses))
-        else:
-            query = query.filter(models.ExpenseRequest.status == status)
-
-    if search:
-        search_lower = f"%{search.lower()}%"
-        query = query.filter(
-            (models.ExpenseRequest.request_id.ilike(search_lower)) |
-            (models.ExpenseRequest.purpose.ilike(search_lower))
+    spec: ExpenseQuerySpec,
+    skip: int = 0,
+    limit: int = 100,
+    sort: str = "date",
+):
+    """Страница заявок и общее число по spec за один запрос (count(*) over ()).
+
+    Возвращает (items, total).
+    """
+    query = spec.select(db, models.ExpenseRequest, func.count().over().label("total"))
+    relevance = spec.search if sort == "relevance" else None
+    rows = db.execute(_order_and_page(db, query, skip=skip, limit=limit, relevance=relevance)).all()
+    if rows:
+        return [row[0] for row in rows], rows[0][1]
+    # Страница за пределами выборки: оконная функция не вернула ни одной строки
+    return [], (count_expenses(db, spec) if skip else 0)
+
+def count_expenses(db: Session, spec: ExpenseQuerySpec) -> int:
+    """Считает количество заявок по spec — тем же фильтрам, что у get_expenses."""
+    return db.scalar(spec.select(db, func.count(models.ExpenseRequest.id)))
+
+def _expense_item_rows_query(db: Session, spec: ExpenseQuerySpec, limit: int = None):
+    page = spec.select(db, models.ExpenseRequest.id)
+    if limit is not None:
+        page = _order_and_page(db, page, limit=limit)
+    page = page.subquery()
+
+    Item = models.ExpenseItem
+    return (
+        select(
+            models.ExpenseRequest.request_id,
+            models.ExpenseRequest.date,
+            models.ExpenseRequest.purpose,
+            models.ExpenseRequest.project_code,
+            models.ExpenseRequest.project_name,
+            models.ExpenseRequest.created_by,
+            models.ExpenseRequest.status,
+            models.ExpenseRequest.usd_rate,
+            Item.name,
+            Item.quantity,
+            Item.amount,
+            Item.currency,
+            Item.amount_uzs,
+            (Item.quantity * Item.amount).label("line_total"),
+            func.count().over(partition_by=Item.expense_id).label("items_count"),
         )
+        .join(page, page.c.id == models.ExpenseRequest.id)
+        .join(Item, Item.expense_id == models.ExpenseRequest.id)
+        .order_by(models.ExpenseRequest.date.desc(), models.ExpenseRequest.id.desc(), Item.position)
+    )
+
+def get_expense_item_rows(db: Session, spec: ExpenseQuerySpec, limit: int = 5000):
+    """Позиции заявок для экспорта — одним JOIN-запросом по expense_items.
 
-    if from_date:
-        query = query.filter(models.ExpenseRequest.date >= from_date)
-    if to_date:
-        query = query.filter(models.ExpenseRequest.date <= to_date)
+    limit ограничивает число заявок (как раньше в экспорте), а не позиций.
+    Каждая строка — заявка + позиция + line_total (quantity * amount) и
+    items_count (число позиций в заявке).
+    """
+    return db.execute(_expense_item_rows_query(db, spec, limit)).all()
 
-    return query.count()
+def iter_expense_item_rows(db: Session, spec: ExpenseQuerySpec, chunk_size: int = 1000):
+    """Те же строки без лимита, по мере чтения: yield_per держит в памяти
+    не больше chunk_size строк (на PostgreSQL — серверный курсор)."""
+    return db.execute(_expense_item_rows_query(db, spec).execution_options(yield_per=chunk_size))
 
-def create_expense_request(db: Session, expense: schemas.ExpenseRequestCreate, user_id: str, usd_rate: Decimal = None):
+def count_expense_item_rows(db: Session, spec: ExpenseQuerySpec) -> int:
+    """Сколько строк вернёт iter_expense_item_rows (прогресс фоновой выгрузки)."""
+    page = spec.select(db, models.ExpenseRequest.id).subquery()
+    Item = models.ExpenseItem
+    return db.scalar(select(func.count()).select_from(Item).join(page, page.c.id == Item.expense_id))
+
+def create_expense_request(db: Session, expense: schemas.ExpenseRequestCreate, user_id: str, usd_rate: Decimal = None, refund_data: dict = None):
+    """
+    Создаёт заявку одной транзакцией: номер, сама заявка, позиции, первая запись
+    истории и дневные итоги уходят одним commit — промежуточных состояний в базе нет.
+    refund_data — готовый JSON вместо expense.refund_data (web-форма сохраняет payload целиком).
+    """
     if user_id == "admin":
         user_name = "Safina Admin"
         user_position = "Administrator"
@@ -335,11 +387,13 @@ def create_expense_request(db: Session, expense: schemas.ExpenseRequestCreate, u
     db_expense = models.ExpenseRequest(
         request_id=request_id,
         date=expense.date or tashkent_now(),
+        status="request",
         purpose=expense.purpose,
         items=items_serializable,
         total_amount=float(total_amount) if total_amount else 0,
         currency=currency,
         usd_rate=float(usd_rate) if (usd_rate and currency == "USD") else None,
+        amount_uzs=amount_in_uzs(total_amount, currency, usd_rate),
         created_by_id=user_id if user_id != "admin" else None,
         created_by=user_name,
         created_by_position=user_position,
@@ -349,21 +403,37 @@ def create_expense_request(db: Session, expense: schemas.ExpenseRequestCreate, u
         request_type=expense.request_type,
         template_key=expense.template_key,
         receipt_photo_file_id=expense.receipt_photo_file_id,
-        refund_data=expense.refund_data.dict() if expense.refund_data else None
+        refund_data=refund_data if refund_data is not None else (expense.refund_data.dict() if expense.refund_data else None),
+        search_text=expense_search.build_search_text(
+            request_id=request_id,
+            purpose=expense.purpose,
+            created_by=user_name,
+            project_name=project_name,
+            items=items_serializable,
+        )
     )
-    db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
-    
+    # Нормализованные позиции уходят тем же commit, что и сама заявка
+    for idx, item in enumerate(expense.items):
+        item_currency = str(getattr(item.currency, 'value', item.currency))
+        db_expense.line_items.append(models.ExpenseItem(
+            position=idx,
+            name=item.name,
+            quantity=item.quantity,
+            amount=item.amount,
+            currency=item_currency,
+            amount_uzs=amount_in_uzs(item.amount * item.quantity, item_currency, usd_rate),
+        ))
     # Initial status history
-    history = models.ExpenseStatusHistory(
-        expense_id=db_expense.id,
+    db_expense.status_history.append(models.ExpenseStatusHistory(
         status=db_expense.status,
         changed_by_id=user_id if user_id != "admin" else None,
         changed_by_name=user_name,
         comment="Создание заявки"
-    )
-    db.add(history)
+    ))
+    db.add(db_expense)
+    db.flush()
+    # Итоги обновляются последними: строка daily_expense_rollups блокируется только до commit
+    rollups.record_created(db, db_expense)
     db.commit()
     
     return db_expense
@@ -374,6 +444,7 @@ def update_expense_status(db: Session, expense_id: str, update: schemas.ExpenseS
         old_status = db_expense.status
         new_status_str = update.status.value if hasattr(update.status, "value") else update.status
         db_expense.status = new_status_str
+        rollups.record_status_change(db, db_expense, old_status)
         if update.comment:
             db_expense.status_comment = update.comment
             
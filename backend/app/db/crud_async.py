@@ -0,0 +1,131 @@
+"""
+Async-версии функций crud для AsyncSession (async def роуты и хендлеры бота).
+
+Простые выборки написаны на select(). Сложная логика записи (создание заявки,
+смена статуса, выдача номера) не дублируется: она выполняется через
+AsyncSession.run_sync — тот же код из crud.py, но запросы идут через async-драйвер
+и не блокируют event loop.
+
+Сессия создаётся с expire_on_commit=False, а ленивые загрузки в async недоступны,
+поэтому нужные связи подгружаются явно (with_projects / for_document).
+"""
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db import models, schemas, crud, budgets
+from app.db.expense_query import ExpenseQuerySpec
+
+
+# Team
+async def get_member(db: AsyncSession, member_id: str, with_projects: bool = False):
+    query = select(models.TeamMember).where(models.TeamMember.id == member_id)
+    if with_projects:
+        query = query.options(selectinload(models.TeamMember.projects))
+    return (await db.execute(query)).scalars().first()
+
+async def get_member_by_chat_id(db: AsyncSession, chat_id: int, with_projects: bool = False):
+    query = select(models.TeamMember).where(models.TeamMember.telegram_chat_id == chat_id)
+    if with_projects:
+        query = query.options(selectinload(models.TeamMember.projects))
+    return (await db.execute(query)).scalars().first()
+
+async def get_member_by_login(db: AsyncSession, login: str):
+    query = select(models.TeamMember).where(models.TeamMember.login == login)
+    return (await db.execute(query)).scalars().first()
+
+async def get_members_by_ids(db: AsyncSession, member_ids: list, with_chat_only: bool = True):
+    query = select(models.TeamMember).where(models.TeamMember.id.in_(member_ids))
+    if with_chat_only:
+        query = query.where(models.TeamMember.telegram_chat_id.isnot(None))
+    return (await db.execute(query)).scalars().all()
+
+async def get_chat_ids_by_position(db: AsyncSession, position: str) -> list:
+    query = select(models.TeamMember.telegram_chat_id).where(
+        models.TeamMember.position == position,
+        models.TeamMember.telegram_chat_id.isnot(None),
+    )
+    return list((await db.execute(query)).scalars().all())
+
+async def unlink_chat(db: AsyncSession, chat_id: int):
+    """Отвязывает Telegram chat_id от всех пользователей (выход из бота)."""
+    members = (await db.execute(
+        select(models.TeamMember).where(models.TeamMember.telegram_chat_id == chat_id)
+    )).scalars().all()
+    for member in members:
+        member.telegram_chat_id = None
+
+
+# Projects
+async def get_projects(db: AsyncSession):
+    return (await db.execute(select(models.Project))).scalars().all()
+
+
+# Settings
+async def get_setting(db: AsyncSession, key: str):
+    return await db.get(models.Setting, key)
+
+async def set_setting(db: AsyncSession, key: str, value: str):
+    setting = await db.get(models.Setting, key)
+    if setting:
+        setting.value = value
+    else:
+        setting = models.Setting(key=key, value=value)
+        db.add(setting)
+    return setting
+
+
+# Expenses
+async def get_expense(db: AsyncSession, expense_id: str, for_document: bool = False):
+    """for_document — подгрузить позиции и автора (их читает docx_service)."""
+    query = select(models.ExpenseRequest).where(models.ExpenseRequest.id == expense_id)
+    if for_document:
+        query = query.options(
+            selectinload(models.ExpenseRequest.line_items),
+            selectinload(models.ExpenseRequest.created_by_user),
+        )
+    return (await db.execute(query)).scalars().first()
+
+async def get_oldest_expenses_by_status(db: AsyncSession, status: str, limit: int = 10):
+    query = (
+        select(models.ExpenseRequest)
+        .where(models.ExpenseRequest.status == status)
+        .order_by(models.ExpenseRequest.date.asc())
+        .limit(limit)
+    )
+    return (await db.execute(query)).scalars().all()
+
+async def attach_budgets(db: AsyncSession, expenses):
+    return await db.run_sync(lambda session: budgets.attach_to_expenses(session, expenses))
+
+async def get_expense_item_rows(db: AsyncSession, spec: ExpenseQuerySpec, limit: int = 5000):
+    return await db.run_sync(lambda session: crud.get_expense_item_rows(session, spec, limit=limit))
+
+async def create_expense_request(
+    db: AsyncSession,
+    expense: schemas.ExpenseRequestCreate,
+    user_id: str,
+    usd_rate: Decimal = None,
+    refund_data: dict = None,
+):
+    db_expense = await db.run_sync(
+        lambda session: crud.create_expense_request(
+            session, expense, user_id=user_id, usd_rate=usd_rate, refund_data=refund_data
+        )
+    )
+    # Как и в sync-версии, отдаём значения в том виде, в каком они легли в базу
+    await db.refresh(db_expense)
+    return db_expense
+
+async def update_expense_status(
+    db: AsyncSession,
+    expense_id: str,
+    update: schemas.ExpenseStatusUpdate,
+    user_id: str = None,
+    user_name: str = None,
+):
+    return await db.run_sync(
+        lambda session: crud.update_expense_status(session, expense_id, update, user_id=user_id, user_name=user_name)
+    )
@@ -0,0 +1,127 @@
+"""
+Фильтры заявок одним объектом: список, подсчёт, CSV/XLSX-экспорт и фоновые выгрузки.
+
+ExpenseQuerySpec разбирается из параметров запроса один раз (зависимости
+expense_query_spec / export_query_spec в app/api/expenses.py): "all" из фронтенда,
+даты ISO, статусы по умолчанию для экспорта, права доступа (не админ видит только
+свои заявки). Дальше из него строится SQLAlchemy Select (spec.select) — единственная
+цепочка фильтров для всех этих путей.
+
+spec.digest — стабильный хэш нормализованных фильтров (статусы и типы без учёта
+порядка и пробелов): ключ для кэшей и повторного использования файлов выгрузки.
+"""
+import datetime
+import hashlib
+from typing import Optional, Tuple
+
+from pydantic import BaseModel, validator
+from sqlalchemy import select
+
+from app.core import auth
+from app.db import models
+from app.db import search as expense_search
+
+
+def _parse_date(value: str, end: bool = False) -> Optional[datetime.datetime]:
+    """ISO-дата или дата-время; end=True и голая дата — включительно по конец дня.
+    Некорректное значение — без фильтра, как раньше."""
+    if not value:
+        return None
+    try:
+        if end and len(value) <= 10:
+            return datetime.datetime.fromisoformat(value) + datetime.timedelta(days=1)
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _all_to_none(value: Optional[str]) -> Optional[str]:
+    return None if value == "all" else value
+
+
+class ExpenseQuerySpec(BaseModel):
+    """Нормализованные фильтры заявок. Пустое поле — без фильтра."""
+    project_id: Optional[str] = None
+    user_id: Optional[str] = None  # created_by_id
+    statuses: Tuple[str, ...] = ()
+    request_types: Tuple[str, ...] = ()
+    branch: Optional[str] = None  # филиал автора
+    team: Optional[str] = None  # команда автора
+    search: Optional[str] = None
+    from_date: Optional[datetime.datetime] = None
+    to_date: Optional[datetime.datetime] = None  # включительно
+    expense_id: Optional[str] = None  # одна заявка (выгрузка Excel из бота)
+
+    class Config:
+        frozen = True
+
+    @validator("statuses", "request_types", pre=True)
+    def split_values(cls, v):
+        """"a, b" или список → отсортированный кортеж без пустых и повторов."""
+        if v is None:
+            return ()
+        if isinstance(v, str):
+            v = v.split(",")
+        return tuple(sorted({item.strip() for item in v if item and item.strip()}))
+
+    @validator("search", pre=True)
+    def strip_search(cls, v):
+        return (v or "").strip() or None
+
+    @classmethod
+    def parse(cls, current_user: models.TeamMember, filters, default_statuses=()) -> "ExpenseQuerySpec":
+        """Параметры запроса (schemas.ExpenseFilterParams) → спецификация.
+
+        default_statuses — если статус не передан (экспорт: EXPORTABLE_STATUSES).
+        """
+        return cls(
+            project_id=_all_to_none(filters.project),
+            # Если зашел не админ, он видит только свои заявки
+            user_id=_all_to_none(filters.user_id) if auth.is_admin(current_user) else current_user.id,
+            statuses=filters.status or default_statuses,
+            request_types=filters.request_type,
+            branch=filters.branch,
+            team=filters.team,
+            search=filters.search,
+            from_date=_parse_date(filters.from_date),
+            to_date=_parse_date(filters.to_date, end=True),
+        )
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+
+    def criteria(self, db) -> list:
+        """Условия WHERE; db нужна поиску (индекс зависит от СУБД)."""
+        E = models.ExpenseRequest
+        criteria = []
+        if self.expense_id:
+            criteria.append(E.id == self.expense_id)
+        if self.branch:
+            criteria.append(models.TeamMember.branch == self.branch)
+        if self.team:
+            criteria.append(models.TeamMember.team == self.team)
+        if self.user_id:
+            criteria.append(E.created_by_id == self.user_id)
+        if self.project_id:
+            criteria.append(E.project_id == self.project_id)
+        for column, values in ((E.request_type, self.request_types), (E.status, self.statuses)):
+            if len(values) > 1:
+                criteria.append(column.in_(values))
+            elif values:
+                criteria.append(column == values[0])
+        if self.search:
+            criteria.append(expense_search.search_criterion(db, self.search))
+        if self.from_date:
+            criteria.append(E.date >= self.from_date)
+        if self.to_date:
+            criteria.append(E.date <= self.to_date)
+        return criteria
+
+    def select(self, db, *columns):
+        """SELECT columns (по умолчанию — заявка целиком) FROM expense_requests с фильтрами."""
+        E = models.ExpenseRequest
+        query = select(*(columns or (E,))).select_from(E)
+        if self.branch or self.team:
+            query = query.join(models.TeamMember, E.created_by_id == models.TeamMember.id)
+        return query.where(*self.criteria(db))
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Numeric, JSON, BigInteger, Text
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Enum, Numeric, JSON, BigInteger, Text, Index, UniqueConstraint
 from app.core.database import Base
 import datetime
 import uuid
@@ -7,6 +7,9 @@ import uuid
 def generate_uuid():
     return str(uuid.uuid4())
 
+# Statuses covered by the partial approval-queue index
+APPROVAL_QUEUE_STATUSES = ("pending_senior", "pending_ceo")
+
 from sqlalchemy import Table
 
 # Association table for TeamMember <-> Project
@@ -24,6 +27,7 @@ class Project(Base):
     name = Column(String, nullable=False)
     code = Column(String, unique=True, nullable=False, index=True)
     templates = Column(JSON, nullable=False, default=list) # Шаблоны назначенные Сафиной
+    monthly_budget = Column(Numeric(precision=18, scale=2), nullable=True) # UZS per calendar month, null = no budget
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     members = relationship("TeamMember", secondary=member_projects, back_populates="projects")
@@ -75,18 +79,62 @@ class ExpenseRequest(Base):
     internal_comment = Column(String, nullable=True)
     usd_rate = Column(Numeric(precision=18, scale=6), nullable=True)
     # Course USD/UZS at creation time. Null for UZS expenses.
+    amount_uzs = Column(Numeric(precision=18, scale=2), nullable=True, index=True)
+    # total_amount converted at usd_rate, computed on write (crud.amount_in_uzs)
     status_comment = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Any ORM update bumps it; Parquet snapshots use it to find changed months,
+    # the DuckDB analytics engine to fetch rows changed since the snapshot
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+    # request_id + purpose + created_by + project_name + item names, see app/db/search.py.
+    # On PostgreSQL the table also has a generated tsvector column `search_vector`
+    # (created by migration, not mapped here so SQLite create_all keeps working)
+    search_text = Column(Text, nullable=True)
     
     project = relationship("Project", back_populates="expenses")
     created_by_user = relationship("TeamMember", back_populates="expenses")
     status_history = relationship("ExpenseStatusHistory", back_populates="expense", cascade="all, delete-orphan")
+    # Normalized copy of `items` (JSON stays for API compatibility)
+    line_items = relationship("ExpenseItem", back_populates="expense", cascade="all, delete-orphan", order_by="ExpenseItem.position")
+
+    __table_args__ = (
+        # Keyset pagination of the list: ORDER BY date DESC, id DESC
+        Index("ix_expense_requests_date_id", "date", "id"),
+        # Hot list filters, each followed by ORDER BY date DESC (see README, "Индексы")
+        Index("ix_expense_requests_status_date", status, date.desc(), id.desc()),
+        Index("ix_expense_requests_created_by_date", created_by_id, date.desc(), id.desc()),
+        Index("ix_expense_requests_project_date", project_id, date.desc(), id.desc()),
+        # Approval queues (CFO/CEO screens) — a tiny slice of the table
+        Index(
+            "ix_expense_requests_approval_queue", date.desc(), id.desc(),
+            postgresql_where=status.in_(APPROVAL_QUEUE_STATUSES),
+            sqlite_where=status.in_(APPROVAL_QUEUE_STATUSES),
+        ),
+    )
+
+class ExpenseItem(Base):
+    __tablename__ = "expense_items"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    expense_id = Column(String, ForeignKey("expense_requests.id", ondelete="CASCADE"), nullable=False) # indexed by uq_expense_items_expense_position
+    position = Column(Integer, nullable=False) # 0-based order inside the request
+    name = Column(String, nullable=False, index=True)
+    quantity = Column(Numeric(precision=18, scale=4), nullable=False)
+    amount = Column(Numeric(precision=18, scale=2), nullable=False) # Price per unit
+    currency = Column(String, nullable=False)
+    amount_uzs = Column(Numeric(precision=18, scale=2), nullable=False) # quantity * amount in UZS at the request's usd_rate
+    
+    expense = relationship("ExpenseRequest", back_populates="line_items")
+
+    __table_args__ = (
+        UniqueConstraint("expense_id", "position", name="uq_expense_items_expense_position"),
+    )
 
 class ExpenseStatusHistory(Base):
     __tablename__ = "expense_status_history"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    expense_id = Column(String, ForeignKey("expense_requests.id", ondelete="CASCADE"), index=True)
+    expense_id = Column(String, ForeignKey("expense_requests.id", ondelete="CASCADE")) # indexed by ix_expense_status_history_expense_created
     status = Column(String, nullable=False)
     comment = Column(Text, nullable=True)
     changed_by_id = Column(String, ForeignKey("team_members.id", ondelete="SET NULL"), nullable=True)
@@ -95,12 +143,69 @@ class ExpenseStatusHistory(Base):
     
     expense = relationship("ExpenseRequest", back_populates="status_history")
 
+    __table_args__ = (
+        # History of one request in order: LEAD() OVER (PARTITION BY expense_id ORDER BY created_at)
+        Index("ix_expense_status_history_expense_created", expense_id, created_at),
+    )
+
 class ProjectCounter(Base):
     __tablename__ = "project_counters"
     
     project_code = Column(String, primary_key=True)
     counter = Column(Integer, default=0)
 
+class DailyExpenseRollup(Base):
+    """Daily totals of expense_requests for analytics, maintained by app/db/rollups.py."""
+    __tablename__ = "daily_expense_rollups"
+
+    # Key columns are NOT NULL ('' instead of NULL) so the row can be upserted on the primary key
+    day = Column(Date, primary_key=True)
+    branch = Column(String, primary_key=True, default="") # Creator's branch
+    project_id = Column(String, primary_key=True, default="")
+    project_name = Column(String, primary_key=True, default="") # Denormalized, the project segment groups by name
+    request_type = Column(String, primary_key=True, default="")
+    status_bucket = Column(String, primary_key=True) # Pending, Approved, Rejected, Confirmed, Other
+    currency = Column(String, primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+    amount_uzs = Column(Numeric(precision=18, scale=2), nullable=False, default=0)
+
+class BranchBudget(Base):
+    __tablename__ = "branch_budgets"
+
+    branch = Column(String, primary_key=True) # TeamMember.branch
+    monthly_budget = Column(Numeric(precision=18, scale=2), nullable=False) # UZS per calendar month
+
+class ProjectSpendCounter(Base):
+    """Approved spend per project and per branch for a month, maintained by app/db/budgets.py."""
+    __tablename__ = "project_spend_counters"
+
+    scope = Column(String, primary_key=True) # project, branch
+    key = Column(String, primary_key=True) # Project id or branch name
+    month = Column(Date, primary_key=True) # First day of the month
+    count = Column(Integer, nullable=False, default=0)
+    amount_uzs = Column(Numeric(precision=18, scale=2), nullable=False, default=0)
+
+class ExportJob(Base):
+    """Background CSV/XLSX export, run by app/services/analytics/export_jobs.py."""
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    # sha256 of format + filters + data fingerprint: identical requests reuse the file
+    key = Column(String, nullable=False, index=True)
+    format = Column(String, nullable=False) # csv, xlsx
+    filters = Column(JSON, nullable=False) # ExpenseQuerySpec as JSON
+    read_primary = Column(Boolean, nullable=False, default=False) # X-Read-Primary of the request
+    status = Column(String, nullable=False, default="queued", index=True) # queued, running, done, failed
+    rows = Column(Integer, nullable=False, default=0) # Rows written so far
+    total_rows = Column(Integer, nullable=True) # Known once the worker has counted them
+    file_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by_id = Column(String, ForeignKey("team_members.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow) # Progress heartbeat of a running job
+    finished_at = Column(DateTime, nullable=True)
+
 class Setting(Base):
     __tablename__ = "settings"
     
@@ -0,0 +1,213 @@
+"""
+Выдача номеров заявок (request_id вида `TST-17`, `REF-5`).
+
+Раньше номер брался из строки `project_counters` через SELECT ... FOR UPDATE внутри
+транзакции создания заявки, и все параллельные отправки в один проект (и все возвраты
+с префиксом REF) ждали друг друга до commit. Теперь способ выдачи выбирается
+переменной REQUEST_ID_ALLOCATOR:
+
+- `sequence` (по умолчанию на PostgreSQL): отдельная последовательность на префикс,
+  номер берётся через nextval() — без блокировок строк. Последовательность создаётся
+  при первом обращении и стартует со значения из project_counters.
+- `block`: процесс резервирует сразу REQUEST_ID_BLOCK_SIZE номеров в project_counters
+  короткой отдельной транзакцией и раздаёт их из памяти.
+- `table`: прежняя схема со счётчиком в транзакции заявки. Единственный вариант для
+  SQLite — там запись в базу и так идёт по одной.
+
+`sequence` и `block` не откатывают номер вместе с заявкой, поэтому в нумерации
+возможны пропуски (для `block` — ещё и при перезапуске процесса).
+
+`sequence` не пишет в project_counters (иначе вернулась бы блокировка строки), поэтому
+счётчик и последовательность сверяются при смене способа: `table` и `block` продолжают
+с большего из счётчика и последнего значения последовательности, а `sequence` при
+первом обращении процесса к префиксу поднимается до счётчика. Менять
+REQUEST_ID_ALLOCATOR можно только с перезапуском всех процессов API и бота:
+два способа одновременно на одном префиксе выдадут одинаковые номера.
+"""
+import hashlib
+import os
+import re
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+REQUEST_ID_ALLOCATOR = os.getenv("REQUEST_ID_ALLOCATOR", "auto")
+REQUEST_ID_BLOCK_SIZE = int(os.getenv("REQUEST_ID_BLOCK_SIZE", "20"))
+
+
+def format_request_id(prefix: str, number: int) -> str:
+    return f"{prefix}-{number}"
+
+
+def _engine(db: Session):
+    bind = db.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def sequence_name(prefix: str) -> str:
+    # Код проекта — произвольная строка, поэтому к «читаемой» части добавляется хэш
+    slug = re.sub(r"[^a-z0-9]+", "_", prefix.lower()).strip("_")[:30]
+    digest = hashlib.md5(prefix.encode("utf-8")).hexdigest()[:8]
+    return f"request_id_seq_{slug}_{digest}" if slug else f"request_id_seq_{digest}"
+
+
+# Последний выданный номер последовательности префикса; NULL — её нет или nextval не вызывался.
+# :sequence везде приводится к text: asyncpg выводит один тип на параметр
+_SEQUENCE_LAST = (
+    "(SELECT last_value FROM pg_sequences "
+    "WHERE schemaname = current_schema() AND sequencename = CAST(:sequence AS text))"
+)
+
+
+class TableAllocator:
+    """Счётчик в project_counters под блокировкой строки до commit заявки."""
+
+    name = "table"
+
+    def next_number(self, db: Session, prefix: str) -> int:
+        counter_record = (
+            db.query(models.ProjectCounter)
+            .filter(models.ProjectCounter.project_code == prefix)
+            .with_for_update()
+            .first()
+        )
+        # Номера, выданные последовательностью, если раньше работал `sequence`
+        issued = 0
+        if db.get_bind().dialect.name == "postgresql":
+            issued = db.execute(
+                text(f"SELECT coalesce({_SEQUENCE_LAST}, 0)"), {"sequence": sequence_name(prefix)}
+            ).scalar()
+        if not counter_record:
+            counter_record = models.ProjectCounter(project_code=prefix, counter=issued + 1)
+            db.add(counter_record)
+            return counter_record.counter
+        counter_record.counter = max(counter_record.counter or 0, issued) + 1
+        return counter_record.counter
+
+
+class SequenceAllocator:
+    """PostgreSQL: nextval() по последовательности префикса."""
+
+    name = "sequence"
+
+    def __init__(self):
+        self._known = set()
+
+    sequence_name = staticmethod(sequence_name)
+
+    def _ensure_sequence(self, db: Session, prefix: str, name: str):
+        # Без threading.Lock: создание заявки идёт и в run_sync на потоке event loop
+        # (crud_async), и поток, ждущий лок, пока его держатель ждёт базу, повесил бы
+        # весь процесс. Гонку двух вызовов решают IF NOT EXISTS и повторная проверка.
+        if name in self._known:
+            return
+        # Отдельное соединение в autocommit: DDL не должен попасть в транзакцию заявки,
+        # а ошибка гонки двух процессов — оборвать её
+        with _engine(db).connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            if exists is None:
+                start = conn.execute(
+                    text("SELECT counter FROM project_counters WHERE project_code = :prefix"),
+                    {"prefix": prefix},
+                ).scalar() or 0
+                try:
+                    conn.execute(text(f'CREATE SEQUENCE IF NOT EXISTS "{name}" START WITH {int(start) + 1}'))
+                except DBAPIError:
+                    # Параллельный процесс создал её первым
+                    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                        raise
+            else:
+                # Последовательность отстала, пока работали `table` или `block`
+                conn.execute(
+                    text(f"SELECT setval(CAST(CAST(:sequence AS text) AS regclass), counter) FROM project_counters "
+                         f"WHERE project_code = :prefix AND counter > coalesce({_SEQUENCE_LAST}, 0)"),
+                    {"sequence": name, "prefix": prefix},
+                )
+        self._known.add(name)
+
+    def next_number(self, db: Session, prefix: str) -> int:
+        name = self.sequence_name(prefix)
+        self._ensure_sequence(db, prefix, name)
+        return db.execute(text("SELECT nextval(:name)"), {"name": name}).scalar()
+
+
+class BlockAllocator:
+    """Резервирует пачку номеров в project_counters короткой отдельной транзакцией."""
+
+    name = "block"
+
+    def __init__(self, block_size: int = REQUEST_ID_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, db: Session, prefix: str) -> int:
+        """Возвращает последний номер зарезервированной пачки."""
+        params = {"prefix": prefix, "size": self.block_size, "sequence": sequence_name(prefix)}
+        # Пачка начинается после номеров, выданных последовательностью, если раньше работал `sequence`
+        with _engine(db).begin() as conn:
+            top = conn.execute(
+                text(f"UPDATE project_counters SET counter = GREATEST(coalesce(counter, 0), coalesce({_SEQUENCE_LAST}, 0)) + :size "
+                     "WHERE project_code = :prefix RETURNING counter"),
+                params,
+            ).scalar()
+            if top is None:
+                top = conn.execute(
+                    text(f"INSERT INTO project_counters (project_code, counter) VALUES (:prefix, coalesce({_SEQUENCE_LAST}, 0) + :size) "
+                         "ON CONFLICT (project_code) DO UPDATE "
+                         f"SET counter = GREATEST(coalesce(project_counters.counter, 0), coalesce({_SEQUENCE_LAST}, 0)) + :size "
+                         "RETURNING counter"),
+                    params,
+                ).scalar()
+        return top
+
+    def _take(self, prefix: str):
+        """Следующий номер из пачек префикса или None, если они кончились."""
+        blocks = self._blocks.get(prefix)
+        while blocks:
+            current, last = blocks[0]
+            if current <= last:
+                blocks[0] = (current + 1, last)
+                return current
+            blocks.pop(0)
+        return None
+
+    def next_number(self, db: Session, prefix: str) -> int:
+        # Лок только вокруг пачек в памяти: _reserve ходит в базу, а ждущий лок поток
+        # event loop (run_sync в crud_async) повесил бы процесс
+        with self._lock:
+            number = self._take(prefix)
+        if number is not None:
+            return number
+        last = self._reserve(db, prefix)
+        with self._lock:
+            # Параллельные вызовы могли зарезервировать свои пачки — номера идут в общую очередь
+            self._blocks.setdefault(prefix, []).append((last - self.block_size + 1, last))
+            return self._take(prefix)
+
+
+ALLOCATORS = {
+    "table": TableAllocator,
+    "sequence": SequenceAllocator,
+    "block": BlockAllocator,
+}
+_instances = {}
+
+
+def get_allocator(db: Session, name: str = None):
+    """Аллокатор по имени (или из REQUEST_ID_ALLOCATOR) с учётом СУБД."""
+    name = name or REQUEST_ID_ALLOCATOR
+    dialect = db.get_bind().dialect.name
+    if dialect != "postgresql" or name not in ALLOCATORS:
+        name = "sequence" if dialect == "postgresql" else "table"
+    if name not in _instances:
+        _instances[name] = ALLOCATORS[name]()
+    return _instances[name]
+
+
+def allocate_request_id(db: Session, prefix: str, allocator: str = None) -> str:
+    return format_request_id(prefix, get_allocator(db, allocator).next_number(db, prefix))
@@ -0,0 +1,182 @@
+"""
+Дневные итоги заявок для аналитики (таблица daily_expense_rollups).
+
+Строка — (день, филиал автора, проект, тип заявки, группа статусов, валюта) с числом
+заявок и суммой amount_uzs. Таблица ведётся инкрементально в той же транзакции, что
+и сама заявка: при создании (+1) и при смене группы статусов (-1 из старой, +1 в новую).
+Значения берутся из сохранённой строки expense_requests через INSERT ... SELECT ...
+ON CONFLICT, поэтому день считается в базе так же, как при перестроении.
+
+rebuild() пересчитывает таблицу с нуля (заполнение и починка):
+    python tools/rebuild_rollups.py
+
+После commit транзакции, менявшей итоги, поднимается версия кэша аналитики
+(ANALYTICS_CACHE_NAMESPACE) — в любом процессе, API или боте.
+
+Вместе с итогами в тех же точках ведутся счётчики бюджетов (app/db/budgets.py):
+им нужны те же события, но только для одобренных и подтверждённых заявок.
+"""
+from sqlalchemy import Date, case, event, func, literal, select, text
+from sqlalchemy.orm import Session
+
+from app.core import cache
+from app.db import budgets, models
+
+ANALYTICS_CACHE_NAMESPACE = "analytics"
+_CHANGED = "rollups_changed"
+
+# Группы статусов (совпадают с summary на дашборде)
+STATUS_BUCKETS = {
+    "Pending": ("request", "review", "pending_senior", "revision"),
+    "Approved": ("approved_senior", "pending_ceo"),
+    "Rejected": ("rejected_senior", "rejected_ceo", "declined"),
+    "Confirmed": ("confirmed", "approved_ceo"),
+}
+OTHER_BUCKET = "Other"
+# Группы, попадающие в графики; они же — расход для бюджетов
+CHART_BUCKETS = ("Approved", "Confirmed")
+CHART_STATUSES = tuple(status for bucket in CHART_BUCKETS for status in STATUS_BUCKETS[bucket])
+
+KEY_COLUMNS = ("day", "branch", "project_id", "project_name", "request_type", "status_bucket", "currency")
+
+
+def status_bucket(status: str) -> str:
+    for bucket, statuses in STATUS_BUCKETS.items():
+        if status in statuses:
+            return bucket
+    return OTHER_BUCKET
+
+
+def _status_bucket_expr(status_column):
+    return case(
+        *[(status_column.in_(statuses), bucket) for bucket, statuses in STATUS_BUCKETS.items()],
+        else_=OTHER_BUCKET,
+    )
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"daily_expense_rollups: dialect {dialect} is not supported")
+    return insert(models.DailyExpenseRollup)
+
+
+def _apply(db: Session, sign: int, *criteria, bucket: str = None):
+    """Добавляет (sign=1) или вычитает (sign=-1) заявки, отобранные criteria.
+
+    bucket — группа статусов вместо вычисленной из текущего expense_requests.status
+    (при смене статуса старую группу в базе уже не прочитать).
+    """
+    E, M = models.ExpenseRequest, models.TeamMember
+    # Одни и те же объекты в SELECT и GROUP BY — иначе PostgreSQL не узнает выражения
+    day = func.date(E.date, type_=Date)
+    branch = func.coalesce(M.branch, "")
+    project_id = func.coalesce(E.project_id, "")
+    project_name = func.coalesce(E.project_name, "")
+    request_type = func.coalesce(E.request_type, "")
+    currency = func.coalesce(E.currency, "")
+    group_keys = [day, branch, project_id, project_name, request_type, currency]
+    if bucket:
+        # Константу PostgreSQL в GROUP BY не принимает, да она там и не нужна
+        bucket_key = literal(bucket)
+    else:
+        bucket_key = _status_bucket_expr(E.status)
+        group_keys.append(bucket_key)
+    query = (
+        select(
+            day, branch, project_id, project_name, request_type, bucket_key, currency,
+            func.count() * sign, func.sum(func.coalesce(E.amount_uzs, 0)) * sign,
+        )
+        .select_from(E)
+        .outerjoin(M, E.created_by_id == M.id)
+        .where(E.date.isnot(None), *criteria)
+        .group_by(*group_keys)
+    )
+    stmt = _insert(db).from_select([*KEY_COLUMNS, "count", "amount_uzs"], query)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            "count": models.DailyExpenseRollup.count + stmt.excluded.count,
+            "amount_uzs": models.DailyExpenseRollup.amount_uzs + stmt.excluded.amount_uzs,
+        },
+    )
+    db.execute(stmt)
+    db.info[_CHANGED] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_analytics_version(session):
+    # Только после commit: иначе параллельный запрос успел бы закэшировать
+    # старые данные уже под новой версией
+    if session.info.pop(_CHANGED, False):
+        cache.bump_version(ANALYTICS_CACHE_NAMESPACE)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop(_CHANGED, None)
+
+
+def _apply_budgets(db: Session, sign: int, *criteria, bucket: str = None):
+    if bucket is None:
+        budgets.apply(db, sign, *criteria, models.ExpenseRequest.status.in_(CHART_STATUSES))
+    elif bucket in CHART_BUCKETS:
+        budgets.apply(db, sign, *criteria)
+
+
+def add(db: Session, *criteria, bucket: str = None):
+    _apply(db, 1, *criteria, bucket=bucket)
+    _apply_budgets(db, 1, *criteria, bucket=bucket)
+
+
+def remove(db: Session, *criteria, bucket: str = None):
+    _apply(db, -1, *criteria, bucket=bucket)
+    _apply_budgets(db, -1, *criteria, bucket=bucket)
+
+
+def record_created(db: Session, expense: models.ExpenseRequest):
+    """Вызывать после flush новой заявки, до commit."""
+    add(db, models.ExpenseRequest.id == expense.id)
+
+
+def record_status_change(db: Session, expense: models.ExpenseRequest, old_status: str):
+    old_bucket, new_bucket = status_bucket(old_status), status_bucket(expense.status)
+    if old_bucket == new_bucket:
+        return
+    # Строки итогов всегда обновляются в одном порядке, чтобы встречные переходы
+    # (A→B и B→A в один день) не взаимоблокировались
+    changes = sorted([(old_bucket, -1), (new_bucket, 1)])
+    for bucket, sign in changes:
+        _apply(db, sign, models.ExpenseRequest.id == expense.id, bucket=bucket)
+    # Счётчики бюджетов — после всех строк итогов, и только если заявка вошла
+    # в расход или вышла из него (Approved → Confirmed их не трогает)
+    was_spent, is_spent = old_bucket in CHART_BUCKETS, new_bucket in CHART_BUCKETS
+    if was_spent != is_spent:
+        budgets.apply(db, 1 if is_spent else -1, models.ExpenseRequest.id == expense.id)
+
+
+def forget_project(db: Session, project_id: str):
+    """Удаление проекта каскадом удаляет его заявки — вместе с ними уходят и итоги.
+
+    Вызывать до удаления: счётчикам филиалов нужны сами заявки.
+    """
+    db.query(models.DailyExpenseRollup).filter(
+        models.DailyExpenseRollup.project_id == project_id
+    ).delete(synchronize_session=False)
+    budgets.forget_project(db, project_id, models.ExpenseRequest.status.in_(CHART_STATUSES))
+    db.info[_CHANGED] = True
+
+
+def rebuild(db: Session) -> int:
+    """Пересчитывает итоги и счётчики бюджетов с нуля в текущей транзакции. Commit — на вызывающем."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Параллельные создания/смены статуса подождут конца пересчёта и лягут поверх него
+        db.execute(text("LOCK TABLE daily_expense_rollups, project_spend_counters IN EXCLUSIVE MODE"))
+    db.query(models.DailyExpenseRollup).delete(synchronize_session=False)
+    db.query(models.ProjectSpendCounter).delete(synchronize_session=False)
+    add(db)
+    return db.query(models.DailyExpenseRollup).count()
@@ -41,6 +41,34 @@ class ExpenseItemSchema(BaseModel):
 
     currency: CurrencyEnum
 
+# Budget Schemas
+class BudgetStatusSchema(BaseModel):
+    month: str  # YYYY-MM
+    budget: Optional[Decimal] = None  # null — бюджет не задан
+    spent: Decimal  # одобренные и подтверждённые заявки за месяц, UZS
+    remaining: Optional[Decimal] = None  # budget - spent, отрицательный при перерасходе
+    count: int
+
+class BranchBudgetStatusSchema(BudgetStatusSchema):
+    branch: str
+
+class ProjectBudgetStatusSchema(BudgetStatusSchema):
+    project_id: str
+    name: str
+    code: str
+
+class ExpenseBudgetSchema(BaseModel):
+    project: Optional[BudgetStatusSchema] = None
+    branch: Optional[BranchBudgetStatusSchema] = None
+
+class BudgetsSchema(BaseModel):
+    month: str
+    projects: List[ProjectBudgetStatusSchema]
+    branches: List[BranchBudgetStatusSchema]
+
+class BudgetUpdate(BaseModel):
+    monthly_budget: Optional[Decimal] = Field(None, ge=0)  # null — снять бюджет
+
 # Project Schemas
 class ProjectBase(BaseModel):
     name: str
@@ -48,7 +76,7 @@ class ProjectBase(BaseModel):
     templates: List[str] = []
 
 class ProjectCreate(ProjectBase):
-    pass
+    monthly_budget: Optional[Decimal] = Field(None, ge=0)
 
 class MemberSummary(BaseModel):
     id: str
@@ -63,6 +91,8 @@ class ProjectSchema(ProjectBase):
     id: str
     created_at: datetime
     members: List[MemberSummary] = []
+    monthly_budget: Optional[Decimal] = None
+    budget: Optional[BudgetStatusSchema] = None  # расход за текущий месяц, см. app/db/budgets.py
     
     class Config:
         from_attributes = True
@@ -156,18 +186,57 @@ class ExpenseRequestSchema(ExpenseRequestCreate):
     project_code: Optional[str] = None
     internal_comment: Optional[str] = None
     usd_rate: Optional[Decimal] = None
+    amount_uzs: Optional[Decimal] = None
     status_comment: Optional[str] = None
     created_at: datetime
+    budget: Optional[ExpenseBudgetSchema] = None  # только при with_budget=true
     
     class Config:
         from_attributes = True
 
 class PaginatedExpensesSchema(BaseModel):
     items: List[ExpenseRequestSchema]
-    total: int        # всего записей в БД по текущим фильтрам
+    total: Optional[int] = None  # всего записей по текущим фильтрам (null при with_total=false)
     skip: int         # с какой записи начали
     limit: int        # сколько запросили
     has_more: bool    # есть ли ещё записи после текущей страницы
+    next_cursor: Optional[str] = None  # курсор следующей страницы (только в режиме cursor)
+
+    class Config:
+        from_attributes = True
+
+# Expense filter params (raw query parameters, parsed into app/db/expense_query.ExpenseQuerySpec)
+class ExpenseFilterParams(BaseModel):
+    project: Optional[str] = None  # id проекта или "all"
+    status: Optional[str] = None  # один или несколько через запятую
+    user_id: Optional[str] = None  # id автора или "all"; учитывается только у админа
+    request_type: Optional[str] = None  # один или несколько через запятую
+    branch: Optional[str] = None
+    team: Optional[str] = None
+    search: Optional[str] = None
+    from_date: Optional[str] = None  # ISO-дата или дата-время
+    to_date: Optional[str] = None  # голая дата — включительно
+
+class ExportFilterParams(ExpenseFilterParams):
+    allStatuses: bool = False  # без status: все статусы, а не только EXPORTABLE_STATUSES
+
+# Export Job Schemas
+class ExportFormatEnum(str, Enum):
+    csv = "csv"
+    xlsx = "xlsx"
+
+class ExportJobCreate(ExportFilterParams):
+    format: ExportFormatEnum = ExportFormatEnum.xlsx
+
+class ExportJobSchema(BaseModel):
+    id: str
+    format: ExportFormatEnum
+    status: str  # queued, running, done, failed
+    rows: int  # строк уже записано
+    total_rows: Optional[int] = None  # известно, когда выгрузка началась
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,112 @@
+"""
+Поиск по заявкам (фильтр `search` в списке, подсчёте и экспорте).
+
+Все поля, по которым ищут, сведены в одну колонку `expense_requests.search_text`
+(request_id, цель, автор, проект, названия позиций). Она заполняется при записи
+(crud.create_expense_request) и индексируется по-разному в зависимости от СУБД:
+
+- PostgreSQL: GIN-индекс pg_trgm по search_text (подстроки, в т.ч. части request_id)
+  + сохраняемая колонка search_vector = to_tsvector('russian', search_text) с GIN-индексом
+  (морфология: «бумаги» находит «бумага»). Ранжирование — ts_rank_cd + similarity.
+- SQLite: виртуальная таблица FTS5 `expense_search_fts` с токенайзером trigram,
+  синхронизируемая триггерами. Ранжирование — bm25.
+
+Если индексов нет (база не прогнана через миграцию), поиск деградирует
+до ILIKE по тем же полям — результат тот же, только медленнее.
+"""
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+TS_CONFIG = "russian"
+FTS_TABLE = "expense_search_fts"
+# trigram-токенайзер FTS5 не индексирует запросы короче трёх символов
+MIN_TRIGRAM_LENGTH = 3
+
+_fts = table(FTS_TABLE, column("expense_id"))
+_fts_available = {}
+
+
+def build_search_text(
+    request_id: str = None,
+    purpose: str = None,
+    created_by: str = None,
+    project_name: str = None,
+    items: list = None,
+) -> str:
+    """Собирает текст, по которому ищется заявка."""
+    parts = [request_id, purpose, created_by, project_name]
+    for item in items or []:
+        if isinstance(item, dict):
+            parts.append(item.get("name"))
+    return " ".join(str(p) for p in parts if p)
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def _has_sqlite_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available:
+        row = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        _fts_available[key] = row is not None
+    return _fts_available[key]
+
+
+def _fts_match(search: str):
+    # Строка в кавычках — фраза FTS5; с trigram это поиск подстроки без учёта регистра
+    return literal_column(FTS_TABLE).op("MATCH")('"' + search.replace('"', '""') + '"')
+
+
+def _uses_fts(db: Session, search: str) -> bool:
+    return _dialect(db) == "sqlite" and len(search) >= MIN_TRIGRAM_LENGTH and _has_sqlite_fts(db)
+
+
+def search_criterion(db: Session, search: str):
+    """Условие WHERE по строке поиска (непустой, см. ExpenseQuerySpec)."""
+    pattern = f"%{search}%"
+
+    if _dialect(db) == "postgresql":
+        tsquery = func.plainto_tsquery(TS_CONFIG, search)
+        return or_(
+            literal_column("expense_requests.search_vector").op("@@")(tsquery),
+            models.ExpenseRequest.search_text.ilike(pattern),
+        )
+
+    if _uses_fts(db, search):
+        return models.ExpenseRequest.id.in_(select(_fts.c.expense_id).where(_fts_match(search)))
+
+    return or_(
+        models.ExpenseRequest.search_text.ilike(pattern),
+        models.ExpenseRequest.request_id.ilike(pattern),
+        models.ExpenseRequest.purpose.ilike(pattern),
+    )
+
+
+def relevance_order(db: Session, search: str) -> list:
+    """ORDER BY для результатов поиска: сначала релевантные, затем по дате."""
+    order = []
+    if search and _dialect(db) == "postgresql":
+        rank = (
+            func.ts_rank_cd(literal_column("expense_requests.search_vector"), func.plainto_tsquery(TS_CONFIG, search))
+            + func.similarity(models.ExpenseRequest.search_text, search)
+        )
+        order.append(rank.desc())
+    elif search and _uses_fts(db, search):
+        # bm25() отрицательный: чем меньше, тем релевантнее
+        rank = (
+            select(literal_column(f"bm25({FTS_TABLE})"))
+            .select_from(_fts)
+            .where(_fts_match(search))
+            .where(_fts.c.expense_id == models.ExpenseRequest.id)
+            .scalar_subquery()
+        )
+        order.append(rank.asc())
+
+    return order + [models.ExpenseRequest.date.desc(), models.ExpenseRequest.id.desc()]
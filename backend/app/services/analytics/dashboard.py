@@ -0,0 +1,359 @@
+"""
+Агрегаты для дашборда аналитики (GET /api/analytics).
+
+Полные дни периода читаются из daily_expense_rollups (app/db/rollups.py) — стоимость
+зависит от числа дней, а не заявок. Период period начинается с момента now - N дней,
+поэтому первый, неполный день считается GROUP BY по самим expense_requests. Диапазон
+from/to всегда состоит из целых дней и читается только из итогов.
+
+При ANALYTICS_ENGINE=duckdb те же строки считает DuckDB по Parquet-снимку заявок
+(см. duckdb_engine) — тогда весь диапазон берётся из самих заявок.
+
+Дневные точки timeline собираются в недели/месяцы (granularity) ресемплингом pandas.
+
+Готовые ответы кэшируются (app/core/cache.py) на ANALYTICS_CACHE_TTL секунд;
+создание заявки и смена статуса сбрасывают кэш через версию (см. rollups).
+Версия поднимается после commit на основной базе, а реплика может отставать. Поэтому
+в первые DATABASE_READ_LAG_SECONDS после смены версии промах считается по основной
+базе — иначе ответ до правки лёг бы в кэш под новой версией на весь TTL. В остальное
+время промахи считает реплика.
+"""
+import datetime
+import os
+from decimal import Decimal
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Date, func, null, or_
+from sqlalchemy.orm import Session
+
+from app.core import cache, database
+from app.db import models, rollups
+from app.services.analytics import duckdb_engine
+
+REFUND_TYPES = ("refund", "blank_refund")
+
+# Статусы, попадающие в графики (timeline и распределения)
+CHART_STATUSES = tuple(
+    status for bucket in rollups.CHART_BUCKETS for status in rollups.STATUS_BUCKETS[bucket]
+)
+
+PERIOD_DAYS = {"1m": 30, "3m": 90, "6m": 180, "1y": 365}
+
+# Частоты pandas; метка корзины — её первый день (неделя с понедельника)
+GRANULARITY_FREQ = {"day": "D", "week": "W-MON", "month": "MS"}
+
+dashboard_cache = cache.VersionedCache(
+    rollups.ANALYTICS_CACHE_NAMESPACE,
+    ttl=int(os.getenv("ANALYTICS_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "128")),
+)
+
+
+def period_start(period: str, now: datetime.datetime = None) -> datetime.datetime:
+    now = now or datetime.datetime.utcnow()
+    return now - datetime.timedelta(days=PERIOD_DAYS.get(period, 30))
+
+
+def resolve_range(period: str, date_from: datetime.date = None, date_to: datetime.date = None):
+    """(start, end): end не включается; end=None — без верхней границы (как у period)."""
+    end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time()) if date_to else None
+    if date_from:
+        start = datetime.datetime.combine(date_from, datetime.time())
+    elif end:
+        start = end - datetime.timedelta(days=PERIOD_DAYS.get(period, 30))
+    else:
+        start = period_start(period)
+    return start, end
+
+
+def _segment_key(segment: str, is_refund: bool, value) -> str:
+    if segment == "global":
+        return "Возвраты" if is_refund else "Расходы"
+    if segment == "branch":
+        return value if value else "Другое"
+    if segment == "project":
+        return value if value else "Без проекта"
+    return "Unknown"
+
+
+def _grouped(query, is_refund, column):
+    return query.group_by(is_refund, column) if column is not None else query.group_by(is_refund)
+
+
+# Неполный первый день: запросы по expense_requests
+
+def _is_refund_column():
+    # Один и тот же объект в SELECT и GROUP BY: PostgreSQL сравнивает выражения
+    # вместе с параметрами, а у двух вызовов in_() они получили бы разные имена
+    return models.ExpenseRequest.request_type.in_(REFUND_TYPES).label("is_refund")
+
+
+def _live_filter(query, start: datetime.datetime, end: datetime.datetime, type: str):
+    E = models.ExpenseRequest
+    query = query.filter(E.date >= start, E.date < end)
+    if type == "refund":
+        query = query.filter(E.request_type.in_(REFUND_TYPES))
+    elif type == "expense":
+        query = query.filter(or_(E.request_type.notin_(REFUND_TYPES), E.request_type.is_(None)))
+    return query
+
+
+def _live_status_counts(db: Session, start, end, type: str) -> list:
+    E = models.ExpenseRequest
+    rows = _live_filter(db.query(E.status, func.count()), start, end, type).group_by(E.status)
+    return [(rollups.status_bucket(status), count) for status, count in rows]
+
+
+def _live_timeline_rows(db: Session, start, end, type: str) -> list:
+    E = models.ExpenseRequest
+    day = func.date(E.date, type_=Date).label("day")
+    is_refund = _is_refund_column()
+    query = _live_filter(db.query(day, is_refund, func.sum(E.amount_uzs)), start, end, type)
+    return query.filter(E.status.in_(CHART_STATUSES)).group_by(day, is_refund).all()
+
+
+def _live_distribution_rows(db: Session, start, end, segment: str, type: str) -> list:
+    E = models.ExpenseRequest
+    column = {"branch": models.TeamMember.branch, "project": E.project_name}.get(segment)
+    is_refund = _is_refund_column()
+    query = db.query(is_refund, column if column is not None else null(), func.sum(E.amount_uzs))
+    if segment == "branch":
+        query = query.outerjoin(models.TeamMember, E.created_by_id == models.TeamMember.id)
+    query = _live_filter(query, start, end, type).filter(E.status.in_(CHART_STATUSES))
+    return _grouped(query, is_refund, column).all()
+
+
+# Полные дни: запросы по daily_expense_rollups
+
+def _rollup_is_refund_column():
+    return models.DailyExpenseRollup.request_type.in_(REFUND_TYPES).label("is_refund")
+
+
+def _rollup_filter(query, days: tuple, type: str, charts: bool = False):
+    R = models.DailyExpenseRollup
+    first_day, end_day = days
+    query = query.filter(R.day >= first_day)
+    if end_day:
+        query = query.filter(R.day < end_day)
+    # Пустая строка в request_type — заявки без типа, они считаются расходами
+    if type == "refund":
+        query = query.filter(R.request_type.in_(REFUND_TYPES))
+    elif type == "expense":
+        query = query.filter(R.request_type.notin_(REFUND_TYPES))
+    if charts:
+        query = query.filter(R.status_bucket.in_(rollups.CHART_BUCKETS))
+    return query
+
+
+def _rollup_status_counts(db: Session, days, type: str) -> list:
+    R = models.DailyExpenseRollup
+    query = _rollup_filter(db.query(R.status_bucket, func.sum(R.count)), days, type)
+    return query.group_by(R.status_bucket).all()
+
+
+def _rollup_timeline_rows(db: Session, days, type: str) -> list:
+    R = models.DailyExpenseRollup
+    is_refund = _rollup_is_refund_column()
+    query = _rollup_filter(db.query(R.day, is_refund, func.sum(R.amount_uzs)), days, type, charts=True)
+    # После смены статуса в строке может остаться count = 0 — такого дня на графике нет
+    return query.group_by(R.day, is_refund).having(func.sum(R.count) > 0).all()
+
+
+def _rollup_distribution_rows(db: Session, days, segment: str, type: str) -> list:
+    R = models.DailyExpenseRollup
+    column = {"branch": R.branch, "project": R.project_name}.get(segment)
+    is_refund = _rollup_is_refund_column()
+    query = db.query(is_refund, column if column is not None else null(), func.sum(R.amount_uzs))
+    query = _rollup_filter(query, days, type, charts=True)
+    return _grouped(query, is_refund, column).having(func.sum(R.count) > 0).all()
+
+
+def _database_rows(db: Session, start, end, segment: str, type: str) -> tuple:
+    first_day = start.date()
+    if start.time() != datetime.time():
+        # Неполный первый день — по заявкам, дальше — по итогам
+        first_day += datetime.timedelta(days=1)
+        live_end = datetime.datetime.combine(first_day, datetime.time())
+        live_end = min(live_end, end) if end else live_end
+        live = (start, live_end)
+    else:
+        live = None
+    days = (first_day, end.date() if end else None)
+
+    timeline_rows = _rollup_timeline_rows(db, days, type)
+    distribution_rows = _rollup_distribution_rows(db, days, segment, type)
+    status_rows = _rollup_status_counts(db, days, type)
+    if live:
+        timeline_rows += _live_timeline_rows(db, *live, type)
+        distribution_rows += _live_distribution_rows(db, *live, segment, type)
+        status_rows += _live_status_counts(db, *live, type)
+    return timeline_rows, distribution_rows, status_rows
+
+
+# DuckDB: весь диапазон по снимку заявок
+
+def _duckdb_rows(db: Session, start, end, segment: str, type: str) -> tuple:
+    """Строки timeline, распределений и статусов — в тех же формах, что и у запросов выше."""
+    conditions, params = ["e.date >= ?"], [start]
+    if end:
+        conditions.append("e.date < ?")
+        params.append(end)
+    if type == "refund":
+        conditions.append("list_contains(?, e.request_type)")
+        params.append(list(REFUND_TYPES))
+    elif type == "expense":
+        conditions.append("NOT list_contains(?, coalesce(e.request_type, 'expense'))")
+        params.append(list(REFUND_TYPES))
+    where = " AND ".join(conditions)
+    charts = f"{where} AND list_contains(?, e.status)"
+    chart_params = params + [list(CHART_STATUSES)]
+    is_refund = "list_contains(?, e.request_type)"
+    column = {"branch": "m.branch", "project": "e.project_name"}.get(segment, "NULL")
+
+    with duckdb_engine.connect(db, since=start) as con:
+        timeline_rows = con.execute(
+            f"SELECT CAST(e.date AS DATE), {is_refund}, sum(e.amount_uzs) FROM expenses e "
+            f"WHERE {charts} GROUP BY ALL",
+            [list(REFUND_TYPES)] + chart_params,
+        ).fetchall()
+        distribution_rows = con.execute(
+            f"SELECT {is_refund}, {column}, sum(e.amount_uzs) FROM expenses e "
+            f"LEFT JOIN team_members m ON e.created_by_id = m.id WHERE {charts} GROUP BY ALL",
+            [list(REFUND_TYPES)] + chart_params,
+        ).fetchall()
+        status_rows = con.execute(
+            f"SELECT e.status, count(*) FROM expenses e WHERE {where} GROUP BY ALL", params,
+        ).fetchall()
+    return timeline_rows, distribution_rows, [(rollups.status_bucket(status), count) for status, count in status_rows]
+
+
+# Сборка ответа
+
+def _summary(rows) -> dict:
+    summary = {bucket: 0 for bucket in rollups.STATUS_BUCKETS}
+    for bucket, count in rows:
+        if bucket in summary:
+            summary[bucket] += int(count or 0)
+    return summary
+
+
+def _timeline(rows, granularity: str = "day") -> list:
+    """Дневные строки (day, is_refund, amount) → точки по корзинам granularity.
+
+    Как и раньше, в ответ попадают только корзины, где есть заявки.
+    """
+    if not rows:
+        return []
+    frame = pd.DataFrame.from_records(rows, columns=["day", "refund", "amount"])
+    frame["day"] = pd.to_datetime(frame["day"])
+    amount = frame["amount"].astype(float).fillna(0.0)
+    refund = frame["refund"].fillna(False).astype(bool)
+    frame = pd.DataFrame({
+        "expenses": amount.where(~refund, 0.0),
+        "refunds": amount.where(refund, 0.0),
+        "rows": 1,
+    }).set_index(frame["day"])
+
+    buckets = frame.resample(GRANULARITY_FREQ[granularity], label="left", closed="left").sum()
+    buckets = buckets[buckets["rows"] > 0]
+    return [
+        {"date": date, "expenses": expenses, "refunds": refunds}
+        for date, expenses, refunds in zip(
+            buckets.index.strftime("%Y-%m-%d"), buckets["expenses"].tolist(), buckets["refunds"].tolist()
+        )
+    ]
+
+
+def _distributions(rows, segment: str):
+    expense_dist, refund_dist = {}, {}
+    for refund, value, amount in rows:
+        refund = bool(refund)
+        # None и "" сливаются в один ключ («Другое» / «Без проекта»)
+        key = _segment_key(segment, refund, value)
+        target = refund_dist if refund else expense_dist
+        entry = target.setdefault(key, {"name": key, "value": Decimal("0")})
+        entry["value"] += amount if amount is not None else Decimal("0")
+    order = lambda dist: [dist[k] for k in sorted(dist)]
+    return order(expense_dist), order(refund_dist)
+
+
+def get_dashboard(
+    db: Session,
+    period: str = "1m",
+    segment: str = "global",
+    type: str = "all",
+    date_from: datetime.date = None,
+    date_to: datetime.date = None,
+    granularity: str = "day",
+) -> dict:
+    start, end = resolve_range(period, date_from, date_to)
+    if duckdb_engine.active():
+        timeline_rows, distribution_rows, status_rows = _duckdb_rows(db, start, end, segment, type)
+    else:
+        timeline_rows, distribution_rows, status_rows = _database_rows(db, start, end, segment, type)
+
+    expense_dist, refund_dist = _distributions(distribution_rows, segment)
+    return {
+        "timeline": _timeline(timeline_rows, granularity),
+        # Backward compatibility: 'distribution' field remains for old clients
+        "distribution": expense_dist + refund_dist,
+        "expense_distribution": expense_dist,
+        "refund_distribution": refund_dist,
+        "summary": _summary(status_rows),
+    }
+
+
+def get_cached_dashboard(
+    db: Session,
+    period: str = "1m",
+    segment: str = "global",
+    type: str = "all",
+    date_from: datetime.date = None,
+    date_to: datetime.date = None,
+    granularity: str = "day",
+) -> dict:
+    """get_dashboard через кэш. Значение хранится уже в JSON-виде — так же его отдал бы FastAPI.
+
+    db — сессия реплики (или основной базы при X-Read-Primary); сразу после смены
+    версии промах считается по основной базе (см. docstring модуля).
+    """
+    params = dict(
+        view="dashboard", period=period, segment=segment, type=type,
+        date_from=date_from, date_to=date_to, granularity=granularity,
+    )
+    filters = {k: v for k, v in params.items() if k != "view"}
+
+    def compute():
+        replica_may_lag = (
+            database.read_engine is not database.engine
+            and db.get_bind() is not database.engine
+            and cache.seconds_since_bump(dashboard_cache.namespace) < database.READ_REPLICA_LAG
+        )
+        if not replica_may_lag:
+            return jsonable_encoder(get_dashboard(db, **filters))
+        with database.read_database_session(primary=True) as primary_db:
+            return jsonable_encoder(get_dashboard(primary_db, **filters))
+
+    return dashboard_cache.get_or_compute(params, compute)
+
+
+def to_columnar(data: dict) -> dict:
+    """Ответ get_cached_dashboard в колоночном виде (format=columnar): параллельные
+    массивы вместо массивов объектов, все суммы — float."""
+    def distribution(items):
+        return {"names": [item["name"] for item in items], "values": [float(item["value"]) for item in items]}
+
+    timeline = data["timeline"]
+    return {
+        "format": "columnar",
+        "timeline": {
+            "dates": [point["date"] for point in timeline],
+            "expenses": [float(point["expenses"]) for point in timeline],
+            "refunds": [float(point["refunds"]) for point in timeline],
+        },
+        "distribution": distribution(data["distribution"]),
+        "expense_distribution": distribution(data["expense_distribution"]),
+        "refund_distribution": distribution(data["refund_distribution"]),
+        "summary": data["summary"],
+    }
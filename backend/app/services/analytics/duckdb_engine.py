@@ -0,0 +1,113 @@
+"""
+Встроенный DuckDB поверх Parquet-снимков (app/services/analytics/snapshots.py).
+
+ANALYTICS_ENGINE=duckdb переключает тяжёлые запросы аналитики (дашборд, сводные
+таблицы, SLA) с PostgreSQL на DuckDB: многолетние агрегаты считаются векторно
+по колоночным файлам, рабочая база отдаёт только небольшую дельту.
+
+Представления в соединении DuckDB:
+    expenses        — снимок expense_requests без изменённых после него заявок
+                      + сами эти заявки из базы (updated_at >= as_of снимка − перекрытие)
+    status_history  — так же: снимок истории + вся история заявок из дельты
+    team_members    — id, branch, team из базы (таблица маленькая)
+
+Перекрытие SNAPSHOT_DELTA_OVERLAP_MINUTES покрывает транзакции, открытые во время
+снимка, и отставание реплики. Удалённые после снимка заявки пропадают из ответов
+только со следующим снимком.
+
+Без готового снимка (нет manifest.json с as_of) запросы идут в базу, как при
+ANALYTICS_ENGINE=sql.
+"""
+import contextlib
+import datetime
+import glob
+import os
+
+import duckdb
+import pyarrow as pa
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.db import models
+from app.services.analytics import snapshots
+
+logger = get_logger(__name__)
+
+ENGINE = os.getenv("ANALYTICS_ENGINE", "sql")  # sql | duckdb
+DELTA_OVERLAP = datetime.timedelta(minutes=int(os.getenv("SNAPSHOT_DELTA_OVERLAP_MINUTES", "60")))
+
+_warned_missing = False
+
+
+def snapshot_as_of(base_dir: str = None) -> datetime.datetime:
+    """Момент, на который актуален последний полный снимок, или None."""
+    as_of = snapshots.load_manifest(base_dir or snapshots.SNAPSHOT_DIR).get("as_of")
+    return datetime.datetime.fromisoformat(as_of) if as_of else None
+
+
+def active(base_dir: str = None) -> bool:
+    """Включён ли DuckDB и есть ли по чему считать."""
+    global _warned_missing
+    if ENGINE != "duckdb":
+        return False
+    if snapshot_as_of(base_dir) is None:
+        if not _warned_missing:
+            logger.warning("ANALYTICS_ENGINE=duckdb, but no complete Parquet snapshot yet; using the database")
+            _warned_missing = True
+        return False
+    return True
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _register_union(con, name: str, files: str, delta, key: str, where: str = None):
+    """name = снимок без строк, чьи key есть в дельте, + дельта."""
+    delta_name = f"{name}_delta"
+    con.register(delta_name, delta)
+    columns = ", ".join(f'"{column}"' for column in delta.schema.names)
+    parts = [f"SELECT {columns} FROM {delta_name}"]
+    if glob.glob(files):
+        conditions = [f"{key} NOT IN (SELECT {key} FROM {delta_name})"]
+        if where:
+            conditions.append(where)
+        parts.insert(0, (
+            f"SELECT {columns} FROM read_parquet({_quote(files)}, hive_partitioning = true) "
+            f"WHERE {' AND '.join(conditions)}"
+        ))
+    con.execute(f"CREATE VIEW {name} AS {' UNION ALL '.join(parts)}")
+
+
+@contextlib.contextmanager
+def connect(db: Session, since: datetime.datetime = None, history: bool = False, base_dir: str = None):
+    """Соединение DuckDB с представлениями expenses/team_members (и status_history при history=True).
+
+    since — нижняя граница expenses.date, если она известна: по ней отсекаются
+    лишние месяцы снимка, файлы которых DuckDB даже не откроет.
+    """
+    base_dir = base_dir or snapshots.SNAPSHOT_DIR
+    E, H, M = models.ExpenseRequest, models.ExpenseStatusHistory, models.TeamMember
+    delta_since = snapshot_as_of(base_dir) - DELTA_OVERLAP
+
+    con = duckdb.connect()
+    try:
+        expense_filter = f"month >= {_quote(since.strftime('%Y-%m'))}" if since else None
+        _register_union(
+            con, "expenses", os.path.join(base_dir, "expense_requests", "*", snapshots.DATA_FILE),
+            snapshots.read_table(db, E, E.updated_at >= delta_since), key="id", where=expense_filter,
+        )
+        if history:
+            # Смена статуса обновляет updated_at заявки — её история целиком попадает в дельту
+            _register_union(
+                con, "status_history", os.path.join(base_dir, "expense_status_history", "*", snapshots.DATA_FILE),
+                snapshots.read_table(db, H, E.updated_at >= delta_since), key="expense_id",
+            )
+        members = db.query(M.id, M.branch, M.team).all()
+        con.register("team_members", pa.table(
+            [pa.array([member[i] for member in members], type=pa.string()) for i in range(3)],
+            names=["id", "branch", "team"],
+        ))
+        yield con
+    finally:
+        con.close()
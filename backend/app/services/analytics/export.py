@@ -1,11 +1,7 @@
 import io
-import datetime
-import os
-from decimal import Decimal
-import pandas as pd
-from sqlalchemy.orm import Session
-from app.db import models
-from openpyxl.styles import PatternFill, Border, Side, Font, Alignment
+import csv
+import itertools
+import xlsxwriter
 
 STATUS_MAP = {
     "request": "Запрос",
@@ -20,82 +16,119 @@ STATUS_MAP = {
     "archived": "Архивировано"
 }
 
-def generate_expenses_xlsx(expenses: list[models.ExpenseRequest]) -> io.BytesIO:
-    data = []
-    for e in expenses:
-        usd_rate = Decimal(str(e.usd_rate)) if e.usd_rate else None
-        items = e.items if isinstance(e.items, list) else []
-        for item in items:
-            item_currency = item.get("currency", e.currency)
-            item_amount_native = Decimal(str(item.get("amount", 0))) * Decimal(str(item.get("quantity", 0)))
-            
-            amount_uzs = item_amount_native
-            if item_currency == "USD" and usd_rate:
-                amount_uzs = item_amount_native * usd_rate
-            
-            data.append({
-                "ID Запроса": e.request_id,
-                "Дата": e.date.strftime("%d.%m.%Y %H:%M"),
-                "Проект": f"{e.project_name} ({e.project_code})" if e.project_name else "Без проекта",
-                "Цель расхода": item.get("name") if len(items) > 1 else e.purpose,
-                "Сумма": float(item_amount_native),
-                "Валюта": item_currency,
-                "Курс USD": float(usd_rate) if usd_rate else None,
-                "Сумма в UZS": float(round(amount_uzs, 2)),
-                "Ответственный": e.created_by,
-                "Статус": STATUS_MAP.get(e.status, e.status)
-            })
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Expenses')
-        worksheet = writer.sheets['Expenses']
-        
-        yellow_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        bold_font = Font(bold=True)
-        center_align = Alignment(horizontal="center", vertical="center")
-        
-        # Styles for header
-        for col_idx in range(1, len(df.columns) + 1):
-            cell = worksheet.cell(row=1, column=col_idx)
-            cell.fill = yellow_fill
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.alignment = center_align
-            
-        # Borders for content
-        for row_idx in range(2, len(df) + 2):
-            for col_idx in range(1, len(df.columns) + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                cell.border = thin_border
-                
-        # Auto-adjust columns width
-        for idx, col in enumerate(df.columns):
-            if not df.empty:
-                # Robustly calculate max string length in column
-                series = df[col].dropna().astype(str)
-                if not series.empty:
-                    max_content_len = series.apply(len).max()
-                else:
-                    max_content_len = 0
-                max_len = max(max_content_len, len(str(col))) + 2
-                worksheet.column_dimensions[chr(65 + idx)].width = min(max_len, 50)
-            
-        # Add SUM formulas if not empty
-        if not df.empty:
-            total_row = len(df) + 2
-            worksheet.cell(row=total_row, column=7, value="ИТОГО:").font = bold_font
-            worksheet.cell(row=total_row, column=7).border = thin_border
-            
-            # UZS Sum (col 8)
-            sum_cell_uzs = worksheet.cell(row=total_row, column=8)
-            sum_cell_uzs.value = f"=SUM(H2:H{total_row-1})"
-            sum_cell_uzs.font = bold_font
-            sum_cell_uzs.border = thin_border
+CSV_HEADER = ["Request ID", "Date", "Project Code", "Project Name", "Responsible", "Status", "Item Name", "Qty", "Amount", "Currency", "USD Rate", "Amount in UZS"]
+# Строк CSV в одном куске ответа
+CSV_CHUNK_ROWS = 1000
+
+def iter_expenses_csv(rows):
+    """CSV по строкам crud.iter_expense_item_rows кусками по CSV_CHUNK_ROWS строк.
+
+    Первый кусок — BOM (чтобы Excel понял UTF-8) и заголовок: он уходит клиенту
+    ещё до того, как база вернёт первую строку.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    yield "\ufeff" + output.getvalue()
 
     output.seek(0)
-    return output
+    output.truncate()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([
+            row.request_id,
+            row.date.strftime("%Y-%m-%d %H:%M"),
+            row.project_code,
+            row.project_name,
+            row.created_by,
+            STATUS_MAP.get(row.status, row.status),
+            row.name,
+            float(row.quantity),
+            float(row.amount),
+            row.currency,
+            float(row.usd_rate) if row.usd_rate else "",
+            float(row.amount_uzs)
+        ])
+        if count % CSV_CHUNK_ROWS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue()
+
+# Заголовок, значение из строки; is_number — писать числом, остальное строкой
+XLSX_COLUMNS = [
+    ("ID Запроса", False, lambda row: row.request_id),
+    ("Дата", False, lambda row: row.date.strftime("%d.%m.%Y %H:%M")),
+    ("Проект", False, lambda row: f"{row.project_name} ({row.project_code})" if row.project_name else "Без проекта"),
+    ("Цель расхода", False, lambda row: row.name if row.items_count > 1 else row.purpose),
+    ("Сумма", True, lambda row: float(row.line_total)),
+    ("Валюта", False, lambda row: row.currency),
+    ("Курс USD", True, lambda row: float(row.usd_rate) if row.usd_rate else None),
+    ("Сумма в UZS", True, lambda row: float(row.amount_uzs)),
+    ("Ответственный", False, lambda row: row.created_by),
+    ("Статус", False, lambda row: STATUS_MAP.get(row.status, row.status)),
+]
+# По стольким первым строкам оцениваются ширины столбцов
+XLSX_SAMPLE_ROWS = 1000
+XLSX_MAX_WIDTH = 50
+
+XLSX_FORMATS = {
+    "header": {"bold": True, "bg_color": "#FFF2CC", "border": 1, "align": "center", "valign": "vcenter"},
+    "cell": {"border": 1},
+    "total": {"bold": True, "border": 1},
+}
+
+
+def write_expenses_xlsx(rows, target) -> int:
+    """Пишет отчёт по строкам crud.get_expense_item_rows / iter_expense_item_rows в target
+    (путь или файл). Возвращает число строк.
+
+    xlsxwriter в режиме constant_memory: каждая строка сразу уходит во временный
+    XML листа, форматы общие и задаются при записи. В памяти только первые
+    XLSX_SAMPLE_ROWS строк — по ним оцениваются ширины столбцов.
+    """
+    rows = iter(rows)
+    sample = [[value(row) for _, _, value in XLSX_COLUMNS] for row in itertools.islice(rows, XLSX_SAMPLE_ROWS)]
 
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    formats = {name: workbook.add_format(properties) for name, properties in XLSX_FORMATS.items()}
+    worksheet = workbook.add_worksheet("Expenses")
+
+    if sample:
+        for idx, (title, _, _) in enumerate(XLSX_COLUMNS):
+            width = max([len(title)] + [len(str(values[idx])) for values in sample if values[idx] is not None]) + 2
+            worksheet.set_column(idx, idx, min(width, XLSX_MAX_WIDTH))
+
+    for idx, (title, _, _) in enumerate(XLSX_COLUMNS):
+        worksheet.write_string(0, idx, title, formats["header"])
+
+    # Типизированные write_* вместо write(): без разбора каждой строки регулярками,
+    # и текст заявки вида "=..." или URL остаётся текстом, а не формулой/ссылкой
+    cell = formats["cell"]
+    writers = [worksheet.write_number if is_number else worksheet.write_string for _, is_number, _ in XLSX_COLUMNS]
+    count = 0
+    for values in itertools.chain(sample, ([value(row) for _, _, value in XLSX_COLUMNS] for row in rows)):
+        count += 1
+        for idx, value in enumerate(values):
+            if value is None:
+                # Пустая ячейка, но с рамкой
+                worksheet.write_blank(count, idx, None, cell)
+            else:
+                writers[idx](count, idx, value, cell)
+
+    if count:
+        # ИТОГО под «Курс USD», сумма — под «Сумма в UZS»
+        total_row = count + 1
+        worksheet.write_string(total_row, 6, "ИТОГО:", formats["total"])
+        worksheet.write_formula(total_row, 7, f"=SUM(H2:H{total_row})", formats["total"])
+
+    workbook.close()
+    return count
+
+
+def generate_expenses_xlsx(rows) -> io.BytesIO:
+    """Отчёт в памяти — для небольших выборок (одна заявка в боте)."""
+    output = io.BytesIO()
+    write_expenses_xlsx(rows, output)
+    output.seek(0)
+    return output
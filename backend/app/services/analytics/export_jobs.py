@@ -0,0 +1,282 @@
+"""
+Фоновые выгрузки CSV/XLSX: POST /api/exports ставит задачу, файл собирает отдельный
+процесс, клиент опрашивает GET /api/exports/{id} (или ждёт SSE-событие) и скачивает
+готовый файл из GET /api/exports/{id}/download.
+
+Состояние задач — таблица export_jobs, общая для всех воркеров API. Выполняет задачу:
+    - пул процессов внутри API (EXPORT_WORKERS процессов, по умолчанию 2);
+    - при EXPORT_WORKERS=0 — отдельный процесс tools/export_worker.py, который
+      забирает задачи из очереди в базе.
+Задачу выполняет тот, кто первым переведёт её из queued в running
+(UPDATE ... WHERE status = 'queued'), поэтому дважды она не выполнится.
+
+Файлы лежат в {UPLOAD_DIR}/exports. Ключ задачи — хэш формата, ExpenseQuerySpec.digest
+(фильтры уже с учётом прав) и отпечатка данных: числа заявок под фильтрами и суммы их
+updated_at. Пока
+заявки под фильтрами не менялись, одинаковый запрос получает готовый или ещё
+собирающийся файл вместо новой выгрузки. Задачи и файлы старше EXPORT_KEEP_HOURS
+удаляются. Задача, которую за EXPORT_QUEUED_MINUTES никто не забрал из очереди,
+помечается failed, чтобы клиент не ждал её вечно.
+"""
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.database import database_session, read_database_session
+from app.core.logging_config import get_logger
+from app.db import crud, models
+from app.db.expense_query import ExpenseQuerySpec
+from app.services.analytics import export
+from app.services.analytics.snapshots import epoch_seconds
+from app.services.notifications import sse
+
+logger = get_logger(__name__)
+
+EXPORT_DIR = os.path.join(os.getenv("UPLOAD_DIR", "/app/uploads"), "exports")
+# Процессов выгрузки внутри API; 0 — задачи выполняет tools/export_worker.py
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+KEEP_HOURS = int(os.getenv("EXPORT_KEEP_HOURS", "24"))
+# Задача в running без обновления прогресса дольше этого — процесс умер
+STALE_AFTER = datetime.timedelta(minutes=int(os.getenv("EXPORT_STALE_MINUTES", "10")))
+# Задача в queued дольше этого — её некому выполнить (EXPORT_WORKERS=0 без
+# tools/export_worker.py или потерянная отправка в пул)
+QUEUED_TIMEOUT = datetime.timedelta(minutes=int(os.getenv("EXPORT_QUEUED_MINUTES", "30")))
+# Как часто задача пишет прогресс в базу, строк
+PROGRESS_EVERY = 5000
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+FORMATS = {
+    "csv": {"media_type": "text/csv", "filename": "expenses_export.csv"},
+    "xlsx": {
+        "media_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "filename": "expenses_report.xlsx",
+    },
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def fingerprint(db: Session, spec: ExpenseQuerySpec) -> list:
+    """[число заявок, сумма updated_at в секундах] под фильтрами.
+
+    Сумма, а не max, — как в отпечатках Parquet-снимков: правку с более ранней
+    отметкой из длинной транзакции она тоже замечает.
+    """
+    E = models.ExpenseRequest
+    count, stamps = db.execute(spec.select(db, func.count(E.id), func.sum(epoch_seconds(db, E.updated_at)))).one()
+    return [int(count), int(stamps or 0)]
+
+
+def job_key(format: str, spec: ExpenseQuerySpec, data_fingerprint: list) -> str:
+    payload = json.dumps([format, spec.digest, data_fingerprint])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Очередь
+
+def _expire(db: Session):
+    """Зависшие и невыполненные задачи — в failed, старые — вместе с файлами."""
+    J = models.ExportJob
+    db.query(J).filter(J.status == RUNNING, J.updated_at < _now() - STALE_AFTER).update(
+        {"status": FAILED, "error": "Процесс выгрузки прервался", "finished_at": _now()},
+        synchronize_session=False,
+    )
+    db.query(J).filter(J.status == QUEUED, J.created_at < _now() - QUEUED_TIMEOUT).update(
+        {"status": FAILED, "error": "Выгрузка не дождалась обработчика", "finished_at": _now()},
+        synchronize_session=False,
+    )
+    old = db.query(J).filter(J.status.in_((DONE, FAILED)), J.created_at < _now() - datetime.timedelta(hours=KEEP_HOURS))
+    for job in old:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.delete(job)
+    db.commit()
+
+
+def submit(db: Session, read_db: Session, user_id: str, format: str, spec: ExpenseQuerySpec, primary: bool = False) -> models.ExportJob:
+    """Задача выгрузки: уже готовая или идущая с тем же ключом, иначе новая в очереди.
+
+    Отпечаток считается по той же базе, из которой будет читать выгрузка (read_db).
+    """
+    _expire(db)
+    key = job_key(format, spec, fingerprint(read_db, spec))
+    J = models.ExportJob
+    for job in db.query(J).filter(J.key == key, J.status != FAILED).order_by(J.created_at.desc()):
+        if job.status != DONE or os.path.exists(job.file_path):
+            return job
+
+    job = J(
+        key=key, format=format, filters=spec.model_dump(mode="json"), read_primary=primary,
+        status=QUEUED, rows=0, created_by_id=user_id if user_id != "admin" else None,
+    )
+    db.add(job)
+    db.commit()
+    dispatch(job.id)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> models.ExportJob:
+    _expire(db)
+    return db.get(models.ExportJob, job_id)
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерний процесс открывает свои соединения, а не наследует пул API
+            _executor = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def dispatch(job_id: str):
+    """Отдаёт задачу пулу процессов API; при EXPORT_WORKERS=0 она ждёт tools/export_worker.py."""
+    global _executor
+    if EXPORT_WORKERS <= 0:
+        return
+    try:
+        _pool().submit(run_job, job_id)
+    except BrokenProcessPool:
+        # Процесс пула упал (например, OOM) — пул больше не принимает задачи
+        with _executor_lock:
+            _executor = None
+        _pool().submit(run_job, job_id)
+
+
+def dispatch_queued():
+    """При старте API: задачи, поставленные до перезапуска, снова в пул."""
+    if EXPORT_WORKERS <= 0:
+        return
+    with database_session() as db:
+        J = models.ExportJob
+        job_ids = [job_id for job_id, in db.query(J.id).filter(J.status == QUEUED).order_by(J.created_at)]
+    for job_id in job_ids:
+        dispatch(job_id)
+    if job_ids:
+        logger.info(f"Exports: {len(job_ids)} queued job(s) resubmitted")
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+# Выполнение (в процессе пула или tools/export_worker.py)
+
+def _update(job_id: str, **values):
+    with database_session() as db:
+        db.query(models.ExportJob).filter(models.ExportJob.id == job_id).update(
+            {**values, "updated_at": _now()}, synchronize_session=False
+        )
+
+
+def _claim(job_id: str) -> bool:
+    with database_session() as db:
+        J = models.ExportJob
+        now = _now()
+        claimed = db.query(J).filter(J.id == job_id, J.status == QUEUED).update(
+            {"status": RUNNING, "started_at": now, "updated_at": now}, synchronize_session=False
+        )
+        return claimed == 1
+
+
+class _Progress:
+    """Строки выгрузки, по пути каждые PROGRESS_EVERY строк пишет прогресс в задачу."""
+
+    def __init__(self, job_id: str, rows):
+        self.job_id = job_id
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            if self.count % PROGRESS_EVERY == 0:
+                _update(self.job_id, rows=self.count)
+            yield row
+
+
+def _write(job: dict, path: str) -> int:
+    tmp_path = f"{path}.tmp"
+    try:
+        with read_database_session(primary=job["read_primary"]) as db:
+            spec = ExpenseQuerySpec.model_validate(job["filters"])
+            _update(job["id"], total_rows=crud.count_expense_item_rows(db, spec))
+            rows = _Progress(job["id"], crud.iter_expense_item_rows(db, spec))
+            if job["format"] == "xlsx":
+                export.write_expenses_xlsx(rows, tmp_path)
+            else:
+                with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                    for chunk in export.iter_expenses_csv(rows):
+                        f.write(chunk)
+        # Файл появляется под своим именем только целиком
+        os.replace(tmp_path, path)
+        return rows.count
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _notify(job_id: str, status: str):
+    with database_session() as db:
+        job = db.get(models.ExportJob, job_id)
+        user = db.get(models.TeamMember, job.created_by_id) if job.created_by_id else None
+        # Без автора — задача виртуального админа (см. auth.get_current_user)
+        channel = sse.user_channel(user) if user else "notifications:admin"
+        message = {
+            "title": "Выгрузка готова" if status == DONE else "Ошибка выгрузки",
+            "message": f"{job.format.upper()}: {job.rows} строк" if status == DONE else job.error,
+            "type": "export",
+            "job_id": job.id,
+            "status": status,
+        }
+    sse.publish_notification_sync(channel, message)
+
+
+def run_job(job_id: str) -> str:
+    """Выполняет задачу, если её ещё никто не забрал. Возвращает итоговый статус или None."""
+    if not _claim(job_id):
+        return None
+    with database_session() as db:
+        job = db.get(models.ExportJob, job_id)
+        spec = {name: getattr(job, name) for name in ("id", "format", "filters", "read_primary")}
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{job_id}.{spec['format']}")
+    try:
+        rows = _write(spec, path)
+    except Exception as e:
+        logger.error(f"Exports: job {job_id} failed: {e}", exc_info=True)
+        _update(job_id, status=FAILED, error=str(e), finished_at=_now())
+        status = FAILED
+    else:
+        logger.info(f"Exports: job {job_id} done, {rows} rows")
+        _update(job_id, status=DONE, rows=rows, total_rows=rows, file_path=path, finished_at=_now())
+        status = DONE
+    _notify(job_id, status)
+    return status
+
+
+def run_queued() -> int:
+    """Выполняет все задачи из очереди по одной (tools/export_worker.py). Возвращает число выполненных."""
+    with database_session() as db:
+        J = models.ExportJob
+        job_ids = [job_id for job_id, in db.query(J.id).filter(J.status == QUEUED).order_by(J.created_at)]
+    return sum(1 for job_id in job_ids if run_job(job_id))
@@ -0,0 +1,165 @@
+"""
+Сводные таблицы для финансов (GET /api/analytics/pivot): «филиал × месяц»,
+«проект × месяц», «топ-10 инициаторов» и т.п.
+
+Один GROUP BY по выбранным измерениям строк и столбцов, дальше pandas
+разворачивает пары в матрицу. Ответ колоночный: подписи строк и столбцов
+отдельно, значения — массив массивов. При ANALYTICS_ENGINE=duckdb GROUP BY
+считает DuckDB по Parquet-снимку (см. duckdb_engine).
+"""
+import datetime
+
+import pandas as pd
+from sqlalchemy import String, func, literal
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.services.analytics import duckdb_engine
+
+DIMENSIONS = ("branch", "team", "project", "created_by", "request_type", "month")
+MEASURES = ("sum", "count")
+REFUND_TYPES = ("refund", "blank_refund")
+
+# Подпись для пустого значения измерения
+EMPTY_LABELS = {
+    "branch": "Другое",
+    "team": "Без команды",
+    "project": "Без проекта",
+    "created_by": "—",
+    "request_type": "expense",  # заявки без типа в аналитике считаются расходами
+    "month": "—",
+}
+
+TOTAL_COLUMN = "Итого"
+
+
+def _month(db: Session):
+    E = models.ExpenseRequest
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(E.date, "YYYY-MM")
+    return func.strftime("%Y-%m", E.date, type_=String)
+
+
+def _dimension(db: Session, name: str):
+    E, M = models.ExpenseRequest, models.TeamMember
+    return {
+        "branch": M.branch,
+        "team": M.team,
+        "project": E.project_name,
+        "created_by": E.created_by,
+        "request_type": E.request_type,
+        "month": _month(db),
+    }[name]
+
+
+def _grouped_rows(db: Session, row: str, column: str, measure: str, start, end, statuses, type: str) -> list:
+    E, M = models.ExpenseRequest, models.TeamMember
+    # Одни и те же объекты в SELECT и GROUP BY — иначе PostgreSQL не узнает выражения с параметрами
+    row_key = _dimension(db, row)
+    group_keys = [row_key]
+    if column:
+        column_key = _dimension(db, column)
+        group_keys.append(column_key)
+    else:
+        column_key = literal(TOTAL_COLUMN)
+    value = func.sum(E.amount_uzs) if measure == "sum" else func.count()
+
+    query = db.query(row_key, column_key, value).select_from(E)
+    if {row, column} & {"branch", "team"}:
+        query = query.outerjoin(M, E.created_by_id == M.id)
+    query = query.filter(E.date >= start)
+    if end:
+        query = query.filter(E.date < end)
+    if statuses:
+        query = query.filter(E.status.in_(statuses))
+    if type == "refund":
+        query = query.filter(E.request_type.in_(REFUND_TYPES))
+    elif type == "expense":
+        query = query.filter(func.coalesce(E.request_type, "expense").notin_(REFUND_TYPES))
+    return query.group_by(*group_keys).all()
+
+
+# Те же измерения в SQL DuckDB (представления из duckdb_engine.connect)
+DUCKDB_DIMENSIONS = {
+    "branch": "m.branch",
+    "team": "m.team",
+    "project": "e.project_name",
+    "created_by": "e.created_by",
+    "request_type": "e.request_type",
+    "month": "strftime(e.date, '%Y-%m')",
+}
+
+
+def _grouped_rows_duckdb(db: Session, row: str, column: str, measure: str, start, end, statuses, type: str) -> list:
+    value = "sum(e.amount_uzs)" if measure == "sum" else "count(*)"
+    column_key = DUCKDB_DIMENSIONS[column] if column else "?"
+    params = [] if column else [TOTAL_COLUMN]
+    conditions = ["e.date >= ?"]
+    params.append(start)
+    if end:
+        conditions.append("e.date < ?")
+        params.append(end)
+    if statuses:
+        conditions.append("list_contains(?, e.status)")
+        params.append(list(statuses))
+    if type == "refund":
+        conditions.append("list_contains(?, e.request_type)")
+        params.append(list(REFUND_TYPES))
+    elif type == "expense":
+        conditions.append("NOT list_contains(?, coalesce(e.request_type, 'expense'))")
+        params.append(list(REFUND_TYPES))
+    sql = (
+        f"SELECT {DUCKDB_DIMENSIONS[row]}, {column_key}, {value} "
+        "FROM expenses e LEFT JOIN team_members m ON e.created_by_id = m.id "
+        f"WHERE {' AND '.join(conditions)} GROUP BY ALL"
+    )
+    with duckdb_engine.connect(db, since=start) as con:
+        return con.execute(sql, params).fetchall()
+
+
+def get_pivot(
+    db: Session,
+    row: str,
+    column: str = None,
+    measure: str = "sum",
+    start: datetime.datetime = None,
+    end: datetime.datetime = None,
+    statuses: tuple = None,
+    type: str = "all",
+    limit: int = None,
+) -> dict:
+    """row × column → measure. limit оставляет первые строки по итогу (топ-N),
+    итоги по столбцам и общий итог при этом считаются по всем строкам."""
+    grouped_rows = _grouped_rows_duckdb if duckdb_engine.active() else _grouped_rows
+    rows = grouped_rows(db, row, column, measure, start, end, statuses, type)
+    frame = pd.DataFrame.from_records(rows, columns=["row", "column", "value"])
+    frame["row"] = frame["row"].where(frame["row"].fillna("") != "", EMPTY_LABELS[row])
+    if column:
+        frame["column"] = frame["column"].where(frame["column"].fillna("") != "", EMPTY_LABELS[column])
+    frame["value"] = frame["value"].astype(float).fillna(0.0)
+
+    # Пустое и NULL значения измерения слились в одну подпись — pivot_table их сложит
+    matrix = frame.pivot_table(index="row", columns="column", values="value", aggfunc="sum", fill_value=0.0)
+    matrix = matrix.reindex(sorted(matrix.columns), axis=1)
+    row_totals = matrix.sum(axis=1)
+    column_totals = matrix.sum(axis=0)
+    total = float(row_totals.sum())
+    # Сначала крупные строки; при равенстве — по подписи, чтобы порядок был стабильным
+    order = sorted(matrix.index, key=lambda label: (-row_totals[label], label))
+    if limit:
+        order = order[:limit]
+    matrix = matrix.loc[order]
+
+    cast = int if measure == "count" else (lambda value: round(float(value), 2))
+    return {
+        "row_dimension": row,
+        "column_dimension": column,
+        "measure": measure,
+        "rows": list(matrix.index),
+        "columns": list(matrix.columns),
+        "values": [[cast(value) for value in line] for line in matrix.to_numpy().tolist()],
+        "row_totals": [cast(row_totals[label]) for label in matrix.index],
+        "column_totals": [cast(column_totals[label]) for label in matrix.columns],
+        "total": cast(total),
+        "total_rows": int(len(row_totals)),
+    }
@@ -0,0 +1,142 @@
+"""
+Время прохождения этапов согласования по истории статусов (GET /api/analytics/sla).
+
+Длительность этапа — от записи истории со статусом from_status до следующей записи
+той же заявки, если следующий статус — to_status. Следующая запись берётся оконной
+функцией LEAD() OVER (PARTITION BY expense_id ORDER BY created_at) — индекс
+ix_expense_status_history_expense_created отдаёт историю уже в этом порядке.
+Перцентили считает pandas по готовым длительностям. При ANALYTICS_ENGINE=duckdb
+тот же запрос выполняет DuckDB по Parquet-снимку истории (см. duckdb_engine).
+"""
+import datetime
+
+import pandas as pd
+from sqlalchemy import DateTime, String, and_, func, null, or_, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.services.analytics import duckdb_engine
+
+# Этапы согласования: (статус, в котором ждёт заявка, статус, которым этап закрывается)
+STAGES = (
+    ("request", "review"),
+    ("pending_senior", "approved_senior"),
+    ("pending_ceo", "approved_ceo"),
+)
+
+QUANTILES = {"p50_hours": 0.5, "p90_hours": 0.9, "p99_hours": 0.99}
+
+SEGMENT_FALLBACK = {"branch": "Другое", "project": "Без проекта"}
+
+# Столбцы переходов, которые отдают _transitions и _transitions_duckdb
+COLUMNS = ["status", "next_status", "entered_at", "left_at", "segment"]
+
+
+def stage_name(from_status: str, to_status: str) -> str:
+    return f"{from_status}→{to_status}"
+
+
+def _transitions(db: Session, start: datetime.datetime, end: datetime.datetime, group_by: str = None) -> pd.DataFrame:
+    H, E, M = models.ExpenseStatusHistory, models.ExpenseRequest, models.TeamMember
+    window = dict(partition_by=H.expense_id, order_by=(H.created_at, H.id))
+    history = (
+        select(
+            H.expense_id,
+            H.status,
+            H.created_at.label("entered_at"),
+            func.lead(H.status, type_=String).over(**window).label("next_status"),
+            func.lead(H.created_at, type_=DateTime).over(**window).label("left_at"),
+        )
+        # Следующая запись всегда позже текущей, поэтому нижнюю границу можно
+        # применить до LEAD, а верхнюю — только после
+        .where(H.created_at >= start)
+        .subquery()
+    )
+
+    column = {"branch": M.branch, "project": E.project_name}.get(group_by)
+    query = (
+        select(history.c.status, history.c.next_status, history.c.entered_at, history.c.left_at,
+               column if column is not None else null())
+        .select_from(history)
+        .where(or_(*[
+            and_(history.c.status == from_status, history.c.next_status == to_status)
+            for from_status, to_status in STAGES
+        ]))
+    )
+    if column is not None:
+        query = query.join(E, E.id == history.c.expense_id)
+        if group_by == "branch":
+            query = query.outerjoin(M, E.created_by_id == M.id)
+    if end:
+        query = query.where(history.c.entered_at < end)
+    return pd.DataFrame.from_records(db.execute(query).all(), columns=COLUMNS)
+
+
+def _transitions_duckdb(db: Session, start: datetime.datetime, end: datetime.datetime, group_by: str = None) -> pd.DataFrame:
+    column = {"branch": "m.branch", "project": "e.project_name"}.get(group_by, "NULL")
+    joins = ""
+    if group_by:
+        joins = "JOIN expenses e ON e.id = h.expense_id"
+        if group_by == "branch":
+            joins += " LEFT JOIN team_members m ON e.created_by_id = m.id"
+    stage_conditions = " OR ".join("(h.status = ? AND h.next_status = ?)" for _ in STAGES)
+    params = [start] + [status for stage in STAGES for status in stage]
+    conditions = f"({stage_conditions})"
+    if end:
+        conditions += " AND h.entered_at < ?"
+        params.append(end)
+    sql = f"""
+        WITH h AS (
+            SELECT expense_id, status, created_at AS entered_at,
+                   lead(status) OVER w AS next_status, lead(created_at) OVER w AS left_at
+            FROM status_history
+            WHERE created_at >= ?
+            WINDOW w AS (PARTITION BY expense_id ORDER BY created_at, id)
+        )
+        SELECT h.status, h.next_status, h.entered_at, h.left_at, {column} AS segment
+        FROM h {joins}
+        WHERE {conditions}
+    """
+    with duckdb_engine.connect(db, history=True) as con:
+        # Сразу DataFrame: без промежуточных Python-кортежей
+        return con.execute(sql, params).df()
+
+
+def _stats(hours: pd.Series) -> dict:
+    stats = {"count": int(hours.size)}
+    for key, q in QUANTILES.items():
+        stats[key] = round(float(hours.quantile(q)), 2) if hours.size else None
+    return stats
+
+
+def get_sla(db: Session, start: datetime.datetime, end: datetime.datetime = None, group_by: str = None) -> dict:
+    transitions = _transitions_duckdb if duckdb_engine.active() else _transitions
+    frame = transitions(db, start, end, group_by)
+    frame["hours"] = (
+        pd.to_datetime(frame["left_at"]) - pd.to_datetime(frame["entered_at"])
+    ).dt.total_seconds() / 3600
+    if group_by:
+        frame["segment"] = frame["segment"].where(frame["segment"].fillna("") != "", SEGMENT_FALLBACK[group_by])
+
+    stages = []
+    for from_status, to_status in STAGES:
+        stage_rows = frame[(frame["status"] == from_status) & (frame["next_status"] == to_status)]
+        stage = {"stage": stage_name(from_status, to_status), "from_status": from_status, "to_status": to_status}
+        stage.update(_stats(stage_rows["hours"]))
+        if group_by:
+            stage["breakdown"] = [
+                {"name": name, **_stats(group["hours"])}
+                for name, group in sorted(stage_rows.groupby("segment"), key=lambda item: item[0])
+            ]
+        stages.append(stage)
+
+    measured = [stage for stage in stages if stage["count"]]
+    return {
+        # Окно [start, end) — end не включается, None — без верхней границы
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "stages": stages,
+        # Этап с самым долгим p90 — первый кандидат на разбор
+        "bottleneck": max(measured, key=lambda stage: stage["p90_hours"])["stage"] if measured else None,
+    }
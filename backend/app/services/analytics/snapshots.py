@@ -0,0 +1,274 @@
+"""
+Снимки заявок в Parquet для офлайн-аналитики и BI — вместо выгрузок из рабочей базы.
+
+Файлы разбиты по месяцам в стиле Hive (читаются pyarrow.dataset, DuckDB, pandas):
+    {UPLOAD_DIR}/snapshots/expense_requests/month=2026-10/data.parquet
+    {UPLOAD_DIR}/snapshots/expense_items/month=2026-10/data.parquet
+    {UPLOAD_DIR}/snapshots/expense_status_history/month=2026-10/data.parquet
+
+Месяц — по дате заявки (expense_requests.date); позиции и история лежат в месяце
+своей заявки. Для каждой пары (таблица, месяц) одним GROUP BY считается отпечаток:
+число строк и сумма отметок времени в секундах (updated_at заявки, created_at записи
+истории). Отпечатки прошлого запуска хранятся в manifest.json — перезаписываются
+только месяцы, где отпечаток изменился, и удаляются опустевшие.
+
+Строки читаются порциями (yield_per, на PostgreSQL — серверный курсор) и пишутся
+в файл по row group'ам: память не зависит от размера месяца. Файл сначала пишется
+рядом во временный и подменяется os.replace, читатели не видят недописанных файлов.
+"""
+import asyncio
+import contextlib
+import datetime
+import fcntl
+import json
+import os
+import shutil
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import JSON, BigInteger, Date, DateTime, Integer, Numeric, String, cast, extract, func, select
+from sqlalchemy.orm import Session
+
+from app.core.database import read_database_session
+from app.core.logging_config import get_logger
+from app.db import models
+
+logger = get_logger(__name__)
+
+SNAPSHOT_DIR = os.path.join(os.getenv("UPLOAD_DIR", "/app/uploads"), "snapshots")
+CHUNK_SIZE = int(os.getenv("SNAPSHOT_CHUNK_SIZE", "10000"))
+# Время ежедневного запуска внутри API (ЧЧ:ММ, UTC); не задано — только CLI
+SNAPSHOT_TIME = os.getenv("SNAPSHOT_TIME")
+
+MANIFEST_FILE = "manifest.json"
+DATA_FILE = "data.parquet"
+# Так pyarrow и DuckDB называют раздел для NULL-значения ключа
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# search_text — производное поле для поиска, аналитике не нужно
+EXCLUDED_COLUMNS = {"search_text"}
+
+
+def _tables() -> dict:
+    """Таблица → модель, порядок строк в файле и столбец времени для отпечатка."""
+    E, I, H = models.ExpenseRequest, models.ExpenseItem, models.ExpenseStatusHistory
+    return {
+        "expense_requests": dict(model=E, order_by=(E.date, E.id), stamp=E.updated_at),
+        # Позиции не меняются после создания заявки
+        "expense_items": dict(model=I, order_by=(I.expense_id, I.position), stamp=E.created_at),
+        "expense_status_history": dict(model=H, order_by=(H.expense_id, H.created_at, H.id), stamp=H.created_at),
+    }
+
+
+def _columns(model) -> list:
+    return [column for column in model.__table__.columns if column.name not in EXCLUDED_COLUMNS]
+
+
+def _arrow_type(column):
+    column_type = column.type
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    # String, Text и JSON (JSON пишется текстом)
+    return pa.string()
+
+
+def _schema(columns) -> pa.Schema:
+    return pa.schema([pa.field(column.name, _arrow_type(column)) for column in columns])
+
+
+def _month(db: Session):
+    E = models.ExpenseRequest
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(E.date, "YYYY-MM")
+    return func.strftime("%Y-%m", E.date, type_=String)
+
+
+def epoch_seconds(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.floor(extract("epoch", column)), BigInteger)
+    return cast(func.strftime("%s", column), BigInteger)
+
+
+def _with_expense(query, model):
+    if model is models.ExpenseRequest:
+        return query
+    return query.join(models.ExpenseRequest, models.ExpenseRequest.id == model.expense_id)
+
+
+def _fingerprints(db: Session, spec: dict) -> dict:
+    """Месяц → [число строк, сумма отметок времени].
+
+    Сумма, а не max: правка, закоммиченная позже другой, но с более ранней
+    отметкой (длинная транзакция), всё равно меняет отпечаток.
+    """
+    month = _month(db).label("month")
+    query = _with_expense(
+        select(month, func.count(), func.sum(epoch_seconds(db, spec["stamp"]))).select_from(spec["model"]),
+        spec["model"],
+    )
+    return {
+        month or NULL_PARTITION: [int(count), int(stamps or 0)]
+        for month, count, stamps in db.execute(query.group_by(month))
+    }
+
+
+def _month_filter(month: str) -> tuple:
+    E = models.ExpenseRequest
+    if month == NULL_PARTITION:
+        return (E.date.is_(None),)
+    start = datetime.datetime.strptime(month, "%Y-%m")
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    # Диапазон, а не to_char(date) = month, — чтобы работал индекс по date
+    return E.date >= start, E.date < end
+
+
+def _select(model, *criteria):
+    """Столбцы снимка модели; условия могут ссылаться и на expense_requests."""
+    return _with_expense(select(*_columns(model)), model).where(*criteria)
+
+
+def _batch(rows, columns, schema) -> pa.RecordBatch:
+    arrays = []
+    for index, (column, field) in enumerate(zip(columns, schema)):
+        values = [row[index] for row in rows]
+        if isinstance(column.type, JSON):
+            values = [None if value is None else orjson.dumps(value).decode() for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _partition_dir(base_dir: str, table: str, month: str) -> str:
+    return os.path.join(base_dir, table, f"month={month}")
+
+
+def read_table(db: Session, model, *criteria) -> pa.Table:
+    """Строки модели в схеме снимка — для дельты «после снимка» (см. duckdb_engine)."""
+    columns = _columns(model)
+    schema = _schema(columns)
+    query = _select(model, *criteria).execution_options(yield_per=CHUNK_SIZE)
+    batches = [_batch(chunk, columns, schema) for chunk in db.execute(query).partitions()]
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def _write_partition(db: Session, spec: dict, month: str, directory: str) -> int:
+    columns = _columns(spec["model"])
+    schema = _schema(columns)
+    query = _select(spec["model"], *_month_filter(month))
+    query = query.order_by(*spec["order_by"]).execution_options(yield_per=CHUNK_SIZE)
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, DATA_FILE)
+    tmp_path = os.path.join(directory, f".{DATA_FILE}.tmp")
+    rows = 0
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for chunk in db.execute(query).partitions():
+                writer.write_batch(_batch(chunk, columns, schema))
+                rows += len(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def load_manifest(base_dir: str) -> dict:
+    path = os.path.join(base_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(base_dir: str, manifest: dict):
+    path = os.path.join(base_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    manifest["updated_at"] = datetime.datetime.utcnow().isoformat()
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def _run_lock(base_dir: str):
+    """Файловый лок: CLI и расписание в нескольких воркерах не пишут одновременно."""
+    os.makedirs(base_dir, exist_ok=True)
+    with open(os.path.join(base_dir, ".lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def update_snapshots(db: Session, base_dir: str = SNAPSHOT_DIR) -> dict:
+    """Переписывает изменившиеся месяцы. Возвращает {таблица: {"written": {месяц: строк}, "removed": [...]}}
+    или None, если снимок уже пишет другой процесс."""
+    with _run_lock(base_dir) as acquired:
+        if not acquired:
+            logger.warning("Snapshots: another run holds the lock, skipping")
+            return None
+
+        # Снимок не старше начала запуска: всё, что изменится позже, поменяет отпечатки
+        started_at = datetime.datetime.utcnow()
+        manifest = load_manifest(base_dir)
+        report = {}
+        for table, spec in _tables().items():
+            saved = manifest["tables"].setdefault(table, {})
+            current = _fingerprints(db, spec)
+            written, removed = {}, []
+            for month in sorted(current):
+                if saved.get(month) == current[month]:
+                    continue
+                written[month] = _write_partition(db, spec, month, _partition_dir(base_dir, table, month))
+                # Манифест после каждого месяца: прерванный запуск продолжится с того же места
+                saved[month] = current[month]
+                _save_manifest(base_dir, manifest)
+            for month in sorted(set(saved) - set(current)):
+                shutil.rmtree(_partition_dir(base_dir, table, month), ignore_errors=True)
+                del saved[month]
+                removed.append(month)
+            _save_manifest(base_dir, manifest)
+            report[table] = {"written": written, "removed": removed}
+            logger.info(f"Snapshots: {table}: {len(written)} month(s) written, {len(removed)} removed")
+        # Только после полного прохода: после as_of в базе менялись лишь строки с updated_at > as_of
+        manifest["as_of"] = started_at.isoformat()
+        _save_manifest(base_dir, manifest)
+        return report
+
+
+def run_snapshots(base_dir: str = SNAPSHOT_DIR) -> dict:
+    """Снимок с реплики для чтения (DATABASE_READ_URL), без неё — с основной базы."""
+    with read_database_session() as db:
+        return update_snapshots(db, base_dir)
+
+
+def seconds_until(at: str, now: datetime.datetime = None) -> float:
+    """Секунд до ближайшего at (ЧЧ:ММ, UTC)."""
+    now = now or datetime.datetime.utcnow()
+    hour, minute = (int(part) for part in at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+async def run_schedule(at: str):
+    """Фоновая задача API: раз в сутки в at (UTC) обновляет снимки в отдельном потоке."""
+    while True:
+        await asyncio.sleep(seconds_until(at))
+        try:
+            await asyncio.to_thread(run_snapshots)
+        except Exception as e:
+            logger.error(f"Snapshots: scheduled run failed: {e}", exc_info=True)
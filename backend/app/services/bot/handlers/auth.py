@@ -4,8 +4,8 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from app.core import auth, database
-from app.db import models
-from ..notifications import set_admin_chat_id
+from app.db import crud_async
+from ..notifications import set_admin_chat_id_async
 from ..states import ExpenseWizard
 from ..keyboards import get_main_kb, get_projects_kb, get_date_kb
 
@@ -14,8 +14,8 @@ router = Router()
 @router.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
     tg_id = message.from_user.id
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == tg_id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, tg_id)
         if user:
             await state.update_data(user_id=user.id)
             if user.position == "ceo":
@@ -38,8 +38,8 @@ async def cmd_start(message: types.Message, state: FSMContext):
             return
 
     # Check for admin
-    with database.database_session() as db:
-        setting = db.query(models.Setting).filter(models.Setting.key == "admin_chat_id").first()
+    async with database.async_database_session() as db:
+        setting = await crud_async.get_setting(db, "admin_chat_id")
         if setting and setting.value == str(tg_id):
             await message.answer("С возвращением, Сафина!", reply_markup=types.ReplyKeyboardRemove())
             return
@@ -53,15 +53,13 @@ async def cmd_start(message: types.Message, state: FSMContext):
 @router.message(Command("logout"))
 async def cmd_logout(message: types.Message, state: FSMContext):
     tg_id = message.from_user.id
-    with database.database_session() as db:
-        db.query(models.TeamMember).filter(
-            models.TeamMember.telegram_chat_id == tg_id
-        ).update({models.TeamMember.telegram_chat_id: None})
+    async with database.async_database_session() as db:
+        await crud_async.unlink_chat(db, tg_id)
 
-        setting = db.query(models.Setting).filter(models.Setting.key == "admin_chat_id").first()
+        setting = await crud_async.get_setting(db, "admin_chat_id")
         if setting and setting.value == str(tg_id):
-            db.delete(setting)
-        db.commit()
+            await db.delete(setting)
+        await db.commit()
 
     await state.clear()
     await message.answer(
@@ -87,13 +85,13 @@ async def process_login(message: types.Message, state: FSMContext):
 
     # Admin auth
     if login == os.getenv("ADMIN_LOGIN", "safina") and password == os.getenv("ADMIN_PASSWORD", "admin123"):
-        set_admin_chat_id(tg_id)
+        await set_admin_chat_id_async(tg_id)
         await message.answer("✅ Вход выполнен (Админ Сафина)!", reply_markup=types.ReplyKeyboardRemove())
         await state.clear()
         return
 
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.login == login).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_login(db, login)
         if not (user and auth.verify_password(password, user.password_hash)):
             await message.answer("❌ Неверный логин или пароль. Попробуйте снова:")
             await state.clear()
@@ -106,7 +104,7 @@ async def process_login(message: types.Message, state: FSMContext):
             return
 
         user.telegram_chat_id = tg_id
-        db.commit()
+        await db.commit()
         await state.update_data(user_id=user.id)
 
         if user.position == "ceo":
@@ -3,18 +3,17 @@ from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
 from app.core import database, auth
-from app.db import models, schemas, crud
+from app.db import schemas, crud_async
 from ..states import BlankWizard, RefundBlankWizard
 from ..keyboards import (
     get_main_kb, get_fill_method_kb, get_currency_kb, 
     get_confirm_kb, get_back_kb, get_projects_kb, get_template_select_kb
 )
 from ..utils import _BACK
-from ..notifications import send_admin_notification, get_admin_chat_id
+from ..notifications import send_admin_notification, get_admin_chat_id_async
 from ...currency.service import currency_service
 import os
 import datetime
-from sqlalchemy.orm import Session, joinedload
 from typing import Optional, List, Dict, Any
 
 router = Router()
@@ -30,12 +29,8 @@ async def start_blank_wizard(message: types.Message, state: FSMContext):
     user_templates = []
     user_id = None
     
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).options(
-            joinedload(models.TeamMember.projects)
-        ).filter(
-            models.TeamMember.telegram_chat_id == message.from_user.id
-        ).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id, with_projects=True)
         
         if not user:
             user_not_found = True
@@ -87,12 +82,8 @@ async def handle_project_selection(message: types.Message, state: FSMContext):
     user_templates = []
     user_id = None
 
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).options(
-            joinedload(models.TeamMember.projects)
-        ).filter(
-            models.TeamMember.telegram_chat_id == message.from_user.id
-        ).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id, with_projects=True)
         
         if not user:
             user_not_found = True
@@ -153,12 +144,8 @@ async def handle_template_selection(message: types.Message, state: FSMContext):
     if message.text == _BACK:
         projects_data = []
         user_id = None
-        with database.database_session() as db:
-            user = db.query(models.TeamMember).options(
-                joinedload(models.TeamMember.projects)
-            ).filter(
-                models.TeamMember.telegram_chat_id == message.from_user.id
-            ).first()
+        async with database.async_database_session() as db:
+            user = await crud_async.get_member_by_chat_id(db, message.from_user.id, with_projects=True)
             if user:
                 user_id = user.id
                 for p in user.projects:
@@ -365,8 +352,8 @@ async def handle_final_submit(message: types.Message, state: FSMContext):
     expense_req_id = None
     request_id = None
     
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.id == user_id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member(db, user_id)
             
         if not user:
             await message.answer("Ошибка: пользователь не найден.")
@@ -384,12 +371,12 @@ async def handle_final_submit(message: types.Message, state: FSMContext):
             template_key=data["template"]
         )
         
-        expense_req = crud.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
+        expense_req = await crud_async.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
         expense_req_id = expense_req.id
         request_id = expense_req.request_id
 
     # 2. Уведомляем админа (вне сессии)
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         await send_admin_notification(expense_req_id, admin_chat_id)
         
@@ -1,6 +1,6 @@
 from aiogram import Router, types, F
 from app.core import database
-from app.db import models
+from app.db import crud_async
 from ..notifications import send_ceo_notification
 
 router = Router()
@@ -9,8 +9,8 @@ router = Router()
 async def handle_check_requests(message: types.Message):
     tg_id = message.from_user.id
     
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == tg_id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, tg_id)
         if not user or user.position not in ["ceo", "senior_financier"]:
             return
 
@@ -18,15 +18,14 @@ async def handle_check_requests(message: types.Message):
         target_status = "pending_ceo" if is_ceo else "pending_senior"
 
         # Находим все заявки со статусом
-        pending_requests = db.query(models.ExpenseRequest).filter(
-            models.ExpenseRequest.status == target_status
-        ).order_by(models.ExpenseRequest.date.asc()).limit(10).all()
+        pending_requests = await crud_async.get_oldest_expenses_by_status(db, target_status, limit=10)
         
         if not pending_requests:
             await message.answer("✅ Новых заявок для согласования нет.")
             return
             
         await message.answer(f"🔍 Найдено {len(pending_requests)} заявок (показаны 10 старейших):")
+        await crud_async.attach_budgets(db, pending_requests)
         
         for req in pending_requests:
             exp_dict = {
@@ -39,6 +38,7 @@ async def handle_check_requests(message: types.Message):
                 "total_amount": req.total_amount,
                 "currency": req.currency,
                 "usd_rate": req.usd_rate,
+                "budget": req.budget,
             }
             if is_ceo:
                 from ..notifications import send_ceo_notification
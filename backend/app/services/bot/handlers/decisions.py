@@ -3,21 +3,22 @@ import os
 from aiogram import Router, types, F
 
 from app.core import database
-from app.db import crud, models, schemas
-from ..notifications import send_ceo_decision_notification, get_admin_chat_id, get_senior_financier_chat_ids
+from app.db import crud_async, schemas
+from app.db.expense_query import ExpenseQuerySpec
+from ..notifications import send_ceo_decision_notification, get_admin_chat_id_async, get_senior_financier_chat_ids_async
 
 router = Router()
 
 @router.callback_query(F.data.startswith("approve_senior_"))
 async def handle_approve_senior(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("approve_senior_")
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == callback.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, callback.from_user.id)
         if not user or user.position not in ["senior_financier", "admin"]:
             await callback.answer("У вас нет прав для этого действия", show_alert=True)
             return
 
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+        expense = await crud_async.get_expense(db, expense_id)
         if not expense:
             await callback.answer("Ошибка: Заявка не найдена", show_alert=True)
             return
@@ -27,7 +28,7 @@ async def handle_approve_senior(callback: types.CallbackQuery):
             return
 
         update = schemas.ExpenseStatusUpdate(status="approved_senior", comment="Утверждено CFO")
-        crud.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CFO)")
+        await crud_async.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CFO)")
     
     await callback.message.edit_text(callback.message.text + "\n\n✅ *Утверждено CFO*", parse_mode="Markdown")
     await callback.answer("Инвестиция утверждена!")
@@ -35,13 +36,13 @@ async def handle_approve_senior(callback: types.CallbackQuery):
 @router.callback_query(F.data.startswith("reject_senior_"))
 async def handle_reject_senior(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("reject_senior_")
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == callback.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, callback.from_user.id)
         if not user or user.position not in ["senior_financier", "admin"]:
             await callback.answer("У вас нет прав для этого действия", show_alert=True)
             return
 
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+        expense = await crud_async.get_expense(db, expense_id)
         if not expense:
             await callback.answer("Ошибка: Заявка не найдена", show_alert=True)
             return
@@ -51,7 +52,7 @@ async def handle_reject_senior(callback: types.CallbackQuery):
             return
 
         update = schemas.ExpenseStatusUpdate(status="rejected_senior", comment="Отклонено CFO")
-        crud.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CFO)")
+        await crud_async.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CFO)")
     
     await callback.message.edit_text(callback.message.text + "\n\n❌ *Отклонено CFO*", parse_mode="Markdown")
     await callback.answer("Инвестиция отклонена!")
@@ -59,13 +60,13 @@ async def handle_reject_senior(callback: types.CallbackQuery):
 @router.callback_query(F.data.startswith("approve_ceo_"))
 async def handle_approve_ceo(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("approve_ceo_")
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == callback.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, callback.from_user.id)
         if not user or user.position != "ceo":
             await callback.answer("У вас нет прав для этого действия (Только CEO)", show_alert=True)
             return
 
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+        expense = await crud_async.get_expense(db, expense_id)
         if not expense:
             await callback.answer("Ошибка: Заявка не найдена")
             return
@@ -75,7 +76,7 @@ async def handle_approve_ceo(callback: types.CallbackQuery):
             return
             
         update = schemas.ExpenseStatusUpdate(status="approved_ceo", comment="Одобрено CEO")
-        crud.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CEO)")
+        await crud_async.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CEO)")
         
         # Сохраняем данные для уведомлений ДО выхода из сессии
         req_id = expense.request_id
@@ -87,8 +88,8 @@ async def handle_approve_ceo(callback: types.CallbackQuery):
     await callback.answer("Инвестиция одобрена CEO!")
 
     # Notifications
-    admin_id = get_admin_chat_id()
-    cfo_ids = get_senior_financier_chat_ids()
+    admin_id = await get_admin_chat_id_async()
+    cfo_ids = await get_senior_financier_chat_ids_async()
     
     tasks = []
     if admin_id:
@@ -103,13 +104,13 @@ async def handle_approve_ceo(callback: types.CallbackQuery):
 @router.callback_query(F.data.startswith("reject_ceo_"))
 async def handle_reject_ceo(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("reject_ceo_")
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == callback.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, callback.from_user.id)
         if not user or user.position != "ceo":
             await callback.answer("У вас нет прав для этого действия (Только CEO)", show_alert=True)
             return
 
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+        expense = await crud_async.get_expense(db, expense_id)
         if not expense:
             await callback.answer("Ошибка: Заявка не найдена")
             return
@@ -119,7 +120,7 @@ async def handle_reject_ceo(callback: types.CallbackQuery):
             return
             
         update = schemas.ExpenseStatusUpdate(status="rejected_ceo", comment="Отклонено CEO")
-        crud.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CEO)")
+        await crud_async.update_expense_status(db, expense_id, update, user_name=f"{user.last_name} {user.first_name} (CEO)")
         
         # Сохраняем данные для уведомлений ДО выхода из сессии
         req_id = expense.request_id
@@ -130,8 +131,8 @@ async def handle_reject_ceo(callback: types.CallbackQuery):
     await callback.message.edit_text(callback.message.text + "\n\n❌ *Отклонено CEO*", parse_mode="Markdown")
     await callback.answer("Инвестиция отклонена CEO!")
 
-    admin_id = get_admin_chat_id()
-    cfo_ids = get_senior_financier_chat_ids()
+    admin_id = await get_admin_chat_id_async()
+    cfo_ids = await get_senior_financier_chat_ids_async()
     
     tasks = []
     if admin_id:
@@ -148,14 +149,14 @@ async def handle_download_smeta(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("download_smeta_")
     from app.services.docx.service import docx_service
     
-    with database.database_session() as db:
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+    async with database.async_database_session() as db:
+        expense = await crud_async.get_expense(db, expense_id, for_document=True)
         if not expense:
             await callback.answer("Заявка не найдена")
             return
             
         try:
-            stream = docx_service.generate_expense_docx(expense)
+            stream = await docx_service.generate_expense_docx_async(expense)
             fname = f"smeta_{expense.request_id}.docx"
             input_file = types.BufferedInputFile(stream.getvalue(), filename=fname)
             await callback.message.answer_document(input_file)
@@ -168,15 +169,16 @@ async def handle_download_excel(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("download_excel_")
     from app.services.analytics import export as export_service
     
-    with database.database_session() as db:
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+    async with database.async_database_session() as db:
+        expense = await crud_async.get_expense(db, expense_id)
         if not expense:
             await callback.answer("Заявка не найдена")
             return
             
         try:
-            # For a single expense, we still use the export service but with a list of one
-            stream = export_service.generate_expenses_xlsx([expense])
+            # Тот же отчёт, что и общий экспорт, но по одной заявке
+            rows = await crud_async.get_expense_item_rows(db, ExpenseQuerySpec(expense_id=expense_id))
+            stream = export_service.generate_expenses_xlsx(rows)
             fname = f"report_{expense.request_id}.xlsx"
             input_file = types.BufferedInputFile(stream.getvalue(), filename=fname)
             await callback.message.answer_document(input_file)
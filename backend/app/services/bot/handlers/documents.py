@@ -2,7 +2,7 @@ import os
 from aiogram import Router, types, F
 
 from app.core import database
-from app.db import models
+from app.db import crud_async
 from app.services.docx.service import docx_service
 
 router = Router()
@@ -10,15 +10,15 @@ router = Router()
 @router.callback_query(F.data.startswith("download_smeta_") | F.data.startswith("download_excel_"))
 async def handle_download_document(callback: types.CallbackQuery):
     expense_id = callback.data.removeprefix("download_smeta_").removeprefix("download_excel_")
-    with database.database_session() as db:
-        expense = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.id == expense_id).first()
+    async with database.async_database_session() as db:
+        expense = await crud_async.get_expense(db, expense_id, for_document=True)
         if not expense:
             await callback.answer("Не найдено")
             return
         await callback.answer("Генерирую документ...")
         
         try:
-            file_stream = docx_service.generate_expense_docx(expense)
+            file_stream = await docx_service.generate_expense_docx_async(expense)
             
             # Choose filename based on template or request_id
             tpl_label = expense.template_key.upper() if getattr(expense, 'template_key', None) else "BLANK"
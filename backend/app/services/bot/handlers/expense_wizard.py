@@ -7,13 +7,13 @@ from aiogram.types import WebAppInfo
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 from app.core import database
-from app.db import models, schemas, crud
+from app.db import schemas, crud_async
 from ..states import ExpenseWizard
 from ..keyboards import get_confirm_kb, get_date_kb, get_currency_kb, get_projects_kb, get_main_kb, get_back_kb
 from ..utils import tashkent_now, _BACK
 from decimal import Decimal
 from app.services.currency.service import currency_service
-from ..notifications import send_admin_notification, get_admin_chat_id
+from ..notifications import send_admin_notification, get_admin_chat_id_async
 
 router = Router()
 
@@ -24,8 +24,8 @@ async def start_wizard_selection(message: types.Message, state: FSMContext):
     projects = []
     user_id = None
     
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == message.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id, with_projects=True)
         if not user:
             user_not_found = True
         else:
@@ -61,8 +61,8 @@ async def process_project_selection(message: types.Message, state: FSMContext):
         await message.answer("Отменено.", reply_markup=get_main_kb())
         return
         
-    with database.database_session() as db:
-        projects = db.query(models.Project).all()
+    async with database.async_database_session() as db:
+        projects = await crud_async.get_projects(db)
         selected = next((p for p in projects if f"{p.name} ({p.code})" == message.text), None)
         if selected:
             await state.update_data(project_id=selected.id)
@@ -76,8 +76,8 @@ async def process_date(message: types.Message, state: FSMContext):
     if message.text == _BACK:
         data = await state.get_data()
         user_id = data.get("user_id")
-        with database.database_session() as db:
-            user = db.query(models.TeamMember).filter(models.TeamMember.id == user_id).first()
+        async with database.async_database_session() as db:
+            user = await crud_async.get_member(db, user_id, with_projects=True)
             if user and len(user.projects) > 1:
                 await message.answer("Выберите проект:", reply_markup=get_projects_kb(user.projects))
                 await state.set_state(ExpenseWizard.project_selection)
@@ -216,7 +216,7 @@ async def process_finish(message: types.Message, state: FSMContext):
     request_id = None
 
     try:
-        with database.database_session() as db:
+        async with database.async_database_session() as db:
             total = sum(Decimal(str(i["amount"])) * Decimal(str(i["quantity"])) for i in items)
             expense_create = schemas.ExpenseRequestCreate(
                 purpose=data.get("purpose"),
@@ -226,12 +226,12 @@ async def process_finish(message: types.Message, state: FSMContext):
                 project_id=data.get("project_id"),
                 date=datetime.datetime.fromisoformat(data.get("date")),
             )
-            db_expense = crud.create_expense_request(db, expense_create, user_id=data.get("user_id"), usd_rate=usd_rate)
+            db_expense = await crud_async.create_expense_request(db, expense_create, user_id=data.get("user_id"), usd_rate=usd_rate)
             expense_req_id = db_expense.id
             request_id = db_expense.request_id
         
         # Notify Safina
-        admin_chat_id = get_admin_chat_id()
+        admin_chat_id = await get_admin_chat_id_async()
         if admin_chat_id and expense_req_id:
             await send_admin_notification(expense_req_id, admin_chat_id)
             
@@ -2,9 +2,8 @@ from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from aiogram.types import WebAppInfo
-from sqlalchemy.orm import joinedload
 from app.core import database, auth
-from app.db import models, schemas, crud
+from app.db import schemas, crud_async
 from ..states import RefundBlankWizard
 from ..keyboards import (
     get_main_kb, get_fill_method_kb, get_back_kb, 
@@ -24,12 +23,8 @@ async def start_direct_refund_bot(message: types.Message, state: FSMContext):
     projects_data = []
     user_id = None
     
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).options(
-            joinedload(models.TeamMember.projects)
-        ).filter(
-            models.TeamMember.telegram_chat_id == message.from_user.id
-        ).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id, with_projects=True)
         
         if not user:
             await message.answer("Ошибка: вы не зарегистрированы в системе.")
@@ -66,8 +61,8 @@ async def handle_refund_project_selection(message: types.Message, state: FSMCont
         return
 
     project_id = None
-    with database.database_session() as db:
-        projects = db.query(models.Project).all()
+    async with database.async_database_session() as db:
+        projects = await crud_async.get_projects(db)
         selected = next((p for p in projects if f"{p.name} ({p.code})" == message.text), None)
         if selected:
             project_id = selected.id
@@ -376,8 +371,8 @@ async def show_refund_summary(message: types.Message, state: FSMContext):
     await message.answer(summary, parse_mode="Markdown", reply_markup=kb.as_markup(resize_keyboard=True))
 
 from app.core import database, auth
-from app.db import models, schemas, crud
-from ..notifications import send_admin_notification, get_admin_chat_id
+from app.db import schemas, crud_async
+from ..notifications import send_admin_notification, get_admin_chat_id_async
 from ...currency.service import currency_service
 
 @router.message(F.text == "✅ Отправить Сафине", RefundBlankWizard.confirm)
@@ -387,8 +382,8 @@ async def handle_refund_final_submit(message: types.Message, state: FSMContext):
     expense_req_id = None
     request_id = None
 
-    with database.database_session() as db:
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == message.from_user.id).first()
+    async with database.async_database_session() as db:
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id)
         if not user:
             await message.answer("Ошибка: пользователь не найден.")
             return
@@ -425,12 +420,12 @@ async def handle_refund_final_submit(message: types.Message, state: FSMContext):
         )
 
 
-        expense_req = crud.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
+        expense_req = await crud_async.create_expense_request(db=db, expense=expense_create, user_id=user.id, usd_rate=usd_rate)
         expense_req_id = expense_req.id
         request_id = expense_req.request_id
 
     # 2. Уведомляем админа (вне сессии)
-    admin_chat_id = get_admin_chat_id()
+    admin_chat_id = await get_admin_chat_id_async()
     if admin_chat_id:
         await send_admin_notification(expense_req_id, admin_chat_id)
 
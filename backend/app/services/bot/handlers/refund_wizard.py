@@ -14,9 +14,9 @@ router = Router()
 
 @router.message(F.text == "Оформить возврат (в боте)")
 async def start_refund_wizard(message: types.Message, state: FSMContext):
-    with database.database_session() as db:
-        from app.db import models
-        user = db.query(models.TeamMember).filter(models.TeamMember.telegram_chat_id == message.from_user.id).first()
+    async with database.async_database_session() as db:
+        from app.db import crud_async
+        user = await crud_async.get_member_by_chat_id(db, message.from_user.id)
         if not user:
             await message.answer("Авторизуйтесь: /start")
             return
@@ -124,7 +124,7 @@ async def process_refund_retention(message: types.Message, state: FSMContext):
 @router.callback_query(RefundWizard.confirm, F.data == "refund_submit")
 async def handle_refund_submit(callback: types.CallbackQuery, state: FSMContext):
     from app.services.refund.service import create_refund
-    from ..notifications import send_admin_notification, get_admin_chat_id
+    from ..notifications import send_admin_notification, get_admin_chat_id_async
     data = await state.get_data()
     
     user_id = data.get("user_id")
@@ -142,7 +142,7 @@ async def handle_refund_submit(callback: types.CallbackQuery, state: FSMContext)
     expense_id = None
 
     try:
-        with database.database_session() as db:
+        async with database.async_database_session() as db:
             reason = data["reason"]
             if reason == "Другое" and data.get("reason_other"):
                 reason = f"Другое: {data['reason_other']}"
@@ -162,7 +162,7 @@ async def handle_refund_submit(callback: types.CallbackQuery, state: FSMContext)
             request_id = expense_req.request_id
 
         # Notify Safina
-        admin_chat_id = get_admin_chat_id()
+        admin_chat_id = await get_admin_chat_id_async()
         if admin_chat_id:
             await send_admin_notification(expense_id, admin_chat_id)
 
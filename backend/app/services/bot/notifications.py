@@ -59,6 +59,23 @@ def _format_expense_dt(expense_date: datetime.datetime) -> str:
     return expense_date.strftime("%H:%M:%S %d.%m.%Y")
 
 
+def _budget_lines(budget: dict | None) -> str:
+    """Остаток месячного бюджета проекта и филиала (expense["budget"], см. app/db/budgets.py)."""
+    lines = ""
+    for title, status in (("проекта", (budget or {}).get("project")), ("филиала", (budget or {}).get("branch"))):
+        if not status or status.get("budget") is None:
+            continue
+        if status.get("branch"):
+            title = f"филиала {status['branch']}"
+        remaining = status["remaining"]
+        mark = "⚠️" if remaining < 0 else "📊"
+        lines += (
+            f"{mark} Бюджет {title} за {status['month']}: "
+            f"остаток {remaining:,.0f} из {status['budget']:,.0f} UZS\n"
+        )
+    return lines
+
+
 # ---------------------------------------------------------------------------
 # Status notifications (to the request creator via Telegram)
 # ---------------------------------------------------------------------------
@@ -171,6 +188,7 @@ async def send_senior_notification(expense: dict, senior_chat_id: int) -> None:
     )
     if usd_rate:
         text += f"📉 Курс: {float(usd_rate):,.2f} UZS/USD\n"
+    text += _budget_lines(expense.get("budget"))
 
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Утвердить", callback_data=f"approve_senior_{expense_id_db}")
@@ -206,6 +224,7 @@ async def send_ceo_notification(expense: dict, ceo_chat_id: int) -> None:
     )
     if usd_rate:
         text += f"📉 Курс: {float(usd_rate):,.2f} UZS/USD\n"
+    text += _budget_lines(expense.get("budget"))
 
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Одобрить", callback_data=f"approve_ceo_{expense_id_db}")
@@ -328,3 +347,38 @@ def get_ceo_chat_id() -> int | None:
     """Return CEO Telegram chat_id (first linked CEO found)."""
     ids = _get_chat_id_by_position("ceo")
     return ids[0] if ids else None
+
+
+# ---------------------------------------------------------------------------
+# DB helpers  (async — for async routes and bot handlers, do not block the loop)
+# ---------------------------------------------------------------------------
+
+async def get_admin_chat_id_async() -> int | None:
+    from app.core import database
+    from app.db import crud_async
+    async with database.async_database_session() as db:
+        setting = await crud_async.get_setting(db, "admin_chat_id")
+        return int(setting.value) if setting else None
+
+
+async def set_admin_chat_id_async(chat_id: int) -> None:
+    from app.core import database
+    from app.db import crud_async
+    async with database.async_database_session() as db:
+        await crud_async.set_setting(db, "admin_chat_id", str(chat_id))
+
+
+async def get_senior_financier_chat_ids_async() -> list[int]:
+    from app.core import database
+    from app.db import crud_async
+    async with database.async_database_session() as db:
+        return await crud_async.get_chat_ids_by_position(db, "senior_financier")
+
+
+async def get_ceo_chat_id_async() -> int | None:
+    """Return CEO Telegram chat_id (first linked CEO found)."""
+    from app.core import database
+    from app.db import crud_async
+    async with database.async_database_session() as db:
+        ids = await crud_async.get_chat_ids_by_position(db, "ceo")
+        return ids[0] if ids else None
@@ -1,26 +1,99 @@
-from docxtpl import DocxTemplate
-import io
+"""
+Генерация DOCX по шаблону: разобранные шаблоны — app/services/docx/registry.py,
+рендер — в пуле из DOCX_WORKERS процессов (по умолчанию 2).
+
+Рендер docxtpl — чистый CPU под GIL (регулярные выражения, Jinja, lxml, zlib): в потоке
+API он тормозит остальные запросы, в обработчике бота — весь event loop. Пул ограничен,
+поэтому очередь скачиваний не съедает больше DOCX_WORKERS ядер. Каждый процесс пула
+при старте разбирает все шаблоны (registry.preload). При DOCX_WORKERS=0 рендер идёт
+в вызывающем процессе — с тем же кэшем шаблонов.
+"""
+import asyncio
 import datetime
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-def generate_docx(template_path, data):
-    """
-    Generate a DOCX file from a template and data using docxtpl.
-    Returns an io.BytesIO stream.
-    """
-    doc = DocxTemplate(template_path)
-    
+from . import registry
+
+DOCX_WORKERS = int(os.getenv("DOCX_WORKERS", "2"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=DOCX_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=registry.preload
+            )
+        return _executor
+
+
+def _submit(template_path, data):
+    global _executor
+    try:
+        return _pool().submit(registry.render, template_path, data)
+    except BrokenProcessPool:
+        # Процесс пула упал — пул больше не принимает задачи
+        with _executor_lock:
+            _executor = None
+        return _pool().submit(registry.render, template_path, data)
+
+
+def _prepare(data):
     # Ensure date is formatted if it's a datetime object
     if isinstance(data.get("date"), (datetime.date, datetime.datetime)):
         data["date"] = data["date"].strftime("%d.%m.%Y")
-    
+
     # The template expects specific variables:
     # {{ sender_name }}, {{ sender_position }}, {{ purpose }}, {{ request_id }}, {{ date }}
     # {{ total_amount }}, {{ currency }}
     # And a loop for items: {% for item in items %} ... {{ item.name }}, {{ item.quantity }}, {{ item.amount }} ... {% endfor %}
-    
-    doc.render(data)
-    
-    file_stream = io.BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
-    return file_stream
+    return data
+
+
+def generate_docx(template_path, data):
+    """
+    Generate a DOCX file from a template and data using docxtpl.
+    Returns an io.BytesIO stream.
+    """
+    data = _prepare(data)
+    if DOCX_WORKERS <= 0:
+        return io.BytesIO(registry.render(template_path, data))
+    return io.BytesIO(_submit(template_path, data).result())
+
+
+async def generate_docx_async(template_path, data):
+    """generate_docx для async-кода (бот, async-эндпоинты): не блокирует event loop."""
+    data = _prepare(data)
+    if DOCX_WORKERS <= 0:
+        content = await asyncio.to_thread(registry.render, template_path, data)
+    else:
+        content = await asyncio.wrap_future(_submit(template_path, data))
+    return io.BytesIO(content)
+
+
+def warm_up() -> list:
+    """При старте API: поднять процессы пула, чтобы первая смета не ждала spawn и разбор шаблонов.
+
+    Не ждёт процессы; futures — для тех, кому нужно дождаться (tools/benchmark_docx.py).
+    """
+    if DOCX_WORKERS <= 0:
+        registry.preload()
+        return []
+    pool = _pool()
+    return [pool.submit(os.getpid) for _ in range(DOCX_WORKERS)]
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
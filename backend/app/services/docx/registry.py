@@ -0,0 +1,166 @@
+"""
+Разобранные шаблоны DOCX: каждый файл из services/docx/templates читается и готовится
+к рендеру один раз на процесс, а не на каждую смету, бланк или заявление.
+
+docxtpl на каждый вызов открывает zip, разбирает XML частей, чистит разметку между
+{{ }} (patch_xml — несколько регулярных выражений по всему document.xml) и компилирует
+Jinja-шаблоны тела, колонтитулов, сносок и свойств документа. Здесь всё это делается
+при первой загрузке шаблона (CompiledTemplate), а рендер берёт deepcopy уже разобранного
+документа и готовые Jinja-шаблоны — дальше обычный путь docxtpl (fix_tables, сохранение).
+
+Шаблон перечитывается, если у файла сменились mtime или размер — заменить .docx можно
+без перезапуска.
+"""
+import copy
+import io
+import os
+import re
+import threading
+
+from docxtpl import DocxTemplate
+from jinja2 import Environment, TemplateError
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+FOOTNOTES_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+# Строковые свойства документа, которые рендерит docxtpl (DocxTemplate.render_properties)
+PROPERTIES = ("author", "comments", "identifier", "language", "subject", "title")
+
+# Как Template(src) в docxtpl: окружение Jinja по умолчанию, без autoescape
+_env = Environment()
+_cache = {}
+_lock = threading.Lock()
+
+
+def _add_docx_context(exc: TemplateError, src_xml: str):
+    """Строки текста вокруг ошибки, как exc.docx_context в docxtpl."""
+    if getattr(exc, "lineno", None) is not None:
+        line_number = max(exc.lineno - 4, 0)
+        # Список, а не map: исключение уходит из процесса пула через pickle
+        exc.docx_context = [
+            re.sub(r"<[^>]+>", "", line) for line in src_xml.splitlines()[line_number:line_number + 7]
+        ]
+
+
+def _compile(xml: str):
+    """(исходник, Jinja-шаблон) части документа — исходник нужен для контекста ошибки."""
+    xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", xml)
+    try:
+        return xml, _env.from_string(xml)
+    except TemplateError as exc:
+        _add_docx_context(exc, xml)
+        raise
+
+
+def _version(path: str):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CompiledTemplate:
+    """Шаблон, разобранный один раз. После создания не меняется — общий для потоков."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = _version(path)
+        with open(path, "rb") as f:
+            tpl = DocxTemplate(io.BytesIO(f.read()))
+        tpl.init_docx()
+        # Нетронутый документ: каждый рендер работает с его копией
+        self.document = tpl.docx
+        self.body = _compile(tpl.patch_xml(tpl.get_xml()))
+        # uri → [(rId, кодировка, часть)] — как build_headers_footers_xml
+        self.headers_footers = {}
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            self.headers_footers[uri] = []
+            for rel_key, part in tpl.get_headers_footers(uri):
+                xml = tpl.get_part_xml(part)
+                encoding = tpl.get_headers_footers_encoding(xml)
+                self.headers_footers[uri].append((rel_key, encoding, _compile(tpl.patch_xml(xml))))
+        self.footnotes = {
+            str(part.partname): _compile(tpl.patch_xml(part.blob.decode("utf-8") if isinstance(part.blob, bytes) else part.blob))
+            for part in self.document.part.package.parts
+            if part.content_type == FOOTNOTES_CONTENT_TYPE
+        }
+        self.properties = {
+            prop: _env.from_string(getattr(self.document.core_properties, prop)) for prop in PROPERTIES
+        }
+
+
+class _CompiledDocxTemplate(DocxTemplate):
+    """DocxTemplate, который берёт документ и Jinja-шаблоны из CompiledTemplate."""
+
+    def __init__(self, compiled: CompiledTemplate):
+        super().__init__(compiled.path)
+        self.compiled = compiled
+
+    def init_docx(self, reload: bool = True):
+        if not self.docx or (self.is_rendered and reload):
+            self.docx = copy.deepcopy(self.compiled.document)
+            self.is_rendered = False
+
+    def render_compiled_part(self, compiled_part, part, context):
+        """render_xml_part без patch_xml и компиляции."""
+        src_xml, template = compiled_part
+        try:
+            self.current_rendering_part = part
+            dst_xml = template.render(context)
+        except TemplateError as exc:
+            _add_docx_context(exc, src_xml)
+            raise
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_compiled_part(self.compiled.body, self.docx._part, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        for rel_key, encoding, compiled_part in self.compiled.headers_footers[uri]:
+            part = self.docx._part.rels[rel_key].target_part
+            yield rel_key, self.render_compiled_part(compiled_part, part, context).encode(encoding)
+
+    def render_properties(self, context, jinja_env=None):
+        for prop, template in self.compiled.properties.items():
+            setattr(self.docx.core_properties, prop, template.render(context))
+
+    def render_footnotes(self, context, jinja_env=None):
+        for part in self.docx.part.package.parts:
+            compiled_part = self.compiled.footnotes.get(str(part.partname))
+            if compiled_part:
+                part._blob = self.render_compiled_part(compiled_part, part, context).encode("utf-8")
+
+
+def get(path: str) -> CompiledTemplate:
+    """Разобранный шаблон; файл изменился — разбирается заново."""
+    path = os.path.abspath(path)
+    compiled = _cache.get(path)
+    if compiled is not None and compiled.version == _version(path):
+        return compiled
+    with _lock:
+        compiled = _cache.get(path)
+        if compiled is None or compiled.version != _version(path):
+            compiled = _cache[path] = CompiledTemplate(path)
+        return compiled
+
+
+def preload(directory: str = TEMPLATES_DIR) -> int:
+    """Разбирает все шаблоны каталога (при старте процесса пула). Возвращает их число."""
+    names = [name for name in os.listdir(directory) if name.endswith(".docx")]
+    for name in names:
+        get(os.path.join(directory, name))
+    return len(names)
+
+
+def render(path: str, data: dict) -> bytes:
+    """DOCX по шаблону и данным — содержимое файла."""
+    doc = _CompiledDocxTemplate(get(path))
+    doc.render(data)
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
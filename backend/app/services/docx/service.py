@@ -2,9 +2,8 @@ import os
 from sqlalchemy.orm import Session
 from decimal import Decimal
 from app.db import models
-from .generator import generate_docx
-
-TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+from .generator import generate_docx, generate_docx_async
+from .registry import TEMPLATES_DIR
 
 class DocxService:
     DEFAULT_TEMPLATE = "Management.docx"
@@ -50,7 +49,17 @@ class DocxService:
         """Prepare data dictionary for the docxtpl template."""
         items_data = []
         raw_items = expense.items
-        if isinstance(raw_items, list):
+        if expense.line_items:
+            for item in expense.line_items:
+                items_data.append({
+                    "no": item.position + 1,
+                    "name": item.name,
+                    "quantity": float(item.quantity),
+                    "price": float(item.amount),
+                    "total": float(item.quantity * item.amount)
+                })
+        elif isinstance(raw_items, list):
+            # Заявки, ещё не перенесённые в expense_items
             for idx, item in enumerate(raw_items):
                 if isinstance(item, dict):
                     qty = float(item.get("quantity", 0))
@@ -150,14 +159,19 @@ class DocxService:
         return data
 
 
-    def generate_expense_docx(self, expense: models.ExpenseRequest):
-        """Main method to generate DOCX for an expense."""
+    def _template_and_data(self, expense: models.ExpenseRequest):
         template_path = self.get_template_path(expense)
         if not os.path.exists(template_path):
             # Fallback to default if somehow file is missing
             template_path = os.path.join(TEMPLATES_DIR, self.DEFAULT_TEMPLATE)
-            
-        data = self.prepare_docx_data(expense)
-        return generate_docx(template_path, data)
+        return template_path, self.prepare_docx_data(expense)
+
+    def generate_expense_docx(self, expense: models.ExpenseRequest):
+        """Main method to generate DOCX for an expense."""
+        return generate_docx(*self._template_and_data(expense))
+
+    async def generate_expense_docx_async(self, expense: models.ExpenseRequest):
+        """То же для бота: рендер в пуле, event loop не ждёт."""
+        return await generate_docx_async(*self._template_and_data(expense))
 
 docx_service = DocxService()
@@ -2,7 +2,8 @@ import asyncio
 import os
 import json
 import logging
-import redis.asyncio as redis
+import redis
+import redis.asyncio as aioredis
 from sse_starlette.sse import EventSourceResponse
 from fastapi import Request
 
@@ -14,9 +15,14 @@ redis_client = None
 async def get_redis():
     global redis_client
     if redis_client is None:
-        redis_client = redis.from_url(REDIS_URL, encoding="utf8", decode_responses=True)
+        redis_client = aioredis.from_url(REDIS_URL, encoding="utf8", decode_responses=True)
     return redis_client
 
+def user_channel(user) -> str:
+    """Channel the user's SSE stream listens to: admins share 'notifications:admin'."""
+    is_admin = user.login == "safina" or user.position == "admin"
+    return "notifications:admin" if is_admin else f"notifications:{user.id}"
+
 async def publish_notification(channel: str, message: dict):
     """Publish a notification to a specific channel (e.g., 'notifications:admin')."""
     try:
@@ -26,6 +32,15 @@ async def publish_notification(channel: str, message: dict):
     except Exception as e:
         logger.error(f"Failed to publish notification: {e}")
 
+def publish_notification_sync(channel: str, message: dict):
+    """Same as publish_notification, for code outside the event loop (worker processes)."""
+    try:
+        with redis.Redis.from_url(REDIS_URL) as r:
+            r.publish(channel, json.dumps(message))
+        logger.info(f"Published to {channel}: {message}")
+    except Exception as e:
+        logger.error(f"Failed to publish notification: {e}")
+
 async def sse_generator(request: Request, channel: str):
     """Generator for Server-Sent Events that yields messages from a Redis channel."""
     r = await get_redis()
@@ -13,9 +13,10 @@ import shutil
 from typing import Optional, Tuple
 from decimal import Decimal
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import models, schemas, crud
+from app.db import models, schemas, crud_async
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -74,7 +75,7 @@ def save_receipt_photo(upload_file) -> str:
 # ---------------------------------------------------------------------------
 
 async def create_refund(
-    db: Session,
+    db: AsyncSession,
     *,
     student_id: str,
     reason: str,
@@ -126,7 +127,7 @@ async def create_refund(
     )
 
     usd_rate = await currency_service.get_usd_rate()
-    db_expense = crud.create_expense_request(db, expense_create, user_id=user_id, usd_rate=usd_rate)
+    db_expense = await crud_async.create_expense_request(db, expense_create, user_id=user_id, usd_rate=usd_rate)
     logger.info(
         "Refund created: %s | student=%s | amount=%s | branch=%s",
         db_expense.request_id, student_id, amount, branch,
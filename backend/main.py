@@ -18,9 +18,11 @@ from app.core.logging_config import setup_logging, get_logger
 from app.core.logging_middleware import LoggingMiddleware
 from app.core.database import engine, Base
 from app.core import database
-from app.api import auth, projects, expenses, team, notifications, analytics, blanks
+from app.api import auth, projects, expenses, team, notifications, analytics, blanks, exports
 from app.db import models, schemas, seed
 from app.services.bot.main import main as bot_main
+from app.services.analytics import export_jobs, snapshots
+from app.services.docx import generator as docx_generator
 
 # Setup logging
 setup_logging()
@@ -55,6 +57,18 @@ async def lifespan(app: FastAPI):
         bot_task = asyncio.create_task(run_bot_with_watchdog())
     else:
         logger.warning("BOT_TOKEN not found in environment. Bot will not be started.")
+
+    # 4. Nightly Parquet snapshots (optional; cron + tools/snapshot_parquet.py works too)
+    snapshot_task = None
+    if snapshots.SNAPSHOT_TIME:
+        logger.info(f"Parquet snapshots scheduled daily at {snapshots.SNAPSHOT_TIME} UTC")
+        snapshot_task = asyncio.create_task(snapshots.run_schedule(snapshots.SNAPSHOT_TIME))
+
+    # 5. Background exports queued before a restart
+    export_jobs.dispatch_queued()
+
+    # 6. DOCX render pool: spawn workers and parse templates before the first download
+    docx_generator.warm_up()
     
     yield
     
@@ -65,6 +79,12 @@ async def lifespan(app: FastAPI):
         bot_task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
             await bot_task
+    if snapshot_task:
+        snapshot_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await snapshot_task
+    export_jobs.shutdown()
+    docx_generator.shutdown()
 
 app = FastAPI(title="Safina API", lifespan=lifespan)
 
@@ -135,6 +155,7 @@ app.include_router(team.router, prefix="/api")
 app.include_router(notifications.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")
 app.include_router(blanks.router, prefix="/api")
+app.include_router(exports.router, prefix="/api")
 
 @app.get("/ping")
 async def ping():
@@ -0,0 +1,125 @@
+"""
+Бенчмарк генерации DOCX: как было (новый DocxTemplate на каждый вызов) против
+разобранных шаблонов (app/services/docx/registry.py) в том же процессе и в пуле
+процессов (generate_docx, DOCX_WORKERS).
+
+Для каждого шаблона из services/docx/templates рендерит смету (или заявление на
+возврат) из заявки с --items позициями, сверяет части документа со старым путём
+и печатает задержку одного рендера (медиана и p95) и пропускную способность
+при --concurrency одновременных запросах (потоки, как в пуле потоков FastAPI).
+
+Запуск:
+    python tools/benchmark_docx.py
+    python tools/benchmark_docx.py --items 50 --renders 200 --concurrency 8 --workers 4
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import io
+import statistics
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal
+
+from docxtpl import DocxTemplate
+
+from app.db import models
+from app.services.docx import generator, registry
+from app.services.docx.service import docx_service
+
+
+def make_expense(template_key: str, items: int) -> models.ExpenseRequest:
+    expense = models.ExpenseRequest(
+        request_id="BENCH-1", date=datetime.datetime(2026, 1, 15), purpose="Канцтовары для филиала",
+        items=[{"name": f"Позиция {i + 1}", "quantity": 2, "amount": 15000} for i in range(items)],
+        total_amount=Decimal(30000 * items), currency="UZS", request_type="expense", template_key=template_key,
+        created_by="Иванов Иван Иванович", created_by_position="Менеджер", project_name="Бенчмарк", project_code="BN",
+    )
+    if template_key == "refund":
+        expense.request_type = "refund"
+        expense.refund_data = {
+            "client_name": "Петров Пётр", "reason": "Переезд", "amount": 1500000, "branch": "School",
+            "card_number": "8600 0000 0000 0000",
+        }
+    return expense
+
+
+def docxtpl_render(template_path: str, data: dict) -> bytes:
+    """Старый generate_docx: шаблон открывается и компилируется на каждый вызов."""
+    doc = DocxTemplate(template_path)
+    doc.render(data)
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def pool_render(template_path: str, data: dict) -> bytes:
+    return generator.generate_docx(template_path, dict(data)).getvalue()
+
+
+def parts(content: bytes) -> dict:
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def latency(render, template_path: str, data: dict, renders: int) -> list:
+    timings = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        render(template_path, dict(data))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def throughput(render, template_path: str, data: dict, renders: int, concurrency: int) -> float:
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        list(pool.map(lambda _: render(template_path, dict(data)), range(renders)))
+        return renders / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10, help="позиций в смете")
+    parser.add_argument("--renders", type=int, default=50, help="рендеров на замер")
+    parser.add_argument("--concurrency", type=int, default=4, help="одновременных запросов")
+    parser.add_argument("--workers", type=int, default=generator.DOCX_WORKERS or 2, help="процессов пула")
+    args = parser.parse_args()
+
+    generator.DOCX_WORKERS = args.workers
+    wait(generator.warm_up())
+    modes = {
+        "docxtpl на вызов": docxtpl_render,
+        "registry": registry.render,
+        f"пул x{args.workers}": pool_render,
+    }
+
+    templates = {
+        "Management.docx": "management", "School.docx": "school", "LAND.docx": "land",
+        "Drujba.docx": "drujba", docx_service.REFUND_TEMPLATE: "refund",
+    }
+    print(f"{'Шаблон':<34} {'Режим':<18} {'медиана, мс':>12} {'p95, мс':>9} {'док/с':>8}")
+    try:
+        for name, template_key in templates.items():
+            expense = make_expense(template_key, args.items)
+            template_path = docx_service.get_template_path(expense)
+            data = docx_service.prepare_docx_data(expense)
+
+            expected = parts(docxtpl_render(template_path, dict(data)))
+            for title, render in modes.items():
+                if parts(render(template_path, dict(data))) != expected:
+                    print(f"{name:<34} {title:<18} ДОКУМЕНТ ОТЛИЧАЕТСЯ ОТ DOCXTPL")
+                timings = sorted(latency(render, template_path, data, args.renders))
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                rate = throughput(render, template_path, data, args.renders, args.concurrency)
+                print(f"{name:<34} {title:<18} {statistics.median(timings):>12.1f} {p95:>9.1f} {rate:>8.1f}")
+    finally:
+        generator.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Отдельный процесс фоновых выгрузок CSV/XLSX (см. app/services/analytics/export_jobs.py).
+
+Нужен, если API запущен с EXPORT_WORKERS=0 и не собирает файлы сам. Забирает задачи
+из таблицы export_jobs; несколько таких процессов не выполнят одну задачу дважды.
+
+Запуск:
+    python tools/export_worker.py [--interval 2] [--once]
+"""
+import argparse
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.logging_config import setup_logging
+from app.services.analytics import export_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фоновые выгрузки CSV/XLSX")
+    parser.add_argument("--interval", type=float, default=2.0, help="пауза между проверками очереди, с")
+    parser.add_argument("--once", action="store_true", help="выполнить очередь и выйти")
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        done = export_jobs.run_queued()
+        if args.once:
+            print(f"Выполнено задач: {done}")
+            return
+        if not done:
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Пересчитывает daily_expense_rollups и project_spend_counters с нуля по expense_requests.
+
+Нужен после ручных правок заявок в базе или если итоги разошлись с заявками.
+Выполняется одной транзакцией; на PostgreSQL создание заявок и смена статусов
+на это время ждут.
+
+Запуск:
+    python tools/rebuild_rollups.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import database_session
+from app.db import models, rollups
+
+
+def main():
+    with database_session() as db:
+        rows = rollups.rebuild(db)
+        counters = db.query(models.ProjectSpendCounter).count()
+        db.commit()
+    print(f"daily_expense_rollups: {rows} строк")
+    print(f"project_spend_counters: {counters} строк")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Обновляет Parquet-снимки заявок, позиций и истории статусов
+в {UPLOAD_DIR}/snapshots (см. app/services/analytics/snapshots.py).
+
+Переписываются только месяцы, изменившиеся с прошлого запуска. Для ночного
+запуска — cron или SNAPSHOT_TIME у API.
+
+Запуск:
+    python tools/snapshot_parquet.py [--dir /path/to/snapshots]
+"""
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.analytics import snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parquet-снимки заявок")
+    parser.add_argument("--dir", default=snapshots.SNAPSHOT_DIR, help="каталог снимков")
+    args = parser.parse_args()
+
+    report = snapshots.run_snapshots(args.dir)
+    if report is None:
+        print("Снимок уже обновляет другой процесс")
+        sys.exit(1)
+    for table, result in report.items():
+        rows = sum(result["written"].values())
+        print(f"{table}: месяцев записано {len(result['written'])} ({rows} строк), удалено {len(result['removed'])}")
+
+
+if __name__ == "__main__":
+    main()
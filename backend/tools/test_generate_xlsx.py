@@ -10,7 +10,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.db import models
+from app.db import crud
+from app.db.expense_query import ExpenseQuerySpec
 from app.services.analytics import export as export_service
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -20,11 +21,11 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def test_generate_xlsx():
     db = SessionLocal()
     try:
-        # Get up to 10 expenses
-        expenses = db.query(models.ExpenseRequest).limit(10).all()
-        print(f"Fetched {len(expenses)} expenses.")
+        # Item rows of up to 10 expenses — the same rows the export endpoints use
+        rows = crud.get_expense_item_rows(db, ExpenseQuerySpec(), limit=10)
+        print(f"Fetched {len(rows)} item rows.")
         
-        output = export_service.generate_expenses_xlsx(expenses)
+        output = export_service.generate_expenses_xlsx(rows)
         
         with open("test_report.xlsx", "wb") as f:
             f.write(output.getvalue())
@@ -13,6 +13,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app.db import models, crud
+from app.db.expense_query import ExpenseQuerySpec
 from app.services.analytics import export as export_service
 
 # Use a temporary SQLite database for testing if possible, 
@@ -26,7 +27,7 @@ def verify_enhanced_export():
     try:
         print("--- Testing CRUD Filtering ---")
         # 1. Test filtering by request_type
-        refunds = crud.get_expenses(db, request_type="refund", limit=5)
+        refunds = crud.get_expenses(db, ExpenseQuerySpec(request_types="refund"), limit=5)
         print(f"Found {len(refunds)} refunds via request_type='refund'")
         for r in refunds:
             assert r.request_type == "refund"
@@ -41,7 +42,7 @@ def verify_enhanced_export():
         
         if branches:
             branch_to_test = list(branches)[0]
-            branch_expenses = crud.get_expenses(db, branch=branch_to_test, limit=10)
+            branch_expenses = crud.get_expenses(db, ExpenseQuerySpec(branch=branch_to_test), limit=10)
             print(f"Found {len(branch_expenses)} expenses for branch '{branch_to_test}'")
             for e in branch_expenses:
                 user = db.query(models.TeamMember).filter(models.TeamMember.id == e.created_by_id).first()
@@ -51,13 +52,13 @@ def verify_enhanced_export():
 
         print("\n--- Testing XLSX Generation with Refund Data ---")
         # Fetch some refunds specifically to test the new columns
-        refund_requests = db.query(models.ExpenseRequest).filter(models.ExpenseRequest.request_type == "refund").limit(5).all()
-        if not refund_requests:
+        refund_rows = crud.get_expense_item_rows(db, ExpenseQuerySpec(request_types="refund"), limit=5)
+        if not refund_rows:
             print("No refunds found in DB. Please run populate_test_data.py first.")
             return
 
         # Generate XLSX
-        output = export_service.generate_expenses_xlsx(refund_requests)
+        output = export_service.generate_expenses_xlsx(refund_rows)
         
         # Verify content using pandas
         output.seek(0)
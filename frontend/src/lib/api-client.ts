@@ -14,16 +14,27 @@ export const getHeaders = (body?: any) => {
   return headers;
 };
 
+// Reports and lists may be served by a read replica that lags behind the primary.
+// Right after our own write, ask the backend to read from the primary instead.
+const READ_PRIMARY_WINDOW_MS = 5000;
+let readPrimaryUntil = 0;
+
 export const apiFetch = async (endpoint: string, options: RequestInit = {}) => {
   const url = endpoint.startsWith("http") ? endpoint : `${API_BASE_URL}${endpoint}`;
+  const method = (options.method || "GET").toUpperCase();
   const response = await fetch(url, {
     ...options,
     headers: {
       ...getHeaders(options.body),
+      ...(Date.now() < readPrimaryUntil ? { "X-Read-Primary": "1" } : {}),
       ...options.headers,
     },
   });
 
+  if (response.ok && method !== "GET" && method !== "HEAD") {
+    readPrimaryUntil = Date.now() + READ_PRIMARY_WINDOW_MS;
+  }
+
   if (response.status === 401) {
     // Only redirect to login for dashboard routes.
     // Public forms (/submit, /blank) opened from Telegram must NOT be redirected
@@ -1,8 +1,8 @@
 import { apiFetch } from "../api-client";
 
 export const analyticsService = {
-  getAnalytics: async ({ period = "1m", segment = "global", type = "all" } = {}) => {
-    const res = await apiFetch(`/analytics?period=${period}&segment=${segment}&type=${type}`);
+  getAnalytics: async ({ period = "1m", segment = "global", type = "all", granularity = "day" } = {}) => {
+    const res = await apiFetch(`/analytics?period=${period}&segment=${segment}&type=${type}&granularity=${granularity}`);
     return await res.json();
   },
 };
@@ -1,5 +1,10 @@
 import { apiFetch } from "../api-client";
-import { ExpenseRequest, ExpenseStatus, PaginatedResponse } from "../types";
+import { ExpenseRequest, ExpenseStatus, ExportJob, PaginatedResponse } from "../types";
+import { toBudget } from "./projects";
+
+const EXPORT_POLL_MS = 1000;
+// Dropping out earlier than the server would mark a stuck queued job as failed is pointless
+const EXPORT_POLL_TIMEOUT_MS = 30 * 60 * 1000;
 
 export const expensesService = {
   getExpenseById: async (id: string): Promise<ExpenseRequest> => {
@@ -37,6 +42,9 @@ export const expensesService = {
     to_date?: string;
     skip?: number;
     limit?: number;
+    cursor?: string;
+    with_total?: boolean;
+    with_budget?: boolean;
   }): Promise<PaginatedResponse<ExpenseRequest>> => {
     const searchParams = new URLSearchParams();
     if (params?.project && params.project !== "all") searchParams.append("project", params.project);
@@ -46,8 +54,14 @@ export const expensesService = {
     if (params?.from_date) searchParams.append("from_date", params.from_date);
     if (params?.to_date) searchParams.append("to_date", params.to_date);
 
-    searchParams.append("skip", String(params?.skip ?? 0));
+    // cursor (even empty) switches the backend to keyset pagination
+    if (params?.cursor !== undefined) searchParams.append("cursor", params.cursor);
+    else searchParams.append("skip", String(params?.skip ?? 0));
     searchParams.append("limit", String(params?.limit ?? 50));
+    // Skip the exact COUNT when only "is there more?" matters
+    if (params?.with_total === false) searchParams.append("with_total", "false");
+    // Project/branch budget for the request's month, read from the spend counters
+    if (params?.with_budget) searchParams.append("with_budget", "true");
     
     const endpoint = `/expenses?${searchParams.toString()}`;
     const res = await apiFetch(endpoint);
@@ -74,11 +88,13 @@ export const expensesService = {
         receiptPhotoFileId: e.receipt_photo_file_id,
         date: new Date(e.date),
         createdAt: new Date(e.created_at),
+        budget: e.budget ? { project: toBudget(e.budget.project), branch: toBudget(e.budget.branch) } : null,
       })),
       total: data.total,
       skip: data.skip,
       limit: data.limit,
       has_more: data.has_more,
+      next_cursor: data.next_cursor ?? null,
     };
   },
 
@@ -140,18 +156,36 @@ export const expensesService = {
   },
 
   exportXLSX: async (params: { project?: string; user?: string; from?: string; to?: string; allStatuses?: boolean; status?: string; request_type?: string; search?: string }): Promise<void> => {
-    const searchParams = new URLSearchParams();
-    if (params.project && params.project !== "all") searchParams.append("project", params.project);
-    if (params.user && params.user !== "all") searchParams.append("user_id", params.user);
-    if (params.search) searchParams.append("search", params.search);
-    if (params.from) searchParams.append("from_date", params.from);
-    if (params.to) searchParams.append("to_date", params.to);
-    if (params.allStatuses) searchParams.append("allStatuses", "true");
-    if (params.status) searchParams.append("status", params.status);
-    if (params.request_type) searchParams.append("request_type", params.request_type);
-
-    const res = await apiFetch(`/expenses/export-xlsx?${searchParams.toString()}`);
-    const blob = await res.blob();
+    // The file is built by a background job; poll it instead of holding the request open
+    const res = await apiFetch(`/exports`, {
+      method: "POST",
+      body: JSON.stringify({
+        format: "xlsx",
+        project: params.project && params.project !== "all" ? params.project : undefined,
+        user_id: params.user && params.user !== "all" ? params.user : undefined,
+        search: params.search || undefined,
+        from_date: params.from || undefined,
+        to_date: params.to || undefined,
+        allStatuses: !!params.allStatuses,
+        status: params.status || undefined,
+        request_type: params.request_type || undefined,
+      }),
+    });
+    let job: ExportJob = await res.json();
+    const deadline = Date.now() + EXPORT_POLL_TIMEOUT_MS;
+    while (job.status === "queued" || job.status === "running") {
+      if (Date.now() > deadline) {
+        throw new Error("Выгрузка не завершилась за 30 минут. Попробуйте позже.");
+      }
+      await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_MS));
+      job = await (await apiFetch(`/exports/${job.id}`)).json();
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Export failed");
+    }
+
+    const file = await apiFetch(`/exports/${job.id}/download`);
+    const blob = await file.blob();
     const downloadUrl = window.URL.createObjectURL(blob);
     const link = document.createElement('a');
     link.href = downloadUrl;
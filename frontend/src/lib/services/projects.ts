@@ -1,5 +1,13 @@
 import { apiFetch } from "../api-client";
-import { Project } from "../types";
+import { BudgetStatus, Project } from "../types";
+
+// Decimal fields come from the API as strings
+export const toBudget = (b: any): BudgetStatus | null => b ? {
+  ...b,
+  budget: b.budget == null ? null : Number(b.budget),
+  spent: Number(b.spent),
+  remaining: b.remaining == null ? null : Number(b.remaining),
+} : null;
 
 export const projectsService = {
   getProjects: async (): Promise<Project[]> => {
@@ -8,6 +16,8 @@ export const projectsService = {
     return data.map((p: any) => ({
       ...p,
       createdAt: p.created_at,
+      monthlyBudget: p.monthly_budget == null ? null : Number(p.monthly_budget),
+      budget: toBudget(p.budget),
       members: (p.members || []).map((m: any) => ({
         id: m.id,
         lastName: m.last_name,
@@ -46,6 +56,35 @@ export const projectsService = {
     return await res.json();
   },
   
+  updateProjectBudget: async (projectId: string, monthlyBudget: number | null) => {
+    const res = await apiFetch(`/projects/${projectId}/budget`, {
+      method: "PUT",
+      body: JSON.stringify({ monthly_budget: monthlyBudget }),
+    });
+    return await res.json();
+  },
+
+  updateBranchBudget: async (branch: string, monthlyBudget: number | null) => {
+    await apiFetch(`/projects/branch-budgets/${encodeURIComponent(branch)}`, {
+      method: "PUT",
+      body: JSON.stringify({ monthly_budget: monthlyBudget }),
+    });
+  },
+
+  getBudgets: async (month?: string): Promise<{
+    month: string;
+    projects: Array<BudgetStatus & { project_id: string; name: string; code: string }>;
+    branches: BudgetStatus[];
+  }> => {
+    const res = await apiFetch(`/projects/budgets${month ? `?month=${month}` : ""}`);
+    const data = await res.json();
+    return {
+      month: data.month,
+      projects: data.projects.map(toBudget),
+      branches: data.branches.map(toBudget),
+    };
+  },
+
   updateProjectTemplates: async (projectId: string, templates: string[]) => {
     const res = await apiFetch(`/projects/${projectId}/templates`, {
       method: "PATCH",
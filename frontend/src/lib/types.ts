@@ -10,14 +10,39 @@ export interface Project {
     position?: string;
   }>;
   templates?: string[];
+  monthlyBudget?: number | null;
+  budget?: BudgetStatus | null;
+}
+
+// Monthly budget vs approved spend, see GET /projects/budgets
+export interface BudgetStatus {
+  month: string; // YYYY-MM
+  budget: number | null;
+  spent: number;
+  remaining: number | null;
+  count: number;
+  branch?: string;
+}
+
+// Background CSV/XLSX export, see POST /exports
+export interface ExportJob {
+  id: string;
+  format: "csv" | "xlsx";
+  status: "queued" | "running" | "done" | "failed";
+  rows: number;
+  total_rows: number | null;
+  error: string | null;
+  created_at: string;
+  finished_at: string | null;
 }
 
 export interface PaginatedResponse<T> {
   items: T[];
-  total: number;
+  total: number | null;
   skip: number;
   limit: number;
   has_more: boolean;
+  next_cursor?: string | null;
 }
 
 export interface TeamMember {
@@ -87,6 +112,10 @@ export interface ExpenseRequest {
   templateKey?: string;
   refundData?: any;
   createdAt: Date;
+  budget?: {
+    project: BudgetStatus | null;
+    branch: BudgetStatus | null;
+  } | null;
 }
 
 export const REQUEST_TYPE_LABELS: Record<string, string> = {
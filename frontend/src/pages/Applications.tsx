@@ -148,7 +148,7 @@ const Applications = () => {
       from: dateRange.from?.toISOString(),
       to: dateRange.to?.toISOString(),
       allStatuses
-    });
+    }).catch((e) => toast.error(e instanceof Error ? e.message : "Не удалось выгрузить отчёт"));
   };
 
 
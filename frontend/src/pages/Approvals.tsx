@@ -1,6 +1,6 @@
 import { useNavigate } from "react-router-dom";
 import { store } from "@/lib/store";
-import { ExpenseStatus, STATUS_LABELS } from "@/lib/types";
+import { ExpenseRequest, ExpenseStatus, STATUS_LABELS } from "@/lib/types";
 import { Loader2 } from "lucide-react";
 import { useQuery } from "@tanstack/react-query";
 
@@ -35,7 +35,7 @@ const Approvals = () => {
 
   const { data: expensesPage, isLoading } = useQuery({
     queryKey: ["expenses-approvals"],
-    queryFn: () => store.getExpenses({ status: "pending_senior,pending_ceo", limit: 100 }),
+    queryFn: () => store.getExpenses({ status: "pending_senior,pending_ceo", limit: 100, with_budget: true }),
   });
   
   const expenses = expensesPage?.items ?? [];
@@ -56,6 +56,18 @@ const Approvals = () => {
     return "";
   };
 
+  // Remaining monthly budget of the project (or, without one, of the creator's branch)
+  const getBudgetLine = (e: ExpenseRequest) => {
+    const b = e.budget?.project?.budget != null ? e.budget.project : e.budget?.branch;
+    if (!b || b.budget == null || b.remaining == null) return null;
+    const title = b.branch ? `Бюджет ${b.branch}` : "Бюджет проекта";
+    return (
+      <p className={`text-[10px] mt-1 ${b.remaining < 0 ? "text-red-600 font-semibold" : "text-muted-foreground"}`}>
+        {title}: остаток {b.remaining.toLocaleString()} из {b.budget.toLocaleString()} UZS
+      </p>
+    );
+  };
+
   const getCardBadge = (status: ExpenseStatus) => {
     if (["approved_senior", "approved_ceo"].includes(status))
       return <span className="text-[10px] font-bold text-emerald-700 bg-emerald-100 px-1.5 py-0.5 rounded-full">✅ Одобрено</span>;
@@ -102,6 +114,7 @@ const Approvals = () => {
                       <p className="text-xs font-semibold">
                         {Number(e.totalAmount).toLocaleString()} {e.currency}
                       </p>
+                      {getBudgetLine(e)}
                       <p className="text-[10px] text-muted-foreground mt-1">{e.createdBy}</p>
                     </div>
                   ))
@@ -1,6 +1,7 @@
 import { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { store } from "@/lib/store";
+import { toast } from "sonner";
 import { ExpenseRequest } from "@/lib/types";
 import { Button } from "@/components/ui/button";
 import FilterBar from "@/components/FilterBar";
@@ -73,7 +74,7 @@ const Archive = () => {
       from: dateRange.from?.toISOString(),
       to: dateRange.to?.toISOString(),
       allStatuses: true
-    });
+    }).catch((e) => toast.error(e instanceof Error ? e.message : "Не удалось выгрузить отчёт"));
   };
 
 
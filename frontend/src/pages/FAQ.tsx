@@ -146,7 +146,7 @@ const FAQ = () => {
               <div className="bg-muted/30 border rounded-lg p-5 mt-4 space-y-3">
                 <h4 className="font-semibold">Правила работы выгрузки (Excel/CSV):</h4>
                 <ul className="list-disc pl-5 space-y-1 text-sm">
-                  <li>Без фильтров: скачивается вся база за всё время (возможно ограничение до 5000 строк).</li>
+                  <li>Без фильтров: скачивается вся база за всё время, без ограничения на число строк.</li>
                   <li>Детализация: каждая затрата (позиция, количество) идёт отдельной строкой.</li>
                   <li>Курсы валют: иностранные валюты автоматически конвертируются в UZS по курсу на день подачи заявки.</li>
                   <li>Фильтрация статусов: по умолчанию скачиваются только <em>финальные</em> статусы (Одобрено, Подтверждено), чтобы не искажать текущий баланс ожидаемыми выплатами. Для полной выгрузки выберите параметр «Все статусы».</li>
@@ -183,7 +183,7 @@ const Refunds = () => {
               from: dateRange.from?.toISOString(),
               to: dateRange.to?.toISOString(),
               request_type: "refund,blank_refund" 
-          })}>
+          }).catch((e) => toast.error(e instanceof Error ? e.message : "Не удалось выгрузить отчёт"))}>
             <Download className="w-4 h-4 mr-2" />
             Экспорт
           </Button>
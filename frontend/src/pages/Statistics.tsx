@@ -62,14 +62,24 @@ const DonutChart = ({
   </Card>
 );
 
+const PERIOD_GRANULARITY: Record<string, string> = {
+    "1m": "day",
+    "3m": "week",
+    "6m": "week",
+    "1y": "month",
+};
+
 const Statistics = () => {
     const [period, setPeriod] = useState("1m");
     const [segment, setSegment] = useState("branch");
     const [requestType, setRequestType] = useState("all");
 
+    // Длинные периоды — недельные/месячные точки вместо сотен дневных
+    const granularity = PERIOD_GRANULARITY[period] ?? "day";
+
     const { data: analytics, isLoading } = useQuery({
-        queryKey: ["analytics", period, segment, requestType],
-        queryFn: () => store.getAnalytics({ period, segment, type: requestType }),
+        queryKey: ["analytics", period, segment, requestType, granularity],
+        queryFn: () => store.getAnalytics({ period, segment, type: requestType, granularity }),
     });
 
     if (isLoading) {